@@ -0,0 +1,410 @@
+import io
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+import pandas as pd
+import plotly.express as px
+from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.shared import Inches, Pt
+
+from anomalies import detect_anomalies
+from cube import build_cube, slice_cube, rollup
+from derived_metrics import add_unit_cost
+from filters import sort_by_date, date_range_slice, filter_values
+from forecasting import forecast_articles, monthly_series
+from ingestion import read_excel_cached, load_incremental
+from memory import compact_frame
+from profiling import profiled
+from report_images import ReportImages
+
+SOURCE = "consommation.xlsx"
+
+
+# Jeu chargé : lignes nettoyées triées par date, agrégat par article, cube journalier (cube.build_cube)
+# Partagé en lecture seule par toutes les sessions
+@dataclass(frozen=True)
+class ConsumptionData:
+    df: pd.DataFrame
+    articles: pd.DataFrame
+    cube: pd.DataFrame
+
+
+# Filtres et paramètres de l'interface ; hashable, il sert directement de clé de cache
+@dataclass(frozen=True)
+class ConsumptionFilters:
+    org: str = "Tous"
+    category: str = "Tous"
+    date_range: Tuple = ()
+    trend_metric: str = "Qte"
+    cat_metric: str = "Qte"
+    art_metric: str = "Qte"
+    forecast_count: int = 5
+    robust_anomalies: bool = False
+    forecast_model: str = "Holt"
+
+
+# Données des graphiques et analyses pour un jeu de filtres
+@dataclass
+class ConsumptionViews:
+    trend_data: pd.DataFrame
+    cat_data: pd.DataFrame
+    top_articles: pd.DataFrame
+    box_data: pd.DataFrame
+    forecast_data: pd.DataFrame
+    forecast_recommendations: List[str]
+    anomaly_data: pd.DataFrame
+    warnings: List[str] = field(default_factory=list)
+
+
+# Indicateurs globaux (tous articles, toutes périodes)
+@dataclass(frozen=True)
+class ConsumptionKpis:
+    total_quantity: float
+    total_cost: float
+    cost_per_day: float
+    unique_articles: int
+    top_article: Optional[pd.Series]
+
+
+def abbreviate_number(num):
+    if pd.isna(num) or num == 0:
+        return "0"
+    if num >= 1_000_000:
+        return f"{num / 1_000_000:.1f}M"
+    if num >= 1_000:
+        return f"{num / 1_000:.1f}K"
+    return f"{num:.2f}"
+
+def sanitize_text(text):
+    if pd.isna(text):
+        return "N/A"
+    return str(text).replace("\n", " ").replace("\r", " ").strip()
+
+
+# Parse consumption dates 📅
+def parse_consumption_dates(df):
+    return pd.to_datetime(df["Date"], format="%Y%m%d", errors='coerce')
+
+
+# Clean data 🧹 (row by row, so a new monthly extract can be cleaned on its own)
+def clean_consumption_rows(df):
+    df = df.dropna(how='all')
+    df["Date"] = parse_consumption_dates(df)
+    df["Qte"] = pd.to_numeric(df["Qte"], errors='coerce').fillna(0)
+    df["Montant"] = pd.to_numeric(df["Montant"], errors='coerce').fillna(0)
+    df["Org_Log"] = df["Org_Log"].astype(str).fillna('Inconnu')
+    df["Desc_Cat"] = df["Desc_Cat"].astype(str).fillna('Inconnu')
+    df["Article"] = df["Article"].astype(str).fillna('Inconnu')
+    return df
+
+
+# Fonction pour charger le classeur de consommation (ingestion incrémentale, compactage, agrégats, cube)
+# Les erreurs de lecture sont propagées : c'est à l'interface de les afficher
+def load_consumption(path: str = SOURCE) -> ConsumptionData:
+    # Incremental ingestion 📥: only rows dated after the stored high-water mark are cleaned and appended,
+    # and the per-article aggregate is merged instead of recomputed
+    df, aggregates = load_incremental(
+        path, "consommation",
+        read=lambda path: read_excel_cached(path, na_values=['', 'NA', 'NaT']),
+        parse_dates=parse_consumption_dates,
+        clean=clean_consumption_rows,
+        aggregates={"articles": (["Article"], {
+            "Qte": "sum",
+            "Montant": "sum",
+            "Org_Log": "first",
+            "Desc_Cat": "first",
+            "Date": "first"
+        })}
+    )
+    
+    # Compact memory 🗜️ (low-cardinality text → category, lossless 32-bit numerics)
+    df = compact_frame(df, "consommation", ["Ste", "Org_Log", "Desc_CA", "Desc_Cat", "Article", "Des_article", "Unite", "Magasin"])
+    df = add_unit_cost(df, "Montant", "Qte", "unit_cost")
+    
+    # Aggregated data for visualizations 📊 (maintained by the incremental store)
+    df_aggregated = aggregates["articles"].reset_index()
+    df_aggregated = add_unit_cost(df_aggregated, "Montant", "Qte", "unit_cost")
+    
+    # Keep rows sorted by date so period filters are binary searches 🔎
+    df = sort_by_date(df)
+    
+    # Aggregate cube (day × Org_Log × Desc_Cat × Article) for filter-driven views 🧊
+    cube = build_cube(df, ["Org_Log", "Desc_Cat", "Article"], ["Qte", "Montant"])
+    
+    return ConsumptionData(df, df_aggregated, cube)
+
+
+# Fonction pour calculer les données des graphiques et analyses pour un jeu de filtres
+# Les avertissements non bloquants sont renvoyés dans ConsumptionViews.warnings
+def compute_views(data: ConsumptionData, filters: ConsumptionFilters) -> ConsumptionViews:
+    df, df_aggregated, cube = data.df, data.articles, data.cube
+    date_range = filters.date_range
+    warnings = []
+    filtered_df_aggregated = df_aggregated.copy()
+    
+    # Apply filters 🔍
+    filtered_df = date_range_slice(df, date_range[0], date_range[1])
+    if filters.org != "Tous":
+        filtered_df = filter_values(filtered_df, "Org_Log", filters.org)
+        filtered_df_aggregated = filtered_df_aggregated[filtered_df_aggregated["Org_Log"] == filters.org]
+    if filters.category != "Tous":
+        filtered_df = filter_values(filtered_df, "Desc_Cat", filters.category)
+        filtered_df_aggregated = filtered_df_aggregated[filtered_df_aggregated["Desc_Cat"] == filters.category]
+    
+    # Visualization data 📊 (answered from the aggregate cube)
+    cube_slice = slice_cube(cube, date_range[0], date_range[1], Org_Log=filters.org, Desc_Cat=filters.category)
+    trend_data = rollup(cube_slice, "Date", filters.trend_metric)
+    trend_data["Date"] = trend_data["Date"].dt.date
+    trend_data.columns = ['Date', 'Valeur']
+    trend_data['Métrique'] = filters.trend_metric
+    
+    # Handle category data with robust validation 🛡️
+    if not cube_slice.empty and filters.cat_metric in cube_slice.columns:
+        try:
+            # Perform groupby and ensure DataFrame output
+            cat_data = rollup(cube_slice, "Desc_Cat", filters.cat_metric)
+            # Rename columns explicitly
+            cat_data.columns = ['Desc_Cat', 'Valeur']
+            # Verify that cat_data is a DataFrame
+            if not isinstance(cat_data, pd.DataFrame):
+                cat_data = pd.DataFrame({'Desc_Cat': [], 'Valeur': []})
+            elif cat_data.empty:
+                cat_data = pd.DataFrame(columns=['Desc_Cat', 'Valeur'])
+        except Exception as e:
+            warnings.append(f"Erreur lors du traitement des données de catégorie : {e} 😢")
+            cat_data = pd.DataFrame(columns=['Desc_Cat', 'Valeur'])
+    else:
+        cat_data = pd.DataFrame(columns=['Desc_Cat', 'Valeur'])
+    
+    top_articles = rollup(cube_slice, "Article", filters.art_metric).nlargest(5, filters.art_metric)
+    top_articles.columns = ['Article', 'Valeur']
+    box_data = filtered_df[["Org_Log", "Qte"]]
+    
+    # Forecasting 🔮 (Holt : toutes les séries en une passe vectorisée ; ARIMA : ajustements en parallèle, mis en cache)
+    top_items = filtered_df_aggregated.nlargest(filters.forecast_count, "Qte")["Article"].tolist()
+    series = monthly_series(filtered_df, "Article", "Date", "Qte", top_items)
+    forecast_data, forecast_totals, _ = forecast_articles(series, model=filters.forecast_model)
+    forecast_recommendations = [
+        f"Stockez environ {int(total_forecast * 1.1)} unités de {item} pour couvrir la consommation prévue sur 6 mois (10% de marge). 📦"
+        for item, total_forecast in forecast_totals.items()
+    ]
+    
+    # Anomaly detection 🕵️‍♂️ (scores Z par catégorie en un seul groupby)
+    anomaly_data = detect_anomalies(filtered_df, "Desc_Cat", "Montant", ['Article', 'Desc_Cat', 'Montant'], robust=filters.robust_anomalies)
+    
+    return ConsumptionViews(
+        trend_data=trend_data,
+        cat_data=cat_data,
+        top_articles=top_articles,
+        box_data=box_data,
+        forecast_data=forecast_data,
+        forecast_recommendations=forecast_recommendations,
+        anomaly_data=anomaly_data,
+        warnings=warnings
+    )
+
+
+# Fonction pour calculer les indicateurs globaux à partir de l'agrégat par article
+def compute_kpis(data: ConsumptionData) -> ConsumptionKpis:
+    articles = data.articles
+    total_cost = articles["Montant"].sum()
+    return ConsumptionKpis(
+        total_quantity=articles["Qte"].sum(),
+        total_cost=total_cost,
+        cost_per_day=total_cost / data.df["Date"].nunique(),
+        unique_articles=articles["Article"].nunique(),
+        top_article=articles.loc[articles["Montant"].idxmax()] if not articles.empty else None
+    )
+
+
+# Fonction pour générer le rapport Word (filtres, vues et indicateurs déjà calculés)
+@profiled("consommation.report")
+def generate_word_document(filters: ConsumptionFilters, views: ConsumptionViews, kpis: ConsumptionKpis,
+                           progress: Optional[Callable[[float], None]] = None) -> io.BytesIO:
+    doc = Document()
+    images = ReportImages()
+    
+    # Title
+    title = doc.add_heading("Documentation du Tableau de Bord de Consommation 📊✨", level=1)
+    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    title.runs[0].font.size = Pt(16)
+
+    # Introduction
+    doc.add_heading("Introduction 🌟", level=2)
+    intro_text = (
+        f"Ce document décrit le **Tableau de Bord de Consommation**, une application interactive développée pour analyser les données de consommation issues du fichier `consommation.xlsx`. "
+        f"Les analyses sont filtrées pour l'organisation **{filters.org if filters.org != 'Tous' else 'toutes les organisations'}**, "
+        f"la catégorie **{filters.category if filters.category != 'Tous' else 'toutes les catégories'}**, et la période du **{filters.date_range[0]} au {filters.date_range[1]}**. "
+        f"Conçu pour les utilisateurs de tous niveaux, ce tableau de bord fournit des visualisations interactives, des analyses avancées, et des recommandations exploitables pour optimiser la gestion de la consommation. 🚀\n\n"
+        f"Dans le contexte de la gestion de la consommation, les entreprises font face à des défis tels que la maîtrise des coûts, l’optimisation des stocks, et la détection des anomalies. "
+        f"Ce tableau de bord répond à ces enjeux en offrant une vue d’ensemble des tendances de consommation, des catégories dominantes, et des articles les plus consommés, "
+        f"tout en identifiant les pics inhabituels pour une meilleure planification. 🌍"
+    )
+    doc.add_paragraph(intro_text)
+
+    # Data Processing
+    doc.add_heading("Traitement des Données 🗂️", level=2)
+    doc.add_paragraph(
+        "Le tableau de bord commence par charger et nettoyer les données du fichier Excel `consommation.xlsx`. "
+        "Cette étape garantit la fiabilité des analyses en corrigeant les erreurs, valeurs manquantes, et formats incohérents. 🧹"
+    )
+    data_steps = [
+        ("Chargement des Données 📥", 
+         "Le fichier Excel est lu avec Pandas. Les colonnes incluent : `Date` (date de consommation), `Org_Log` (organisation), `Desc_Cat` (catégorie), "
+         "`Article` (nom de l’article), `Qte` (quantité consommée), et `Montant` (coût total). Les lignes vides sont supprimées."),
+        ("Nettoyage des Données 🧼", 
+         "La colonne `Date` est convertie en format `datetime` (format attendu : `YYYYMMDD`). Les colonnes numériques (`Qte`, `Montant`) sont converties en nombres, "
+         "avec `0` pour les valeurs manquantes. Les colonnes `Org_Log`, `Desc_Cat`, et `Article` sont converties en chaînes de caractères, avec `'Inconnu'` pour les valeurs manquantes."),
+        ("Calculs Dérivés 🧮", 
+         "Le coût moyen par unité est calculé comme `Montant / Qte` (lorsque `Qte > 0`). Les données sont agrégées par article pour éviter les doublons dans certaines visualisations.")
+    ]
+    for title, desc in data_steps:
+        doc.add_heading(title, level=3)
+        doc.add_paragraph(desc)
+
+    # Global Metrics
+    doc.add_heading("Métriques Globales 📏", level=2)
+    doc.add_paragraph(f"Quantité Totale: {abbreviate_number(kpis.total_quantity)} unités 🛒")
+    doc.add_paragraph(f"Coût Total: {abbreviate_number(kpis.total_cost)} MAD 💸")
+    doc.add_paragraph(f"Coût Moyen par Jour: {abbreviate_number(kpis.cost_per_day)} MAD/j 📅")
+    doc.add_paragraph(f"Articles Uniques: {kpis.unique_articles} 🏷️")
+    if kpis.top_article is not None:
+        doc.add_paragraph(f"Article le Plus Coûteux: {sanitize_text(kpis.top_article['Article'])} ({abbreviate_number(kpis.top_article['Montant'])} MAD) 💰")
+
+    # Visualizations
+    doc.add_heading("Visualisations 📈🚀", level=2)
+    doc.add_paragraph(
+        "Les visualisations interactives, réalisées avec Plotly et un thème sombre, permettent d’explorer les données de consommation. "
+        "Chaque graphique répond à des questions spécifiques, comme l’identification des catégories coûteuses ou des tendances temporelles. 🎨"
+    )
+    visualizations = [
+        ("Tendance Temporelle 📅", 
+         "Une courbe montre l’évolution de la quantité ou du coût total par jour, avec une option de lissage (moyenne mobile)."),
+        ("Répartition par Catégorie 🥧", 
+         "Un graphique en donut affiche la part des coûts ou quantités par catégorie, avec les pourcentages et montants exacts au survol."),
+        ("Top Articles 🏆", 
+         "Un histogramme présente les 5 articles les plus consommés par quantité ou coût, avec des étiquettes claires."),
+        ("Répartition des Quantités par Organisation 📊", 
+         "Un graphique en boîte montre la variabilité des quantités consommées par organisation, mettant en évidence les médianes et valeurs aberrantes.")
+    ]
+    for title, desc in visualizations:
+        doc.add_heading(title, level=3)
+        doc.add_paragraph(desc)
+
+    # Embed Visualizations
+    doc.add_heading("Visualisations Graphiques 🖼️", level=2)
+    
+    # 1. Tendance Temporelle
+    doc.add_heading("Tendance Temporelle 📅", level=3)
+    fig_trend = px.line(
+        views.trend_data,
+        x='Date',
+        y='Valeur',
+        color='Métrique',
+        title=f"Tendance de {filters.trend_metric} au Fil du Temps",
+        labels={'Valeur': filters.trend_metric},
+        template='plotly_dark',
+        hover_data={'Valeur': ':,.2f'}
+    )
+    fig_trend.update_layout(font=dict(size=12), xaxis_tickangle=45)
+    images.add_picture(doc, fig_trend, width=Inches(6))
+
+    # 2. Répartition par Catégorie
+    doc.add_heading("Répartition par Catégorie 🥧", level=3)
+    if not views.cat_data.empty and isinstance(views.cat_data, pd.DataFrame) and 'Desc_Cat' in views.cat_data.columns and 'Valeur' in views.cat_data.columns:
+        fig_cat = px.pie(
+            views.cat_data,
+            names='Desc_Cat',
+            values='Valeur',
+            title=f"Répartition des {filters.cat_metric} par Catégorie",
+            template='plotly_dark',
+            color_discrete_sequence=px.colors.qualitative.Bold,
+            hover_data={'Valeur': ':,.2f'}
+        )
+        fig_cat.update_traces(textinfo="percent+label")
+        images.add_picture(doc, fig_cat, width=Inches(6))
+    else:
+        doc.add_paragraph("Aucune donnée disponible pour la répartition par catégorie. 😢")
+
+    # 3. Top Articles
+    doc.add_heading("Top Articles 🏆", level=3)
+    fig_top = px.bar(
+        views.top_articles,
+        x='Article',
+        y='Valeur',
+        title=f"Top 5 Articles par {filters.art_metric}",
+        labels={'Valeur': filters.art_metric},
+        template='plotly_dark',
+        hover_data={'Valeur': ':,.2f'},
+        text_auto=True
+    )
+    fig_top.update_layout(font=dict(size=12), xaxis_tickangle=45)
+    images.add_picture(doc, fig_top, width=Inches(6))
+
+    # 4. Répartition des Quantités par Organisation
+    doc.add_heading("Répartition des Quantités par Organisation 📊", level=3)
+    fig_box = px.box(
+        views.box_data,
+        x='Org_Log',
+        y='Qte',
+        title="Répartition des Quantités par Organisation",
+        template='plotly_dark',
+        hover_data={'Qte': ':,.2f'}
+    )
+    fig_box.update_layout(font=dict(size=12), xaxis_tickangle=45, showlegend=False)
+    images.add_picture(doc, fig_box, width=Inches(6))
+
+    # Advanced Analyses
+    doc.add_heading("Analyses Avancées 🔍🚀", level=2)
+    doc.add_paragraph(
+        "Des analyses statistiques et prédictives fournissent des insights approfondis pour anticiper la consommation et détecter les anomalies. 🧠"
+    )
+
+    # Demand Forecasting
+    doc.add_heading("Prévision de la Consommation 📈", level=3)
+    doc.add_paragraph(
+        f"Prévision de la consommation pour les {filters.forecast_count} articles les plus consommés sur les 6 prochains mois à l’aide du modèle {'retenu par backtest pour chaque article' if filters.forecast_model == 'Auto' else filters.forecast_model}. 🔮"
+    )
+    if not views.forecast_data.empty:
+        fig_forecast = px.line(
+            views.forecast_data,
+            x='Index',
+            y='Quantité',
+            color='Article',
+            line_dash='Type',
+            title='Prévision de la Consommation pour les Top Articles',
+            labels={'Index': 'Période'},
+            template='plotly_dark',
+            hover_data={'Quantité': ':,.2f'}
+        )
+        fig_forecast.update_layout(font=dict(size=12), xaxis_tickangle=45)
+        images.add_picture(doc, fig_forecast, width=Inches(6))
+    else:
+        doc.add_paragraph("Aucune donnée disponible pour la prévision de la consommation. 😢")
+
+    # Anomaly Detection
+    doc.add_heading("Détection des Anomalies ⚠️", level=3)
+    doc.add_paragraph(
+        "Identification des consommations inhabituelles par catégorie à l’aide des scores Z (Z > 3 ou < -3). 🕵️‍♂️"
+    )
+    if not views.anomaly_data.empty:
+        table = doc.add_table(rows=1, cols=len(views.anomaly_data.columns))
+        hdr_cells = table.rows[0].cells
+        for i, col in enumerate(views.anomaly_data.columns):
+            hdr_cells[i].text = col
+        for _, row in views.anomaly_data.head(10).iterrows():
+            row_cells = table.add_row().cells
+            for col_idx, value in enumerate(row):
+                row_cells[col_idx].text = sanitize_text(value)
+    else:
+        doc.add_paragraph("Aucune anomalie détectée. ✅")
+
+    # Insertion des graphiques rendus en parallèle
+    images.finish(progress=progress)
+
+    # Save document to buffer
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,724 @@
+import io
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.shared import Inches, Pt
+
+from anomalies import detect_anomalies, skipped_groups
+from forecasting import forecast_articles
+from ingestion import read_excel_cached
+from memory import compact_frame
+from profiling import profiled
+from report_images import ReportImages
+
+SOURCE = "demandes_achats.xlsx"
+# Nombre minimal de livraisons datées (livraison et promesse) pour classer un fournisseur par fiabilité
+MIN_TRACKED_DELIVERIES = 3
+# Fournisseurs repris dans le tableau du rapport Word (les plus grosses dépenses)
+SCORECARD_REPORT_ROWS = 15
+
+
+# Jeu chargé : demandes nettoyées et nombre de dates valides par colonne de date
+@dataclass(frozen=True)
+class ProcurementData:
+    df: pd.DataFrame
+    date_debug: Dict[str, int]
+
+
+# Filtres de l'interface ; hashable, il sert directement de clé de cache
+@dataclass(frozen=True)
+class ProcurementFilters:
+    category: str = "Toutes"
+    forecast_count: int = 5
+    robust_anomalies: bool = False
+    forecast_model: str = "Holt"
+
+
+# Données des graphiques et analyses ; les champs *_debug décrivent les données manquantes
+@dataclass
+class ProcurementViews:
+    spending_by_category: pd.DataFrame
+    spending_by_supplier: pd.DataFrame
+    status_counts: pd.DataFrame
+    delivery_data: pd.DataFrame
+    items_by_quantity: pd.DataFrame
+    interesting_fact: pd.Series
+    forecast_data: pd.DataFrame
+    category_spending: pd.DataFrame
+    supplier_volume: pd.DataFrame
+    article_category_data: pd.DataFrame
+    top_articles: pd.DataFrame
+    summary_data: pd.DataFrame
+    anomaly_data: pd.DataFrame
+    spending_trends: pd.DataFrame
+    reliability_data: pd.DataFrame
+    supplier_scorecard: pd.DataFrame
+    forecast_debug: List[str]
+    forecast_recommendations: List[str]
+    delivery_debug: str
+    category_spending_debug: str
+    supplier_volume_debug: str
+    article_category_debug: str
+    anomaly_debug: List[str]
+    spending_trends_debug: str
+    reliability_debug: str
+
+
+# Fonction pour charger et nettoyer les demandes d'achat (dates, numériques, compactage mémoire)
+# Les erreurs de lecture sont propagées : c'est à l'interface de les afficher
+def load_procurement(path: str = SOURCE) -> ProcurementData:
+    df = read_excel_cached(path, na_values=['', 'NA', 'NaT'])
+    df.columns = [col.strip().replace('"', '') for col in df.columns]
+    numeric_cols = ['quantite', 'prix_unitaire', 'montant', 'quantite_commande', 'quantite_recue', 'quantite_due']
+    for col in numeric_cols:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    df['categorie_achat_1'] = df['categorie_achat_1'].astype(str).fillna('Inconnu')
+    date_cols = ['date_commande', 'date_livraison', 'date_promesse']
+    date_debug = {}
+    for col in date_cols:
+        df[col] = pd.to_datetime(df[col], errors='coerce')
+        valid_count = df[col].notna().sum()
+        date_debug[col] = valid_count
+        if valid_count == 0:
+            df[col] = pd.to_datetime(df[col], errors='coerce', format='%d/%m/%Y')
+            valid_count = df[col].notna().sum()
+            date_debug[col] = valid_count
+    df = df.dropna(how='all')
+    # Compacter la mémoire : textes à faible cardinalité en category, entiers en 32 bits sans perte
+    df = compact_frame(df, "demandes_achats", [
+        'ste_site', 'org_log', 'demandeur', 'preparateur', 'acheteur_da', 'article', 'article_desc', 'categorie_desc',
+        'unite', 'acheteur_commande', 'fournisseur', 'lieu_livraison', 'type_destination', 'compte_imputation', 'devise',
+        'approvisionneur_central', 'categorie_achat_1', 'categorie_achat_1_desc', 'categorie_achat_2',
+        'categorie_achat_2_desc', 'categorie_achat_3', 'categorie_achat_3_desc', 'entite'
+    ])
+    return ProcurementData(df, date_debug)
+
+
+# Fonction pour calculer la fiche d'évaluation de tous les fournisseurs en un seul groupby
+# Délai = date_livraison - date_promesse (jours) ; une commande sans ces deux dates ne compte que dans le volume et la dépense
+def supplier_scorecard(df: pd.DataFrame) -> pd.DataFrame:
+    delay = (df['date_livraison'] - df['date_promesse']).dt.days
+    frame = pd.DataFrame({
+        'fournisseur': df['fournisseur'],
+        'montant': df['montant'],
+        'Délai': delay,
+        'À_Temps': (delay <= 0).astype('float64').where(delay.notna())
+    })
+    grouped = frame.groupby('fournisseur', observed=True)
+    scorecard = grouped.agg(
+        Nombre_Commandes=('montant', 'size'),
+        Dépense=('montant', 'sum'),
+        Livraisons_Suivies=('Délai', 'count'),
+        Délai_Moyen=('Délai', 'mean'),
+        Délai_Médian=('Délai', 'median'),
+        Taux_Livraison_À_Temps=('À_Temps', 'mean')
+    )
+    scorecard.insert(5, 'Délai_P90', grouped['Délai'].quantile(0.9))
+    scorecard['Taux_Livraison_À_Temps'] *= 100
+    return scorecard.reset_index()
+
+
+# Fonction pour calculer les données des graphiques et analyses avancées pour un jeu de filtres
+# Le DataFrame chargé n'est jamais modifié : les colonnes dérivées passent par assign
+def compute_views(data: ProcurementData, filters: ProcurementFilters) -> ProcurementViews:
+    df = data.df
+    forecast_count, robust_anomalies = filters.forecast_count, filters.robust_anomalies
+    if filters.category and filters.category != "Toutes":
+        df = df[df['categorie_achat_1'] == filters.category]
+    spending_by_category = df.groupby('categorie_achat_1', observed=True)['montant'].sum().reset_index().sort_values('montant', ascending=False).head(10)
+    spending_by_supplier = df.groupby('fournisseur', observed=True)['montant'].sum().reset_index().sort_values('montant', ascending=False).head(7)
+    status_counts = df['statut_approbation'].value_counts().reset_index()
+    status_counts.columns = ['statut_approbation', 'Nombre']
+    delivery_data = pd.DataFrame()
+    delivery_debug = ""
+    if df['date_livraison'].notnull().sum() > 0 and df['date_commande'].notnull().sum() > 0:
+        df = df.assign(Delivery_Days=(df['date_livraison'] - df['date_commande']).dt.days)
+        delivery_times = df.dropna(subset=['Delivery_Days', 'date_commande', 'date_livraison'])
+        if not delivery_times.empty:
+            delivery_times['Mois'] = delivery_times['date_commande'].dt.strftime('%b %Y')
+            delivery_data = delivery_times.groupby('Mois')['Delivery_Days'].mean().reset_index().sort_values('Mois')
+        delivery_debug = f"Lignes avec dates valides : {len(delivery_times)}"
+    else:
+        delivery_debug = f"Aucune date valide (date_commande : {df['date_commande'].notnull().sum()}, date_livraison : {df['date_livraison'].notnull().sum()})"
+    items_by_quantity = df.groupby('article_desc', observed=True)['quantite'].sum().reset_index()
+    items_by_quantity['article_desc'] = items_by_quantity['article_desc'].str.slice(0, 30)
+    items_by_quantity = items_by_quantity.sort_values('quantite', ascending=False).head(5)
+    supplier_category_spending = df.groupby(['fournisseur', 'categorie_achat_1'], observed=True)['montant'].sum().reset_index()
+    interesting_fact = supplier_category_spending.loc[supplier_category_spending['montant'].idxmax()]
+    forecast_debug = []
+    top_items = df.groupby('article_desc', observed=True)['quantite'].sum().nlargest(forecast_count).index.tolist()
+    use_dates = df['date_commande'].notnull().sum() >= len(df) * 0.5
+    top_items_df = df[df['article_desc'].isin(top_items)].dropna(subset=['quantite'])
+    series = {}
+    for item, item_data in top_items_df.groupby('article_desc', sort=False, observed=True)[['date_commande', 'quantite']]:
+        valid_records = len(item_data)
+        if valid_records < 3:
+            continue
+        if use_dates and item_data['date_commande'].notnull().sum() >= len(item_data) * 0.5:
+            item_data = item_data.groupby(item_data['date_commande'].dt.to_period('M'))['quantite'].sum().reset_index()
+            item_data['date_commande'] = item_data['date_commande'].dt.to_timestamp()
+            indices = item_data['date_commande']
+            forecast_steps = pd.date_range(start=indices.max() + pd.offsets.MonthBegin(1), periods=6, freq='M')
+        else:
+            indices = np.arange(valid_records)
+            forecast_steps = np.arange(valid_records, valid_records + 6)
+        series[item] = (indices, item_data['quantite'].values, forecast_steps)
+    valid_counts = top_items_df['article_desc'].value_counts()
+    for item in top_items:
+        if item not in series:
+            forecast_debug.append(f"Données insuffisantes pour {item} : {valid_counts.get(item, 0)} enregistrements")
+    # Holt : toutes les séries en une passe vectorisée ; ARIMA : ajustements en parallèle, mis en cache par contenu de série
+    series = {item: series[item] for item in top_items if item in series}
+    forecast_data, forecast_totals, forecast_errors = forecast_articles(series, model=filters.forecast_model)
+    for item in forecast_errors:
+        forecast_debug.append(f"Échec de la prévision pour {item} : Erreur du modèle {filters.forecast_model}")
+    forecast_recommendations = [
+        f"Stockez environ {int(total_forecast * 1.1)} unités de {item} pour couvrir la demande prévue sur 6 mois (10% de marge)."
+        for item, total_forecast in forecast_totals.items()
+    ]
+    spending_trends = pd.DataFrame()
+    spending_trends_debug = ""
+    if df['date_commande'].notnull().sum() > 0:
+        df = df.assign(Mois=df['date_commande'].dt.to_period('M').astype(str))
+        spending_trends = df.groupby(['Mois', 'categorie_achat_1'], observed=True)['montant'].sum().reset_index().sort_values('Mois')
+        spending_trends_debug = f"Lignes avec date_commande valide : {df['date_commande'].notnull().sum()}"
+    else:
+        spending_trends_debug = f"Aucune date_commande valide"
+    # Délais, taux à temps, volume et dépense de tous les fournisseurs ; le score de fiabilité en est extrait
+    scorecard = supplier_scorecard(df)
+    reliability_data = pd.DataFrame()
+    reliability_debug = ""
+    if df['date_livraison'].notnull().sum() > 0 and df['date_promesse'].notnull().sum() > 0:
+        reliability_data = scorecard.loc[
+            scorecard['Livraisons_Suivies'] >= MIN_TRACKED_DELIVERIES,
+            ['fournisseur', 'Délai_Moyen', 'Livraisons_Suivies', 'Taux_Livraison_À_Temps']
+        ].rename(columns={'Livraisons_Suivies': 'Nombre_Commandes'}).sort_values('Délai_Moyen').reset_index(drop=True)
+        reliability_debug = f"Fournisseurs avec ≥{MIN_TRACKED_DELIVERIES} commandes : {len(reliability_data)}"
+    else:
+        reliability_debug = f"Aucune date valide (date_livraison : {df['date_livraison'].notnull().sum()}, date_promesse : {df['date_promesse'].notnull().sum()})"
+    category_spending = df.groupby('categorie_achat_1', observed=True)['montant'].sum().reset_index()
+    category_spending = category_spending[category_spending['montant'] > 0]
+    category_spending_debug = f"Nombre de catégories avec dépenses : {len(category_spending)}"
+    supplier_volume = df.groupby('fournisseur', observed=True).size().reset_index(name='Nombre_Commandes')
+    supplier_volume = supplier_volume[supplier_volume['Nombre_Commandes'] >= 3].sort_values('Nombre_Commandes', ascending=False).head(5)
+    supplier_volume_debug = f"Fournisseurs avec ≥3 commandes : {len(supplier_volume)}"
+    article_category_data = df.groupby(['categorie_achat_1', 'article_desc'], observed=True)['quantite'].sum().reset_index()
+    article_category_data = article_category_data[article_category_data['quantite'] > 0]
+    # Le treemap regroupe sur le chemin : des colonnes category y produiraient le produit cartésien des niveaux
+    article_category_data = article_category_data.astype({'categorie_achat_1': str, 'article_desc': str})
+    top_articles = df.groupby(['article_desc', 'categorie_achat_1', 'fournisseur'], observed=True)\
+        .agg({'quantite': 'sum', 'montant': 'sum'})\
+        .reset_index()\
+        .sort_values('quantite', ascending=False)\
+        .head(10)
+    article_category_debug = f"Articles avec quantités : {len(article_category_data)}"
+    anomaly_debug = []
+    anomaly_data = pd.DataFrame()
+    try:
+        # Scores Z par catégorie en un seul groupby
+        anomaly_data = detect_anomalies(df, 'categorie_achat_1', 'montant', ['fournisseur', 'article_desc', 'categorie_achat_1', 'montant'], robust=robust_anomalies)
+        anomaly_data['article_desc'] = anomaly_data['article_desc'].astype(object)
+        anomaly_data['article_desc'] = anomaly_data['article_desc'].where(anomaly_data['article_desc'].isna(), anomaly_data['article_desc'].astype(str).str.slice(0, 30)).fillna('Inconnu')
+        for category, count in skipped_groups(df, 'categorie_achat_1', 'montant', robust=robust_anomalies).items():
+            anomaly_debug.append(f"Catégorie {category} : Données insuffisantes ({count} enregistrements) ou variance nulle")
+    except Exception as e:
+        anomaly_debug.append(f"Échec global de la détection des anomalies : {e}")
+    summary_data = pd.DataFrame({
+        'Métrique': ['Dépense totale (MAD)', 'Nombre de commandes', 'Catégorie principale'],
+        'Valeur': [
+            df['montant'].sum(),
+            len(df),
+            spending_by_category['categorie_achat_1'].iloc[0] if not spending_by_category.empty else 'N/A'
+        ]
+    })
+    return ProcurementViews(
+        spending_by_category=spending_by_category,
+        spending_by_supplier=spending_by_supplier,
+        status_counts=status_counts,
+        delivery_data=delivery_data,
+        items_by_quantity=items_by_quantity,
+        interesting_fact=interesting_fact,
+        forecast_data=forecast_data,
+        category_spending=category_spending,
+        supplier_volume=supplier_volume,
+        article_category_data=article_category_data,
+        top_articles=top_articles,
+        summary_data=summary_data,
+        anomaly_data=anomaly_data,
+        spending_trends=spending_trends,
+        reliability_data=reliability_data,
+        supplier_scorecard=scorecard,
+        forecast_debug=forecast_debug,
+        forecast_recommendations=forecast_recommendations,
+        delivery_debug=delivery_debug,
+        category_spending_debug=category_spending_debug,
+        supplier_volume_debug=supplier_volume_debug,
+        article_category_debug=article_category_debug,
+        anomaly_debug=anomaly_debug,
+        spending_trends_debug=spending_trends_debug,
+        reliability_debug=reliability_debug
+    )
+
+
+# Fonction pour générer le document Word avec descriptions détaillées, analyses théoriques et images des visualisations
+@profiled("da.report")
+def generate_word_document(filters: ProcurementFilters, views: ProcurementViews,
+                           progress: Optional[Callable[[float], None]] = None) -> io.BytesIO:
+    doc = Document()
+    images = ReportImages()
+    
+    # Titre
+    title = doc.add_heading("Documentation du Tableau de Bord des Achats 📊", level=1)
+    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    title.runs[0].font.size = Pt(16)
+
+    # Introduction
+    doc.add_heading("Introduction", level=2)
+    intro_text = (
+        f"Ce document décrit le **Tableau de Bord des Achats**, une application interactive développée pour **CMG Draa-Lasfar** "
+        f"afin d’analyser les données d’achat issues du fichier `demandes_achats.xlsx`. "
+        f"Les analyses sont filtrées pour la catégorie **{filters.category if filters.category != 'Toutes' else 'toutes les catégories'}**, permettant une exploration ciblée des données. "
+        f"Conçu pour les employés de Managem, y compris les utilisateurs non techniques, ce tableau de bord fournit des visualisations claires, "
+        f"des analyses avancées et des recommandations exploitables pour optimiser la gestion des achats. ⭐\n\n"
+        f"Dans le contexte de la gestion des achats, les entreprises comme CMG Draa-Lasfar font face à des défis tels que la maîtrise des coûts, "
+        f"la gestion des délais de livraison, et l’identification des fournisseurs fiables. Ce tableau de bord répond à ces enjeux en offrant une vue d’ensemble des dépenses, "
+        f"des performances des fournisseurs, et des tendances de la demande, tout en détectant les anomalies potentielles. "
+        f"Les insights générés aident à prendre des décisions stratégiques, comme négocier avec les fournisseurs clés ou planifier les stocks pour éviter les ruptures."
+    )
+    doc.add_paragraph(intro_text)
+
+    # Traitement des Données
+    doc.add_heading("Traitement des Données 🗂️", level=2)
+    doc.add_paragraph(
+        "Le tableau de bord commence par charger et nettoyer les données du fichier Excel `demandes_achats.xlsx`. "
+        "Cette étape est cruciale pour garantir la fiabilité des analyses, car les données brutes peuvent contenir des erreurs, des valeurs manquantes ou des formats incohérents. "
+        "Voici les étapes détaillées du traitement :"
+    )
+    data_steps = [
+        ("Chargement des Données", 
+         "Le fichier Excel est lu avec la bibliothèque Pandas. Les colonnes incluent : `article_desc` (description de l’article), `quantite` (quantité commandée), "
+         "`prix_unitaire` (coût par unité), `montant` (coût total), `fournisseur` (nom du fournisseur), `date_commande` (date de la commande), "
+         "`date_livraison` (date de livraison réelle), `date_promesse` (date de livraison promise), `statut_approbation` (statut de la commande), "
+         "et `categorie_achat_1` (catégorie d’achat). Les valeurs vides (ex. : `''`, `'NA'`, `'NaT'`) sont converties en `NaN` pour un traitement cohérent."),
+        ("Nettoyage des Colonnes", 
+         "Les noms de colonnes sont normalisés (suppression des espaces, guillemets) pour éviter les erreurs. Les colonnes numériques (`quantite`, `prix_unitaire`, `montant`, etc.) "
+         "sont converties en nombres, avec `0` pour les valeurs manquantes. La colonne `categorie_achat_1` est convertie en chaînes de caractères, avec `'Inconnu'` pour les valeurs manquantes, "
+         "ce qui évite les erreurs de type lors du filtrage ou de l’agrégation."),
+        ("Traitement des Dates", 
+         "Les colonnes de dates (`date_commande`, `date_livraison`, `date_promesse`) sont converties en format `datetime`. Les formats pris en charge incluent `YYYY-MM-DD` (par défaut) "
+         "et `DD/MM/YYYY` (en secours). Environ 6877 dates valides pour `date_commande` (92%), 4562 pour `date_livraison` (61%), et 6641 pour `date_promesse` (89%) ont été détectées. "
+         "Les dates manquantes sont conservées comme `NaT` pour éviter de fausser les analyses temporelles, comme les délais de livraison ou les tendances des dépenses."),
+        ("Suppression des Lignes Vides", 
+         "Les lignes entièrement vides sont supprimées pour garantir la qualité des données. Cela réduit le risque d’analyses biaisées dues à des enregistrements incomplets.")
+    ]
+    for title, desc in data_steps:
+        doc.add_heading(title, level=3)
+        doc.add_paragraph(desc)
+    doc.add_paragraph(
+        "Un rapport de débogage (`date_debug`) affiche le nombre de dates valides pour chaque colonne, permettant aux utilisateurs de vérifier la qualité des données. "
+        "Par exemple, un faible pourcentage de `date_livraison` valides (61%) peut limiter les analyses de fiabilité des fournisseurs."
+    )
+
+    # Visualisations
+    doc.add_heading("Visualisations 📈", level=2)
+    doc.add_paragraph(
+        "Le tableau de bord propose plusieurs visualisations interactives pour explorer les données d’achat, réalisées avec la bibliothèque Plotly et un thème sombre pour une lisibilité optimale. "
+        "Chaque visualisation est conçue pour répondre à des questions spécifiques de gestion des achats, comme l’identification des catégories coûteuses ou des fournisseurs dominants. "
+        "Voici une description détaillée de chaque visualisation :"
+    )
+    visualizations = [
+        ("Dépenses par Catégorie d’Achat", 
+         "Un histogramme montre les dépenses totales (`montant`) pour les 10 principales catégories (`categorie_achat_1`). Les barres sont ordonnées par montant décroissant, "
+         "avec des étiquettes claires (Catégorie sur l’axe X, Montant en MAD sur l’axe Y). En survolant une barre, l’utilisateur voit le montant exact formaté avec 2 décimales."),
+        ("Répartition des Dépenses par Fournisseur", 
+         "Un graphique en donut affiche la part des dépenses pour les 7 principaux fournisseurs. Chaque fournisseur est représenté par une couleur distincte, avec le montant exact visible au survol."),
+        ("Répartition des Statuts de Commande", 
+         "Un graphique en donut montre la distribution des statuts (`statut_approbation`, ex. : Approuvé, En attente, Rejeté). Le nombre de commandes par statut est affiché au survol, avec une légende interactive."),
+        ("Délai Moyen de Livraison", 
+         "Une courbe affiche le délai moyen de livraison (en jours, calculé comme `date_livraison - date_commande`) par mois (format : `MMM YYYY`). Elle nécessite des dates valides pour `date_commande` et `date_livraison`."),
+        ("Top 5 Articles par Quantité", 
+         "Un histogramme présente les 5 articles (`article_desc`) avec les quantités totales (`quantite`) les plus élevées. Les descriptions sont tronquées à 30 caractères pour la lisibilité."),
+        ("Répartition des Quantités par Catégorie et Article", 
+         "Une carte hiérarchique (treemap) montre les quantités par `categorie_achat_1` et `article_desc`. La taille des rectangles est proportionnelle à la quantité, avec des détails au survol."),
+        ("Volume de Commandes par Fournisseur", 
+         "Un histogramme affiche les 5 fournisseurs ayant au moins 3 commandes, ordonnés par nombre de commandes décroissant.")
+    ]
+    for title, desc in visualizations:
+        doc.add_heading(title, level=3)
+        doc.add_paragraph(desc)
+
+    # Ajout des images des visualisations
+    doc.add_heading("Visualisations Graphiques", level=2)
+    # 1. Dépenses par Catégorie d’Achat
+    doc.add_heading("Dépenses par Catégorie d’Achat", level=3)
+    fig_category = px.bar(
+        views.spending_by_category,
+        x='categorie_achat_1',
+        y='montant',
+        title='Dépenses par catégorie (MAD)',
+        labels={'categorie_achat_1': 'Catégorie', 'montant': 'Montant (MAD)'},
+        template='plotly_dark',
+        hover_data={'montant': ':,.2f'}
+    )
+    fig_category.update_layout(font=dict(size=12), xaxis_tickangle=45, yaxis_tickformat='.0s')
+    images.add_picture(doc, fig_category, width=Inches(6))
+
+    # 2. Répartition des Dépenses par Fournisseur
+    doc.add_heading("Répartition des Dépenses par Fournisseur", level=3)
+    fig_supplier = px.pie(
+        views.spending_by_supplier,
+        names='fournisseur',
+        values='montant',
+        title='Répartition des dépenses par fournisseur',
+        template='plotly_dark',
+        color_discrete_sequence=px.colors.qualitative.Bold,
+        hover_data={'montant': ':,.2f'}
+    )
+    fig_supplier.update_layout(font=dict(size=12), legend=dict(font=dict(size=12)))
+    images.add_picture(doc, fig_supplier, width=Inches(6))
+
+    # 3. Répartition des Statuts de Commande
+    doc.add_heading("Répartition des Statuts de Commande", level=3)
+    fig_status = px.pie(
+        views.status_counts,
+        names='statut_approbation',
+        values='Nombre',
+        title='Répartition des statuts de commande',
+        template='plotly_dark',
+        color_discrete_sequence=px.colors.qualitative.Set1,
+        hover_data={'Nombre': True}
+    )
+    fig_status.update_layout(font=dict(size=12), legend=dict(font=dict(size=12)))
+    images.add_picture(doc, fig_status, width=Inches(6))
+
+    # 4. Délai Moyen de Livraison
+    doc.add_heading("Délai Moyen de Livraison", level=3)
+    if not views.delivery_data.empty:
+        fig_delivery = px.line(
+            views.delivery_data,
+            x='Mois',
+            y='Delivery_Days',
+            title='Délai moyen de livraison (jours)',
+            labels={'Delivery_Days': 'Jours moyens'},
+            template='plotly_dark',
+            hover_data={'Delivery_Days': ':.2f'}
+        )
+        fig_delivery.update_layout(font=dict(size=12), xaxis_tickangle=45)
+        images.add_picture(doc, fig_delivery, width=Inches(6))
+    else:
+        doc.add_paragraph("Aucune donnée disponible pour le délai moyen de livraison.")
+
+    # 5. Top 5 Articles par Quantité
+    doc.add_heading("Top 5 Articles par Quantité", level=3)
+    fig_items = px.bar(
+        views.items_by_quantity,
+        x='article_desc',
+        y='quantite',
+        title='Top 5 articles par quantité',
+        labels={'article_desc': 'Article', 'quantite': 'Quantité'},
+        template='plotly_dark',
+        hover_data={'quantite': True}
+    )
+    fig_items.update_layout(font=dict(size=12), xaxis_tickangle=45)
+    images.add_picture(doc, fig_items, width=Inches(6))
+
+    # 6. Répartition des Quantités par Catégorie et Article
+    doc.add_heading("Répartition des Quantités par Catégorie et Article", level=3)
+    if not views.article_category_data.empty:
+        fig_treemap = px.treemap(
+            views.article_category_data,
+            path=['categorie_achat_1', 'article_desc'],
+            values='quantite',
+            title='Répartition des quantités par catégorie et article',
+            template='plotly_dark',
+            hover_data={'quantite': True}
+        )
+        fig_treemap.update_layout(font=dict(size=12))
+        images.add_picture(doc, fig_treemap, width=Inches(6))
+    else:
+        doc.add_paragraph("Aucune donnée disponible pour la répartition des quantités.")
+
+    # 7. Volume de Commandes par Fournisseur
+    doc.add_heading("Volume de Commandes par Fournisseur", level=3)
+    if not views.supplier_volume.empty:
+        fig_volume = px.bar(
+            views.supplier_volume,
+            x='fournisseur',
+            y='Nombre_Commandes',
+            title='Volume de commandes par fournisseur',
+            labels={'fournisseur': 'Fournisseur', 'Nombre_Commandes': 'Nombre de commandes'},
+            template='plotly_dark',
+            hover_data={'Nombre_Commandes': True}
+        )
+        fig_volume.update_layout(font=dict(size=12), xaxis_tickangle=45)
+        images.add_picture(doc, fig_volume, width=Inches(6))
+    else:
+        doc.add_paragraph("Aucun fournisseur avec ≥3 commandes.")
+
+    # 8. Prévision de la Demande
+    doc.add_heading("Prévision de la Demande", level=3)
+    if not views.forecast_data.empty:
+        fig_forecast = px.line(
+            views.forecast_data,
+            x='Index',
+            y='Quantité',
+            color='Article',
+            line_dash='Type',
+            title='Prévision de la demande pour les top articles',
+            labels={'Index': 'Période'},
+            template='plotly_dark',
+            hover_data={'Quantité': ':.2f'}
+        )
+        fig_forecast.update_layout(font=dict(size=12), xaxis_tickangle=45)
+        images.add_picture(doc, fig_forecast, width=Inches(6))
+    else:
+        doc.add_paragraph("Aucune donnée disponible pour la prévision de la demande.")
+
+    # 9. Tendances des Dépenses par Catégorie
+    doc.add_heading("Tendances des Dépenses par Catégorie", level=3)
+    if not views.spending_trends.empty:
+        fig_spending_trends = px.line(
+            views.spending_trends,
+            x='Mois',
+            y='montant',
+            color='categorie_achat_1',
+            title='Tendances des dépenses par catégorie',
+            labels={'montant': 'Montant (MAD)'},
+            template='plotly_dark',
+            hover_data={'montant': ':,.2f'}
+        )
+        fig_spending_trends.update_layout(font=dict(size=12), xaxis_tickangle=45)
+        images.add_picture(doc, fig_spending_trends, width=Inches(6))
+    else:
+        doc.add_paragraph("Aucune donnée disponible pour les tendances des dépenses.")
+
+    # 10. Score de Fiabilité des Fournisseurs
+    doc.add_heading("Score de Fiabilité des Fournisseurs", level=3)
+    if not views.reliability_data.empty:
+        fig_reliability = px.bar(
+            views.reliability_data,
+            x='fournisseur',
+            y='Taux_Livraison_À_Temps',
+            title='Taux de livraison à temps par fournisseur',
+            labels={'Taux_Livraison_À_Temps': 'Taux à temps (%)'},
+            template='plotly_dark',
+            hover_data={'Délai_Moyen': ':.2f', 'Nombre_Commandes': True}
+        )
+        fig_reliability.update_layout(font=dict(size=12), xaxis_tickangle=45)
+        images.add_picture(doc, fig_reliability, width=Inches(6))
+    else:
+        doc.add_paragraph("Aucune donnée disponible pour les scores de fiabilité.")
+
+    # 11. Répartition des Dépenses par Catégorie
+    doc.add_heading("Répartition des Dépenses par Catégorie", level=3)
+    if not views.category_spending.empty:
+        fig_category_spending = px.pie(
+            views.category_spending,
+            names='categorie_achat_1',
+            values='montant',
+            title='Répartition des dépenses par catégorie',
+            template='plotly_dark',
+            color_discrete_sequence=px.colors.qualitative.Bold,
+            hover_data={'montant': ':,.2f'}
+        )
+        fig_category_spending.update_layout(font=dict(size=12), legend=dict(font=dict(size=12)))
+        images.add_picture(doc, fig_category_spending, width=Inches(6))
+    else:
+        doc.add_paragraph("Aucune donnée disponible pour la répartition des dépenses.")
+
+    # Analyses Avancées
+    doc.add_heading("Analyses Avancées 🔍", level=2)
+    doc.add_paragraph(
+        "Le tableau de bord inclut des analyses avancées pour fournir des insights approfondis, basées sur des méthodes statistiques et prédictives. "
+        "Chaque analyse est accompagnée d’une explication théorique pour comprendre sa méthodologie et son application dans le contexte des achats. "
+        "Ces analyses aident à anticiper la demande, évaluer les fournisseurs, et détecter les anomalies."
+    )
+
+    # Prévision de la Demande (Holt, ARIMA ou modèle retenu par backtest)
+    holt = filters.forecast_model == "Holt"
+    auto = filters.forecast_model == "Auto"
+    doc.add_heading(f"Prévision de la Demande ({filters.forecast_model})", level=3)
+    doc.add_paragraph(
+        f"Cette analyse prévoit la demande pour les {filters.forecast_count} articles les plus commandés sur les 6 prochains mois à l’aide du modèle "
+        + ("de lissage exponentiel de Holt. " if holt else "retenu pour chaque article par validation glissante (backtest). " if auto
+           else "ARIMA (AutoRegressive Integrated Moving Average). ") +
+        "Elle utilise les données de `date_commande` et `quantite` pour générer des prévisions mensuelles, avec des recommandations de stock incluant une marge de 10%. "
+        "Par exemple, si 100 unités sont prévues, la recommandation est de stocker 110 unités pour couvrir les incertitudes."
+    )
+    doc.add_heading("Fondation Théorique", level=4)
+    if holt:
+        doc.add_paragraph(
+            "Le lissage exponentiel de Holt suit deux composantes mises à jour à chaque mois : "
+            "- **Niveau** : la demande de référence, corrigée d’une fraction alpha de l’erreur de prévision du mois. "
+            "- **Tendance** : la hausse ou la baisse mensuelle, corrigée d’une fraction beta de cette erreur et éventuellement amortie (phi) pour ne pas prolonger indéfiniment une pente. "
+            "Pour chaque article, les paramètres retenus sont ceux qui minimisent l’erreur de prévision à un mois sur l’historique ; "
+            "tous les articles sont ajustés en une seule passe, ce qui permet de prévoir des milliers d’articles en moins d’une seconde. "
+            "Les données sont agrégées par mois si `date_commande` est disponible, sinon un index numérique est utilisé."
+        )
+    elif auto:
+        doc.add_paragraph(
+            "Plusieurs modèles candidats sont évalués pour chaque article : prévision naïve (dernier mois), moyenne mobile sur 3 mois, lissage de Holt "
+            "et plusieurs ordres ARIMA. L’évaluation est une validation glissante : le modèle est ajusté sur l’historique jusqu’à une date d’origine, "
+            "puis ses prévisions des 3 mois suivants sont comparées aux quantités réelles, pour 3 origines successives. "
+            "Le modèle de plus faible erreur absolue moyenne est retenu ; à erreur égale, le plus simple l’emporte. "
+            "Le choix est mémorisé et n’est réévalué que lorsqu’un nouveau mois complet s’ajoute à l’historique de l’article."
+        )
+    else:
+        doc.add_paragraph(
+            "ARIMA est un modèle de séries temporelles qui capture les tendances, la saisonnalité et les variations aléatoires dans les données. Il se compose de trois composantes : "
+            "- **AR (AutoRegression)** : Modélise la dépendance des valeurs actuelles sur les valeurs passées (ex. : la demande d’un mois influence le suivant). "
+            "- **I (Integrated)** : Applique une différenciation pour rendre la série stationnaire, c’est-à-dire sans tendance globale (ex. : soustraire la demande du mois précédent). "
+            "- **MA (Moving Average)** : Prend en compte les erreurs de prédiction passées pour lisser les fluctuations. "
+            "Dans ce tableau de bord, ARIMA (1,1,1) est utilisé, ce qui signifie une autoregression d’ordre 1, une différenciation d’ordre 1, et une moyenne mobile d’ordre 1. "
+            "Les données sont agrégées par mois si `date_commande` est disponible (6877 dates valides), sinon un index numérique est utilisé. "
+            "Cette approche est idéale pour prévoir la demande dans un contexte d’achat où la saisonnalité (ex. : pics de demande) et les tendances (ex. : croissance des commandes) sont courantes."
+        )
+    doc.add_heading("Application aux Achats", level=4)
+    doc.add_paragraph(
+        "Pour CMG Draa-Lasfar, cette analyse aide à planifier les stocks pour éviter les ruptures, qui peuvent perturber les opérations. Par exemple, si un article critique comme un composant minier "
+        f"montre une demande croissante, la prévision {filters.forecast_model} permet de commander à l’avance, réduisant les coûts d’urgence. Les recommandations de stock incluent une marge de 10% pour absorber les imprévus, "
+        "comme des retards de livraison ou des variations soudaines de la demande."
+    )
+
+    # Tendances des Dépenses
+    doc.add_heading("Tendances des Dépenses par Catégorie", level=3)
+    doc.add_paragraph(
+        "Une courbe montre l’évolution des dépenses (`montant`) par `categorie_achat_1` au fil des mois, basée sur `date_commande`. "
+        "Les données sont agrégées par mois pour révéler les tendances saisonnières ou les anomalies. Cette visualisation est particulièrement utile pour identifier les périodes de dépenses élevées "
+        "et ajuster les budgets en conséquence."
+    )
+    doc.add_heading("Fondation Théorique", level=4)
+    doc.add_paragraph(
+        "L’analyse des tendances repose sur l’agrégation temporelle et la visualisation des séries temporelles. En regroupant les dépenses par mois et catégorie, le tableau de bord détecte des schémas "
+        "tels que des pics saisonniers (ex. : achats accrus en fin d’année) ou des anomalies (ex. : dépense inhabituelle dans une catégorie). "
+        "Cette approche est ancrée dans l’analyse exploratoire des données (EDA), qui vise à identifier des patterns sans hypothèses préalables."
+    )
+    doc.add_heading("Application aux Achats", level=4)
+    doc.add_paragraph(
+        "À CMG Draa-Lasfar, comprendre les tendances des dépenses permet de planifier les budgets et de négocier avec les fournisseurs avant les périodes de forte demande. "
+        "Par exemple, si une catégorie comme les équipements miniers montre des dépenses croissantes en été, l’entreprise peut anticiper et négocier des rabais à l’avance."
+    )
+
+    # Score de Fiabilité des Fournisseurs
+    doc.add_heading("Score de Fiabilité des Fournisseurs", level=3)
+    doc.add_paragraph(
+        "Cette analyse évalue les fournisseurs selon leur ponctualité de livraison, en calculant le délai moyen (`Délai_Moyen` = `date_livraison - date_promesse` en jours) "
+        "et le taux de livraison à temps (`Taux_Livraison_À_Temps` = pourcentage de livraisons où `Délai_Moyen ≤ 0`). "
+        "Seuls les fournisseurs avec au moins 3 commandes sont inclus pour garantir des résultats significatifs. Les résultats sont affichés dans un histogramme et un tableau détaillé."
+    )
+    doc.add_heading("Fondation Théorique", level=4)
+    doc.add_paragraph(
+        "La fiabilité des fournisseurs est mesurée à l’aide de deux métriques de performance : "
+        "- **Délai Moyen** : Moyenne des écarts entre la date de livraison réelle et promise, exprimée en jours. Un délai négatif ou nul indique une livraison à temps ou en avance. "
+        "- **Taux de Livraison à Temps** : Proportion des commandes livrées à temps, exprimée en pourcentage. Cette métrique est calculée comme la moyenne des cas où `Délai_Moyen ≤ 0`. "
+        "Ces métriques sont standard dans la gestion de la chaîne d’approvisionnement, où la ponctualité est essentielle pour minimiser les interruptions. "
+        "L’approche repose sur l’agrégation statistique (moyenne, comptage) et le filtrage pour assurer la robustesse (ex. : ≥3 commandes)."
+    )
+    doc.add_heading("Application aux Achats", level=4)
+    doc.add_paragraph(
+        "Pour CMG Draa-Lasfar, cette analyse identifie les fournisseurs les plus fiables pour prioriser les partenariats stratégiques. Par exemple, un fournisseur avec un `Taux_Livraison_À_Temps` de 90% "
+        "est préférable pour les articles critiques, réduisant les risques de retards. À l’inverse, un fournisseur avec des délais moyens élevés peut nécessiter une renégociation ou un remplacement."
+    )
+    doc.add_heading("Fiche d’Évaluation des Fournisseurs", level=4)
+    doc.add_paragraph(
+        f"Le tableau ci-dessous reprend les {SCORECARD_REPORT_ROWS} fournisseurs aux plus fortes dépenses. Outre le délai moyen, le délai médian et le 90e centile "
+        "(délai dépassé par une livraison sur dix seulement) distinguent un retard ponctuel d’un retard systématique. "
+        "Les délais et le taux à temps ne portent que sur les livraisons dont les dates de livraison et de promesse sont connues."
+    )
+    top_suppliers = views.supplier_scorecard.sort_values('Dépense', ascending=False).head(SCORECARD_REPORT_ROWS)
+    if not top_suppliers.empty:
+        headers = ['Fournisseur', 'Commandes', 'Dépense (MAD)', 'Délai moyen (j)', 'Délai médian (j)', 'Délai P90 (j)', 'Taux à temps (%)']
+        table = doc.add_table(rows=1, cols=len(headers))
+        table.style = 'Table Grid'
+        for cell, header in zip(table.rows[0].cells, headers):
+            cell.text = header
+        for row in top_suppliers.itertuples(index=False):
+            values = [
+                str(row.fournisseur), f"{row.Nombre_Commandes:,}", f"{row.Dépense:,.0f}",
+                *(f"{value:.1f}" if pd.notna(value) else "-" for value in
+                  (row.Délai_Moyen, row.Délai_Médian, row.Délai_P90, row.Taux_Livraison_À_Temps))
+            ]
+            for cell, value in zip(table.add_row().cells, values):
+                cell.text = value
+    else:
+        doc.add_paragraph("Aucune donnée disponible pour la fiche d’évaluation des fournisseurs.")
+
+    # Détection des Anomalies
+    doc.add_heading("Détection des Anomalies", level=3)
+    doc.add_paragraph(
+        "Cette analyse identifie les dépenses inhabituelles dans chaque catégorie (`categorie_achat_1`) en utilisant les scores Z. "
+        "Les anomalies sont des enregistrements où le montant est significativement différent de la moyenne (score Z > 3 ou < -3). "
+        "Les résultats sont présentés dans un tableau avec le fournisseur, l’article, la catégorie, et le montant."
+    )
+    doc.add_heading("Fondation Théorique", level=4)
+    doc.add_paragraph(
+        "Les scores Z mesurent l’écart d’une valeur par rapport à la moyenne, normalisé par l’écart-type : "
+        "`Z = (x - moyenne) / écart-type`. Sous l’hypothèse d’une distribution normale, environ 99,7% des données se trouvent dans un intervalle de ±3 écarts-types. "
+        "Un score Z supérieur à 3 indique une valeur extrême (anomalie). Cette méthode est largement utilisée en détection d’outliers, particulièrement dans les données financières "
+        "où des dépenses inhabituelles peuvent signaler des erreurs ou des fraudes."
+    )
+    doc.add_heading("Application aux Achats", level=4)
+    doc.add_paragraph(
+        "À CMG Draa-Lasfar, les anomalies peuvent indiquer des erreurs de facturation, des achats non autorisés, ou des prix excessifs. Par exemple, un `montant` anormalement élevé pour un article "
+        "dans la catégorie des fournitures peut déclencher une investigation pour vérifier la validité de la transaction. Cette analyse renforce l’intégrité des processus d’achat."
+    )
+
+    # Fonctionnalités Interactives
+    doc.add_heading("Fonctionnalités Interactives 🖱️", level=2)
+    doc.add_paragraph(
+        "Le tableau de bord est conçu pour être intuitif et interactif, facilitant l’exploration des données par les utilisateurs de tous niveaux. Voici les principales fonctionnalités :"
+    )
+    interactions = [
+        ("Filtre par Catégorie", 
+         "Une barre latérale permet de sélectionner une catégorie (`categorie_achat_1`) ou 'Toutes'. Ce filtre met à jour toutes les visualisations et analyses en temps réel, "
+         "permettant une analyse ciblée. Par exemple, sélectionner une catégorie comme 'Équipements' concentre les résultats sur cette catégorie, facilitant l’identification des fournisseurs clés."),
+        ("Sections Dépliables", 
+         "Les analyses avancées (prévisions, fiabilité, anomalies) sont organisées dans des sections rétractables pour une navigation claire. Chaque section inclut des explications et des messages de débogage "
+         "si les données sont insuffisantes, aidant les utilisateurs à comprendre les limitations (ex. : trop de dates manquantes)."),
+        ("Métriques Clés", 
+         "Trois cartes en haut affichent la dépense totale (formatée comme `1.2M`), le nombre de commandes, et le nombre de fournisseurs uniques. Ces métriques offrent un aperçu rapide des performances globales."),
+        ("Téléchargement des Rapports", 
+         "Les utilisateurs peuvent télécharger un résumé CSV (`rapport_achats.csv`) avec les métriques clés et cette documentation Word (`Documentation_Tableau_de_Bord_Achats.docx`). "
+         "Le document Word reflète la catégorie sélectionnée, offrant un guide personnalisé.")
+    ]
+    for title, desc in interactions:
+        doc.add_heading(title, level=3)
+        doc.add_paragraph(desc)
+
+    # Recommandations
+    doc.add_heading("Recommandations ✅", level=2)
+    doc.add_paragraph(
+        "Le tableau de bord fournit des recommandations exploitables pour optimiser la gestion des achats à CMG Draa-Lasfar. Ces recommandations sont dérivées des analyses et visualisations :"
+    )
+    recommendations = [
+        "Négocier avec les fournisseurs clés identifiés dans la répartition des dépenses pour obtenir des rabais ou des conditions avantageuses.",
+        f"Planifier les stocks en fonction des prévisions {filters.forecast_model} pour éviter les ruptures, particulièrement pour les articles critiques.",
+        "Simplifier le processus d’approbation des commandes pour réduire les délais, en s’appuyant sur l’analyse des statuts.",
+        "Investiguer les anomalies détectées pour identifier les erreurs, fraudes, ou opportunités d’optimisation des coûts.",
+        "Prioriser les fournisseurs avec un `Taux_Livraison_À_Temps` élevé pour garantir la continuité des opérations."
+    ]
+    for rec in recommendations:
+        doc.add_paragraph(f"- {rec}")
+
+    # Notes Techniques
+    doc.add_heading("Notes Techniques 🛠️", level=2)
+    doc.add_paragraph(
+        "Fichier requis : `demandes_achats.xlsx` dans le même répertoire que le script. "
+        "Bibliothèques utilisées : Streamlit (interface), Pandas (données), Plotly (visualisations), Openpyxl (Excel), Statsmodels (ARIMA), Scipy (anomalies), Python-docx (Word), Kaleido (export d’images). "
+        "Installation : `pip install streamlit pandas plotly openpyxl statsmodels scipy python-docx kaleido`. "
+        "Lancement : `streamlit run procurement_dashboard.py`."
+    )
+
+    # Insertion des graphiques rendus en parallèle
+    images.finish(progress=progress)
+
+    # Sauvegarde dans un buffer
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    buffer.seek(0)
+    return buffer
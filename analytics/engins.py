@@ -0,0 +1,432 @@
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.shared import Inches
+
+from filters import sort_by_date, date_range_slice, filter_values
+from memory import compact_frame
+from profiling import profiled
+from report_images import ReportImages
+
+SOURCE = "engins2.xlsx"
+SHEET_NAME = "BASE DE DONNEE"
+
+# Liste des engins spécifiques à analyser
+ENGINS_CIBLES = [
+    'CHARGEUSE CATERPILLAR 10T   R1600 Nｰ14 DS',
+    'CHARGEUSE CATERPILLAR R 1600H Nｰ15 DS',
+    'Chargeuse CATERPILLAR 10T  R1600 Nｰ16',
+    'Chargeuse CATERPILLAR 10T R1600 Nｰ17',
+    'Chargeuse  CAT    R1600 10T  Nｰ18',
+    'CHARGEUSE CATERPILLAR R 1600 Nｰ20',
+    'CHARGEUSE CATERPILLAR R 1600 Nｰ21',
+    'CHARGEUSE CATERPILLAR R1600 Nｰ22',
+    'CHARGEUSE CATERPILLAR R1600 Nｰ23'
+]
+
+# Mois en français
+MONTHS_FR = {
+    'January': 'Janvier', 'February': 'Février', 'March': 'Mars',
+    'April': 'Avril', 'May': 'Mai', 'June': 'Juin',
+    'July': 'Juillet', 'August': 'Août', 'September': 'Septembre',
+    'October': 'Octobre', 'November': 'Novembre', 'December': 'Décembre'
+}
+MONTH_ORDER = ['Janvier', 'Février', 'Mars', 'Avril', 'Mai', 'Juin', 
+               'Juillet', 'Août', 'Septembre', 'Octobre', 'Novembre', 'Décembre']
+
+
+# Indicateurs de la flotte R1600 (toutes interventions)
+@dataclass(frozen=True)
+class FleetKpis:
+    total_cost: float
+    top_engine: str
+    top_category: str
+    avg_cost: float
+
+
+# Indicateurs clés d'un engin
+@dataclass(frozen=True)
+class EnginMetrics:
+    last_month: float
+    avg_3m: float
+    max_cost: float
+    total_cost: float
+    num_interventions: int
+    median_cost: float
+    cost_variance: float
+
+
+# Prévision du coût mensuel d'un engin (moyenne des 3 derniers mois, intervalle à 95 %)
+@dataclass(frozen=True)
+class CostPrediction:
+    avg: float
+    ci_lower: float
+    ci_upper: float
+    reliability: float
+    trend: str
+
+
+# Projection linéaire des dépenses sur les mois suivant la dernière intervention
+@dataclass(frozen=True)
+class CostProjection:
+    dates: List[pd.Timestamp]
+    values: np.ndarray
+
+
+# Projection linéaire de toute la flotte
+# summary : une ligne par engin (pente, projections M+1..M+n, marge à 95 %)
+# points : une ligne par engin et mois projeté (Projection, Basse, Haute) pour le graphique
+@dataclass(frozen=True)
+class FleetProjection:
+    summary: pd.DataFrame
+    points: pd.DataFrame
+
+
+# Séries d'un engin calculées une seule fois et partagées par les indicateurs, la prévision et la projection
+# monthly : montant par mois (groupé par nom de mois, dans l'ordre des catégories de 'Mois')
+# daily : montant par date (trié)
+@dataclass(frozen=True)
+class EnginSeries:
+    monthly: pd.Series
+    daily: pd.Series
+    max_cost: float
+    total_cost: float
+    num_interventions: int
+    median_cost: float
+    cost_variance: float
+
+    @property
+    def last_date(self) -> pd.Timestamp:
+        return self.daily.index[-1] if not self.daily.empty else pd.NaT
+
+
+# Fonction pour charger les interventions des engins R1600 (nettoyage, numéro d'engin, mois en français)
+# Les erreurs de lecture sont propagées : c'est à l'interface de les afficher
+def load_engins(path: str = SOURCE) -> pd.DataFrame:
+    df = pd.read_excel(path, sheet_name=SHEET_NAME)
+    
+    # Nettoyage des données
+    df['Desc_CA'] = df['Desc_CA'].str.replace('', '').str.strip()
+    df['Desc_Cat'] = df['Desc_Cat'].str.strip()
+    df['Montant'] = pd.to_numeric(df['Montant'], errors='coerce')
+    df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
+    
+    # Filtrer uniquement les engins cibles
+    df = df[df['Desc_CA'].isin(ENGINS_CIBLES)].copy()
+    
+    # Extraire le numéro de l'engin et créer un nom standardisé
+    df['Numéro_Engin'] = df['Desc_CA'].str.extract(r'Nｰ(\d+)')
+    df['Engin_Formaté'] = 'R1600-' + df['Numéro_Engin']
+    df['Mois'] = df['Date'].dt.month_name().map(MONTHS_FR)
+    
+    # Compacter la mémoire : textes à faible cardinalité en category, entiers en 32 bits sans perte
+    df = compact_frame(df, "engins_r1600", ['Desc_CA', 'Desc_Cat', 'CATEGORIE', 'Numéro_Engin', 'Engin_Formaté', 'Mois'])
+    
+    # Tri par date pour les filtres de période par recherche dichotomique
+    return sort_by_date(df)
+
+
+# Fonction pour filtrer les interventions par engin ('Tous' pour la flotte) et par période
+def filter_engins(df: pd.DataFrame, engin: str = 'Tous', date_range: Tuple = ()) -> pd.DataFrame:
+    if engin != 'Tous':
+        df = filter_values(df, 'Engin_Formaté', engin)
+    if len(date_range) == 2:  # Vérifie qu'une plage complète est sélectionnée
+        start_date, end_date = date_range
+        df = date_range_slice(df, start_date, end_date)
+    return df
+
+
+# Fonction pour calculer les indicateurs de la flotte
+def compute_fleet_kpis(df: pd.DataFrame) -> FleetKpis:
+    return FleetKpis(
+        total_cost=df['Montant'].sum(),
+        top_engine=df.groupby('Engin_Formaté', observed=True)['Montant'].sum().idxmax(),
+        top_category=df.groupby('Desc_Cat', observed=True)['Montant'].sum().idxmax(),
+        avg_cost=df['Montant'].mean()
+    )
+
+
+# Fonction pour calculer les coûts mensuels (mois dans l'ordre du calendrier)
+def monthly_costs(data: pd.DataFrame) -> pd.DataFrame:
+    return calendar_months(data.groupby('Mois', observed=True)['Montant'].sum())
+
+
+# Fonction pour remettre une série de montants par mois dans l'ordre du calendrier (tableau Mois, Montant)
+def calendar_months(monthly: pd.Series) -> pd.DataFrame:
+    monthly_data = monthly.reset_index()
+    monthly_data['Mois'] = pd.Categorical(monthly_data['Mois'], categories=MONTH_ORDER, ordered=True)
+    return monthly_data.sort_values('Mois')
+
+
+# Fonction pour calculer la répartition des coûts par catégorie
+def category_breakdown(data: pd.DataFrame) -> pd.DataFrame:
+    return data.groupby('Desc_Cat', observed=True)['Montant'].sum().reset_index()
+
+
+# Fonction pour calculer les séries d'un seul engin (ou d'un sous-ensemble quelconque d'interventions)
+def engin_series(data: pd.DataFrame) -> EnginSeries:
+    amounts = data['Montant']
+    return EnginSeries(
+        monthly=data.groupby('Mois', observed=True)['Montant'].sum(),
+        daily=data.groupby('Date')['Montant'].sum(),
+        max_cost=amounts.max(),
+        total_cost=amounts.sum(),
+        num_interventions=len(data),
+        median_cost=amounts.median(),
+        cost_variance=amounts.var() if len(data) > 1 else 0
+    )
+
+
+# Fonction pour calculer les séries de tous les engins en une passe (un groupby par niveau d'agrégation)
+# date_range : plage (début, fin) ou () pour tout l'historique ; renvoie engin formaté -> EnginSeries
+def build_series_store(df: pd.DataFrame, date_range: Tuple = ()) -> Dict[str, EnginSeries]:
+    data = filter_engins(df, 'Tous', date_range)
+    monthly = data.groupby(['Engin_Formaté', 'Mois'], observed=True)['Montant'].sum()
+    daily = data.groupby(['Engin_Formaté', 'Date'], observed=True)['Montant'].sum()
+    stats = data.groupby('Engin_Formaté', observed=True)['Montant'].agg(['max', 'sum', 'size', 'median', 'var'])
+    monthly_by_engin = {engin: series.droplevel(0) for engin, series in monthly.groupby(level=0, observed=True)}
+    daily_by_engin = {engin: series.droplevel(0) for engin, series in daily.groupby(level=0, observed=True)}
+    # Un engin dont toutes les dates sont invalides figure dans stats mais pas dans les séries datées
+    no_monthly, no_daily = monthly.iloc[:0].droplevel(0), daily.iloc[:0].droplevel(0)
+    return {
+        engin: EnginSeries(
+            monthly=monthly_by_engin.get(engin, no_monthly),
+            daily=daily_by_engin.get(engin, no_daily),
+            max_cost=row['max'],
+            total_cost=row['sum'],
+            num_interventions=int(row['size']),
+            median_cost=row['median'],
+            cost_variance=row['var'] if row['size'] > 1 else 0
+        )
+        for engin, row in stats.iterrows()
+    }
+
+
+# Fonction pour projeter les dépenses par une droite des moindres carrés (au moins 3 interventions)
+def cost_projection(series: EnginSeries, periods: int = 3) -> Optional[CostProjection]:
+    if series.num_interventions < 3 or series.daily.empty:
+        return None
+    dates = series.daily.index
+    x = np.arange(len(dates))
+    coeff = np.polyfit(x, series.daily.values, 1)
+    future_dates = [dates[-1] + pd.DateOffset(months=i) for i in range(1, periods + 1)]
+    return CostProjection(future_dates, np.polyval(coeff, x[-1] + np.arange(1, periods + 1)))
+
+
+# Fonction pour projeter les dépenses de tous les engins en une passe : moindres carrés groupés sur une matrice date x engin
+# Chaque engin garde sa propre abscisse (rang de la date d'intervention), comme cost_projection ;
+# la marge à 95 % vient de l'écart-type des résidus (n - 2 degrés de liberté)
+@profiled("engins.fleet_projection")
+def fleet_projection(store: Dict[str, EnginSeries], periods: int = 3) -> FleetProjection:
+    eligible = {engin: series for engin, series in store.items()
+                if series.num_interventions >= 3 and len(series.daily) >= 2}
+    if not eligible:
+        return FleetProjection(pd.DataFrame(), pd.DataFrame())
+    matrix = pd.concat({engin: series.daily for engin, series in eligible.items()}, axis=1)
+    observed = matrix.notna().to_numpy()
+    y = np.where(observed, matrix.to_numpy(dtype='float64'), 0.0)
+    x = np.where(observed, np.cumsum(observed, axis=0) - 1, 0).astype('float64')
+    n = observed.sum(axis=0)
+    x_mean = x.sum(axis=0) / n
+    y_mean = y.sum(axis=0) / n
+    dx = np.where(observed, x - x_mean, 0.0)
+    slope = (dx * (y - y_mean)).sum(axis=0) / (dx ** 2).sum(axis=0)
+    intercept = y_mean - slope * x_mean
+    residuals = np.where(observed, y - (intercept + slope * x), 0.0)
+    sigma = np.sqrt((residuals ** 2).sum(axis=0) / np.maximum(n - 2, 1))
+    margin = 1.96 * np.where(n > 2, sigma, 0.0)
+    steps = np.arange(1, periods + 1)
+    projection = intercept + slope * (n - 1 + steps[:, None])  # mois projetés x engins
+
+    engins = list(eligible)
+    summary = pd.DataFrame({
+        'Engin': engins,
+        'Interventions': [eligible[engin].num_interventions for engin in engins],
+        'Dernière intervention': [eligible[engin].last_date for engin in engins],
+        'Pente (MAD/date)': slope,
+        **{f'M+{step}': projection[i] for i, step in enumerate(steps)},
+        'Marge 95 % (MAD)': margin
+    }).sort_values(f'M+{periods}', ascending=False, ignore_index=True)
+    points = pd.DataFrame({
+        'Engin': np.tile(engins, periods),
+        'Date': [eligible[engin].last_date + pd.DateOffset(months=int(step)) for step in steps for engin in engins],
+        'Projection': projection.ravel(),
+        'Basse': np.clip(projection - margin, 0, None).ravel(),
+        'Haute': (projection + margin).ravel()
+    })
+    return FleetProjection(summary, points)
+
+
+# Fonction pour calculer les indicateurs clés d'un engin
+def compute_metrics(series: EnginSeries) -> EnginMetrics:
+    monthly = series.monthly
+    return EnginMetrics(
+        last_month=monthly.iloc[-1] if not monthly.empty else 0,
+        avg_3m=monthly.tail(3).mean() if len(monthly) >= 3 else 0,
+        max_cost=series.max_cost,
+        total_cost=series.total_cost,
+        num_interventions=series.num_interventions,
+        median_cost=series.median_cost,
+        cost_variance=series.cost_variance
+    )
+
+
+# Fonction pour présenter les indicateurs clés (libellé -> valeur formatée), comme dans le rapport Word
+def format_metrics(metrics: EnginMetrics) -> Dict[str, object]:
+    return {
+        'Dernier mois': f"{metrics.last_month:,.0f} MAD",
+        'Moyenne 3 mois': f"{metrics.avg_3m:,.0f} MAD",
+        'Coût maximal': f"{metrics.max_cost:,.0f} MAD",
+        'Coût total': f"{metrics.total_cost:,.0f} MAD",
+        'Interventions': metrics.num_interventions,
+        'Coût médian': f"{metrics.median_cost:,.0f} MAD",
+        'Variance des coûts': f"{metrics.cost_variance:,.0f} MAD²"
+    }
+
+
+# Fonction pour prévoir le coût mensuel d'un engin ; None si moins de 3 interventions
+def compute_prediction(series: EnginSeries) -> Optional[CostPrediction]:
+    if series.num_interventions < 3:
+        return None
+    monthly = series.monthly
+    last_3 = monthly.tail(3)
+    avg = last_3.mean()
+    std = last_3.std() if len(last_3) > 1 else 0
+    num_months = len(monthly)
+    reliability = min(90, 50 + 5 * num_months - 10 * (std / avg if avg > 0 else 0))
+    reliability = max(50, reliability)
+    ci_lower = avg - 1.96 * std / np.sqrt(len(last_3)) if std > 0 else avg * 0.7
+    ci_upper = avg + 1.96 * std / np.sqrt(len(last_3)) if std > 0 else avg * 1.3
+    # Determine trend based on last 3 months
+    trend = 'Stable'
+    if len(last_3) >= 2:
+        trend_values = last_3.values
+        if trend_values[-1] > trend_values[-2] * 1.1:
+            trend = 'Hausse'
+        elif trend_values[-1] < trend_values[-2] * 0.9:
+            trend = 'Baisse'
+    return CostPrediction(avg, ci_lower, ci_upper, reliability, trend)
+
+
+# Fonction pour tabuler la prévision sur les 3 mois suivant la dernière intervention (export CSV)
+def prediction_table(series: EnginSeries, prediction: CostPrediction) -> pd.DataFrame:
+    future_dates = pd.date_range(
+        start=series.last_date + pd.DateOffset(months=1),
+        periods=3, freq='M'
+    )
+    return pd.DataFrame({
+        'Mois': future_dates.strftime('%Y-%m'),
+        'Estimation Moyenne (MAD)': [prediction.avg]*3,
+        'Intervalle Bas (MAD)': [prediction.ci_lower]*3,
+        'Intervalle Haut (MAD)': [prediction.ci_upper]*3,
+        'Fiabilité (%)': [prediction.reliability]*3
+    })
+
+
+# Function to generate Word document
+@profiled("engins.report")
+def generate_word_report(engin_data: pd.DataFrame, selected: str, figs: List, descriptions: List[str],
+                         metrics: EnginMetrics, prediction: Optional[CostPrediction], budget_threshold: float,
+                         progress: Optional[Callable[[float], None]] = None) -> BytesIO:
+    doc = Document()
+    # Charts rendered at 800x350 and inserted straight from memory
+    images = ReportImages(width=800, height=350)
+    
+    # Title
+    title = doc.add_heading(f'Rapport d\'Analyse pour R1600-{selected.split("-")[-1]}', level=1)
+    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    doc.add_paragraph(f'Date du rapport : {pd.Timestamp.now().strftime("%d/%m/%Y")}')
+    
+    # Table of Contents
+    doc.add_heading('Tableau des Matières', level=2)
+    doc.add_paragraph('1. Introduction\n2. Résumé des Analyses\n3. Visualisations\n4. Indicateurs Clés\n5. Prévisions\n6. Recommandations', style='List Bullet')
+    
+    # Introduction
+    doc.add_heading('1. Introduction', level=2)
+    doc.add_paragraph(
+        'Ce rapport présente une analyse détaillée des coûts associés à l\'engin R1600, '
+        'incluant les visualisations, les indicateurs clés, les prévisions et les recommandations '
+        'pour optimiser la gestion des dépenses.'
+    )
+    
+    # Summary
+    doc.add_heading('2. Résumé des Analyses', level=2)
+    total_cost = engin_data['Montant'].sum()
+    top_category = engin_data.groupby('Desc_Cat', observed=True)['Montant'].sum().idxmax()
+    trend = prediction.trend if prediction is not None else 'Stable'
+    doc.add_paragraph(
+        f'Coût total : {total_cost:,.0f} MAD\n'
+        f'Catégorie principale : {top_category}\n'
+        f'Tendance récente : {trend}\n'
+        f'Nombre d\'interventions : {len(engin_data)}\n'
+        f'Coût médian : {engin_data["Montant"].median():,.0f} MAD'
+    )
+    
+    # Visualizations
+    doc.add_heading('3. Visualisations', level=2)
+    for i, (fig, desc, title) in enumerate(zip(figs, descriptions, [
+        'Évolution des Dépenses avec Projection', 'Distribution des Coûts', 
+        'Répartition par Catégorie', 'Coût Mensuel'
+    ])):
+        doc.add_heading(f'3.{i+1} {title}', level=3)
+        images.add_picture(doc, fig, width=Inches(6))
+        doc.add_paragraph(desc)
+    
+    # Key Metrics
+    doc.add_heading('4. Indicateurs Clés', level=2)
+    metrics = format_metrics(metrics)
+    table = doc.add_table(rows=len(metrics) + 1, cols=2)
+    table.style = 'Table Grid'
+    hdr_cells = table.rows[0].cells
+    hdr_cells[0].text = 'Métrique'
+    hdr_cells[1].text = 'Valeur'
+    for i, (metric, value) in enumerate(metrics.items()):
+        row_cells = table.rows[i+1].cells
+        row_cells[0].text = metric
+        row_cells[1].text = str(value)
+    
+    # Predictions
+    doc.add_heading('5. Prévisions', level=2)
+    if prediction is not None:
+        doc.add_paragraph(
+            f'Estimation moyenne : {prediction.avg:,.0f} MAD/mois\n'
+            f'Intervalle de confiance (95%) : {prediction.ci_lower:,.0f} - {prediction.ci_upper:,.0f} MAD\n'
+            f'Fiabilité : {prediction.reliability:.0f}%\n'
+            f'Tendance : {prediction.trend}'
+        )
+    else:
+        doc.add_paragraph('Données insuffisantes (minimum 3 mois requis)')
+    
+    # Budget Threshold Analysis
+    if budget_threshold > 0:
+        high_costs = engin_data[engin_data['Montant'] > budget_threshold]
+        doc.add_heading('Analyse des Coûts Excédant le Seuil', level=3)
+        doc.add_paragraph(
+            f'Seuil défini : {budget_threshold:,.0f} MAD\n'
+            f'Nombre d\'interventions dépassant le seuil : {len(high_costs)}\n'
+            f'Coût total des interventions dépassant le seuil : {high_costs["Montant"].sum():,.0f} MAD'
+        )
+    
+    # Recommendations
+    doc.add_heading('6. Recommandations', level=2)
+    doc.add_paragraph(
+        'Sur la base des analyses, voici les recommandations :\n'
+        '- Prioriser la maintenance préventive pour réduire les coûts dans la catégorie principale.\n'
+        f'- Examiner les interventions coûteuses dans {top_category} pour identifier des alternatives économiques.\n'
+        '- Mettre en place un suivi mensuel pour détecter les tendances haussières tôt.\n'
+        '- Négocier avec les fournisseurs pour les pièces fréquemment utilisées.'
+    )
+    
+    # Insert rendered charts
+    images.finish(progress=progress)
+    
+    # Save to buffer
+    buffer = BytesIO()
+    doc.save(buffer)
+    buffer.seek(0)
+    return buffer
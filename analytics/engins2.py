@@ -0,0 +1,274 @@
+from dataclasses import dataclass
+from datetime import datetime
+from io import BytesIO
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.shared import Inches
+
+from analytics.engins import MONTHS_FR, MONTH_ORDER, CostPrediction, EnginMetrics, EnginSeries
+from filters import sort_by_date, date_range_slice, filter_values
+from ingestion import load_incremental
+from memory import compact_frame
+from profiling import profiled
+from report_images import ReportImages
+
+SOURCE = "engins2.xlsx"
+
+
+# Loaded dataset: cleaned rows sorted by date, and the monthly totals kept by incremental ingestion
+@dataclass(frozen=True)
+class EquipmentData:
+    df: pd.DataFrame
+    monthly_costs: pd.DataFrame
+
+
+# Sidebar filters; hashable, so it is used directly as a cache key
+@dataclass(frozen=True)
+class EquipmentFilters:
+    category: str = 'All'
+    date_range: Tuple = ()
+    equipment: str = "All Equipment"
+
+
+# Headline KPIs of the filtered rows
+@dataclass(frozen=True)
+class EquipmentKpis:
+    total_cost: float
+    top_equipment: str
+    top_category: str
+    avg_cost: float
+
+
+# Date parsing (Excel serial numbers, text or already typed dates)
+def parse_dates(df):
+    if pd.api.types.is_numeric_dtype(df['Date']):
+        return pd.to_datetime(df['Date'], origin='1899-12-30', unit='D')
+    elif not pd.api.types.is_datetime64_any_dtype(df['Date']):
+        return pd.to_datetime(df['Date'])
+    return df['Date']
+
+
+# Row cleaning (row by row, so a new monthly extract can be cleaned on its own)
+def clean_rows(df):
+    df['Date'] = parse_dates(df)
+    df = df.dropna(subset=['CATEGORIE', 'Desc_Cat', 'Desc_CA', 'Montant'])
+    df['Montant'] = pd.to_numeric(df['Montant'], errors='coerce')
+    df['Mois'] = df['Date'].dt.month_name().map(MONTHS_FR)
+    return df
+
+
+# Load the equipment workbook (incremental ingestion, memory compaction)
+# Read errors propagate: reporting them is the UI's job
+def load_equipment(path: str = SOURCE) -> EquipmentData:
+    # Incremental ingestion: only rows dated after the stored high-water mark are cleaned and appended,
+    # and the monthly totals are merged instead of recomputed
+    df, aggregates = load_incremental(
+        path, "engins2",
+        read=pd.read_excel,
+        parse_dates=parse_dates,
+        clean=clean_rows,
+        aggregates={"monthly_costs": (["Mois"], {"Montant": "sum"})}
+    )
+    
+    # Compact memory: low-cardinality text to category, lossless 32-bit numerics
+    df = compact_frame(df, "engins", ['CATEGORIE', 'Desc_Cat', 'Desc_CA', 'Mois'])
+    
+    # Keep rows sorted by date so period filters are binary searches
+    return EquipmentData(sort_by_date(df), aggregates["monthly_costs"].reset_index())
+
+
+# Order monthly totals from January to December
+def sort_months(monthly_data):
+    monthly_data = monthly_data.assign(Mois=pd.Categorical(monthly_data['Mois'], categories=MONTH_ORDER, ordered=True))
+    return monthly_data.sort_values('Mois')
+
+
+# Filter rows by category and period (the equipment filter is applied separately, see apply_filters)
+def filter_period(df: pd.DataFrame, category: str = 'All', date_range: Tuple = ()) -> pd.DataFrame:
+    if category != 'All':
+        df = filter_values(df, 'CATEGORIE', category)
+    if len(date_range) == 2:
+        start_date, end_date = date_range
+        df = date_range_slice(df, start_date, end_date)
+    return df
+
+
+# Apply all sidebar filters
+def apply_filters(df: pd.DataFrame, filters: EquipmentFilters) -> pd.DataFrame:
+    df = filter_period(df, filters.category, filters.date_range)
+    if filters.equipment != "All Equipment":
+        df = filter_values(df, 'Desc_CA', filters.equipment)
+    return df
+
+
+# Equipment names available for the search box (case-insensitive partial match)
+def equipment_options(df: pd.DataFrame, search: str = "") -> List[str]:
+    if search:
+        return sorted(df[df['Desc_CA'].str.contains(search, case=False, na=False)]['Desc_CA'].unique())
+    return sorted(df['Desc_CA'].unique())
+
+
+# Headline KPIs of the filtered rows
+def compute_kpis(filtered_data: pd.DataFrame) -> EquipmentKpis:
+    return EquipmentKpis(
+        total_cost=filtered_data['Montant'].sum(),
+        top_equipment=filtered_data.groupby('Desc_CA', observed=True)['Montant'].sum().idxmax() if not filtered_data.empty else "N/A",
+        top_category=filtered_data.groupby('Desc_Cat', observed=True)['Montant'].sum().idxmax() if not filtered_data.empty else "N/A",
+        avg_cost=filtered_data['Montant'].mean() if not filtered_data.empty else 0
+    )
+
+
+# Rows analysed in the Analysis tab: all rows of one category, or daily totals per equipment across categories
+def analysis_frame(filtered_data: pd.DataFrame, category: str = 'All') -> pd.DataFrame:
+    if category != 'All':
+        return filtered_data.copy()
+    return filtered_data.groupby(['Date', 'Desc_CA', 'Desc_Cat', 'CATEGORIE', 'Mois'], observed=True)['Montant'].sum().reset_index()
+
+
+# Monthly costs, in calendar order
+def monthly_costs(data: pd.DataFrame) -> pd.DataFrame:
+    return sort_months(data.groupby('Mois', observed=True)['Montant'].sum().reset_index())
+
+
+# Key metrics as label -> formatted value, as shown in the Word report
+def format_metrics(metrics: EnginMetrics) -> Dict[str, object]:
+    return {
+        'Last Month': f"{metrics.last_month:,.0f} DH",
+        '3-Month Average': f"{metrics.avg_3m:,.0f} DH",
+        'Max Cost': f"{metrics.max_cost:,.0f} DH",
+        'Total Cost': f"{metrics.total_cost:,.0f} DH",
+        'Interventions': metrics.num_interventions,
+        'Median Cost': f"{metrics.median_cost:,.0f} DH",
+        'Cost Variance': f"{metrics.cost_variance:,.0f} DH²"
+    }
+
+
+# Monthly cost prediction from the last 3 months; None below 3 interventions
+# Unlike analytics.engins, the trend compares the last monthly change with 10% of the average
+def compute_prediction(series: EnginSeries) -> Optional[CostPrediction]:
+    if series.num_interventions < 3:
+        return None
+    monthly = series.monthly
+    last_3 = monthly.tail(3)
+    avg = last_3.mean()
+    std = last_3.std() if len(last_3) > 1 else 0
+    num_months = len(monthly)
+    reliability = min(90, 50 + 5 * num_months - 10 * (std / avg if avg > 0 else 0))
+    reliability = max(50, reliability)
+    ci_lower = avg - 1.96 * std / np.sqrt(len(last_3)) if std > 0 else avg * 0.7
+    ci_upper = avg + 1.96 * std / np.sqrt(len(last_3)) if std > 0 else avg * 1.3
+    trend = "Stable"
+    if len(last_3) >= 2:
+        diff = last_3.iloc[-1] - last_3.iloc[-2]
+        if diff > 0.1 * avg:
+            trend = "Rising"
+        elif diff < -0.1 * avg:
+            trend = "Falling"
+    return CostPrediction(avg, ci_lower, ci_upper, reliability, trend)
+
+
+# Prediction over the 3 months after the last intervention (CSV export)
+def prediction_table(series: EnginSeries, prediction: CostPrediction) -> pd.DataFrame:
+    future_dates = pd.date_range(start=series.last_date + pd.DateOffset(months=1), periods=3, freq='M')
+    return pd.DataFrame({
+        'Month': future_dates.strftime('%Y-%m'),
+        'Average Estimate (DH)': [prediction.avg]*3,
+        'Lower CI (DH)': [prediction.ci_lower]*3,
+        'Upper CI (DH)': [prediction.ci_upper]*3,
+        'Reliability (%)': [prediction.reliability]*3
+    })
+
+
+# Function to generate Word report
+@profiled("engins2.report")
+def generate_word_report(engin_data: pd.DataFrame, selected_category: str, figs: List, descriptions: List[str],
+                         metrics: EnginMetrics, prediction: Optional[CostPrediction], budget_threshold: float,
+                         progress: Optional[Callable[[float], None]] = None) -> BytesIO:
+    doc = Document()
+    # Charts rendered at 800x350 and inserted straight from memory
+    images = ReportImages(width=800, height=350)
+    
+    title = doc.add_heading(f'Consumption Report for {selected_category}', level=1)
+    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    doc.add_paragraph(f'Report Date: {datetime.now().strftime("%d/%m/%Y")}')
+    
+    doc.add_heading('Table of Contents', level=2)
+    doc.add_paragraph('1. Introduction\n2. Summary\n3. Visualizations\n4. Key Metrics\n5. Predictions\n6. Recommendations', style='List Bullet')
+    
+    doc.add_heading('1. Introduction', level=2)
+    doc.add_paragraph(
+        'This report provides a detailed analysis of equipment consumption, including visualizations, metrics, predictions, and recommendations for optimization.'
+    )
+    
+    doc.add_heading('2. Summary', level=2)
+    total_cost = engin_data['Montant'].sum()
+    top_category = engin_data.groupby('Desc_Cat', observed=True)['Montant'].sum().idxmax()
+    trend = prediction.trend if prediction is not None else 'Stable'
+    doc.add_paragraph(
+        f'Total Cost: {total_cost:,.0f} DH\n'
+        f'Main Category: {top_category}\n'
+        f'Recent Trend: {trend}\n'
+        f'Number of Interventions: {len(engin_data)}\n'
+        f'Median Cost: {engin_data["Montant"].median():,.0f} DH'
+    )
+    
+    doc.add_heading('3. Visualizations', level=2)
+    for i, (fig, desc, title) in enumerate(zip(figs, descriptions, [
+        'Consumption Trend with Projection', 'Cost Distribution',
+        'Consumption by Type', 'Monthly Costs'
+    ])):
+        doc.add_heading(f'3.{i+1} {title}', level=3)
+        images.add_picture(doc, fig, width=Inches(6))
+        doc.add_paragraph(desc)
+    
+    doc.add_heading('4. Key Metrics', level=2)
+    metrics = format_metrics(metrics)
+    table = doc.add_table(rows=len(metrics) + 1, cols=2)
+    table.style = 'Table Grid'
+    hdr_cells = table.rows[0].cells
+    hdr_cells[0].text = 'Metric'
+    hdr_cells[1].text = 'Value'
+    for i, (metric, value) in enumerate(metrics.items()):
+        row_cells = table.rows[i+1].cells
+        row_cells[0].text = metric
+        row_cells[1].text = str(value)
+    
+    doc.add_heading('5. Predictions', level=2)
+    if prediction is not None:
+        doc.add_paragraph(
+            f'Average Estimate: {prediction.avg:,.0f} DH/month\n'
+            f'Confidence Interval (95%): {prediction.ci_lower:,.0f} - {prediction.ci_upper:,.0f} DH\n'
+            f'Reliability: {prediction.reliability:,.0f}%\n'
+            f'Trend: {prediction.trend}'
+        )
+    else:
+        doc.add_paragraph('Insufficient data (minimum 3 months required)')
+    
+    if budget_threshold > 0:
+        high_costs = engin_data[engin_data['Montant'] > budget_threshold]
+        doc.add_heading('Budget Threshold Analysis', level=3)
+        doc.add_paragraph(
+            f'Threshold: {budget_threshold:,.0f} DH\n'
+            f'Number of Interventions Exceeding Threshold: {len(high_costs)}\n'
+            f'Total Cost of High Interventions: {high_costs["Montant"].sum():,.0f} DH'
+        )
+    
+    doc.add_heading('6. Recommendations', level=2)
+    doc.add_paragraph(
+        '- Prioritize preventive maintenance to reduce costs in the main category.\n'
+        f'- Review high-cost interventions in {top_category} for cost-saving opportunities.\n'
+        '- Implement monthly monitoring to detect rising trends early.\n'
+        '- Negotiate with suppliers for frequently used parts.'
+    )
+    
+    # Insert rendered charts
+    images.finish(progress=progress)
+    
+    buffer = BytesIO()
+    doc.save(buffer)
+    buffer.seek(0)
+    return buffer
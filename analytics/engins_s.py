@@ -0,0 +1,316 @@
+from dataclasses import dataclass
+from datetime import datetime
+from io import BytesIO
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.shared import Inches
+
+from filters import date_range_slice, filter_values
+from profiling import profiled
+from report_images import ReportImages
+
+
+# Synthèse des consommations filtrées (indicateurs globaux et par catégorie)
+@dataclass(frozen=True)
+class ConsumptionSummary:
+    total_cost: float
+    global_avg: float
+    category_stats: pd.DataFrame
+    most_consumed_per_cat: pd.DataFrame
+
+
+# Fonction pour calculer la synthèse : coût total, moyenne, totaux par catégorie et type le plus consommé
+def summarize(filtered_data: pd.DataFrame) -> ConsumptionSummary:
+    category_stats = filtered_data.groupby('CATEGORIE', observed=True).agg(
+        Total=('Montant', 'sum'),
+        Moyenne=('Montant', 'mean')
+    ).reset_index()
+    most_consumed_per_cat = filtered_data.groupby(['CATEGORIE', 'Desc_Cat'], observed=True)['Montant'].sum().reset_index()
+    most_consumed_per_cat = most_consumed_per_cat.loc[most_consumed_per_cat.groupby('CATEGORIE', observed=True)['Montant'].idxmax()]
+    return ConsumptionSummary(
+        total_cost=filtered_data['Montant'].sum(),
+        global_avg=filtered_data['Montant'].mean(),
+        category_stats=category_stats,
+        most_consumed_per_cat=most_consumed_per_cat
+    )
+
+
+# Fonction pour croiser équipements et types de consommation des catégories sélectionnées
+# Renvoie un tableau vide si aucune catégorie précise n'est choisie
+def engine_pivot(filtered_data: pd.DataFrame, selected_engines: List[str]) -> pd.DataFrame:
+    if filtered_data.empty or not selected_engines or selected_engines == ["Tous les types"]:
+        return pd.DataFrame()
+    return pd.pivot_table(
+        filter_values(filtered_data, 'CATEGORIE', selected_engines),
+        values='Montant',
+        index='Desc_CA',
+        columns='Desc_Cat',
+        aggfunc='sum',
+        fill_value=0,
+        observed=True,
+        margins=True,
+        margins_name='Total'
+    ).round(2)
+
+
+# Fonction pour préparer le journal des consommations (dates formatées, colonnes renommées)
+def detail_table(filtered_data: pd.DataFrame) -> pd.DataFrame:
+    table_df = filtered_data[['Date', 'Desc_CA', 'Desc_Cat', 'Montant']].copy()
+    table_df['Date'] = table_df['Date'].dt.strftime('%d/%m/%Y')
+    table_df['Montant'] = table_df['Montant'].round(2)
+    return table_df.rename(columns={
+        'Date': 'Date',
+        'Desc_CA': 'Équipement',
+        'Desc_Cat': 'Type de consommation',
+        'Montant': 'Montant (DH)'
+    })
+
+
+# Fonction pour générer le rapport Word complet (la barre de progression est fournie par l'interface)
+@profiled("engins_s.report")
+def generate_word_report(filtered_data: pd.DataFrame, summary: ConsumptionSummary, pivot_engine: pd.DataFrame,
+                         selected_engines: List[str], table_df: pd.DataFrame, figures: Dict[str, object],
+                         tonnage_df: pd.DataFrame, tonnage_date_range: Optional[Tuple], hm_df: pd.DataFrame,
+                         hm_date_range: Optional[Tuple], progress: Optional[Callable[[float], None]] = None) -> BytesIO:
+    total_cost = summary.total_cost
+    category_stats = summary.category_stats
+    most_consumed_per_cat = summary.most_consumed_per_cat
+    total_montant = table_df['Montant (DH)'].sum()
+    
+    doc = Document()
+    # Graphiques rendus en parallèle (scale=1 comme l'export précédent)
+    images = ReportImages(scale=1)
+    
+    title = doc.add_heading('Rapport Complet de Consommation des Équipements Miniers', 0)
+    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    doc.add_paragraph(f"Date de génération: {datetime.now().strftime('%d/%m/%Y %H:%M')}")
+    doc.add_paragraph(f"Période couverte: du {filtered_data['Date'].min().strftime('%d/%m/%Y')} au {filtered_data['Date'].max().strftime('%d/%m/%Y')}")
+    doc.add_paragraph(f"Nombre d'équipements analysés: {filtered_data['Desc_CA'].nunique()}")
+    
+    doc.add_heading('Table des Matières', level=1)
+    doc.add_paragraph('1. Indicateurs Clés\n2. Analyse par Catégorie\n3. Analyse Comparative\n4. Données Détailées\n5. Recommandations\n6. Analyse des Tonnages\n7. Analyse des Heures de Marche', style='ListBullet')
+    
+    doc.add_heading('1. Indicateurs Clés', level=1)
+    table = doc.add_table(rows=3, cols=2)
+    table.style = 'LightShading'
+    table.cell(0, 0).text = 'Indicateur'
+    table.cell(0, 1).text = 'Valeur'
+    table.cell(1, 0).text = 'Coût total'
+    table.cell(1, 1).text = f"{total_cost:,.0f} DH"
+    table.cell(2, 0).text = 'Moyenne globale par jour'
+    table.cell(2, 1).text = f"{summary.global_avg:,.0f} DH"
+    
+    doc.add_heading('Indicateurs par Catégorie', level=2)
+    cat_table = doc.add_table(rows=category_stats.shape[0]+1, cols=4)
+    cat_table.style = 'LightShading'
+    cat_table.cell(0, 0).text = 'Catégorie'
+    cat_table.cell(0, 1).text = 'Total (DH)'
+    cat_table.cell(0, 2).text = 'Moyenne (DH)'
+    cat_table.cell(0, 3).text = 'Type le plus consommé'
+    
+    for i, (_, row) in enumerate(category_stats.iterrows()):
+        most_consumed = most_consumed_per_cat[most_consumed_per_cat['CATEGORIE'] == row['CATEGORIE']]
+        most_consumed_desc = most_consumed['Desc_Cat'].iloc[0] if not most_consumed.empty else "N/A"
+        
+        cat_table.cell(i+1, 0).text = row['CATEGORIE']
+        cat_table.cell(i+1, 1).text = f"{row['Total']:,.0f}"
+        cat_table.cell(i+1, 2).text = f"{row['Moyenne']:,.0f}"
+        cat_table.cell(i+1, 3).text = most_consumed_desc
+    
+    doc.add_heading('2. Analyse par Catégorie', level=1)
+    doc.add_paragraph('Cette section présente les analyses détaillées pour chaque catégorie d\'équipement.')
+    
+    for fig_name, fig in figures.items():
+        if "Consommation par équipement" in fig_name:
+            doc.add_heading(fig_name, level=2)
+            category = fig_name.split('(')[-1].replace(')', '')
+            doc.add_paragraph(f"Ce graphique montre la répartition des coûts par équipement pour la catégorie {category}. "
+                            "Il permet d'identifier les équipements les plus coûteux à maintenir.")
+            
+            images.add_picture(doc, fig, width=Inches(6))
+    
+    doc.add_heading('3. Analyse Comparative', level=1)
+    doc.add_paragraph('Comparaison des performances entre les différentes catégories d\'équipements.')
+    
+    if "Coût total par catégorie" in figures:
+        doc.add_heading('Comparaison des coûts par catégorie', level=2)
+        doc.add_paragraph("Ce graphique compare les coûts totaux entre les différentes catégories d'équipements. "
+                        "Les catégories les plus à droite représentent les postes de dépenses les plus importants.")
+        
+        images.add_picture(doc, figures["Coût total par catégorie"], width=Inches(6))
+    
+    doc.add_heading('4. Données Détailées', level=1)
+    
+    if not pivot_engine.empty:
+        doc.add_heading(f'Détail des consommations pour {", ".join(selected_engines) if selected_engines else "toutes les catégories"}', level=2)
+        doc.add_paragraph(f"Tableau détaillant les différents types de consommation pour chaque équipement des catégories sélectionnées.")
+        
+        table = doc.add_table(rows=pivot_engine.shape[0]+1, cols=pivot_engine.shape[1]+1)
+        table.style = 'Table Grid'
+        
+        table_rows = table.rows
+        table_rows[0].cells[0].text = 'Équipement'
+        for j, col in enumerate(pivot_engine.columns):
+            table_rows[0].cells[j+1].text = str(col)
+        
+        for i, (index, row) in enumerate(pivot_engine.iterrows()):
+            row_cells = table_rows[i+1].cells
+            row_cells[0].text = str(index)
+            for j, value in enumerate(row):
+                row_cells[j+1].text = f"{value:,.2f} DH"
+    
+    doc.add_heading('Journal complet des consommations', level=2)
+    doc.add_paragraph('Liste détaillée des consommations enregistrées (limité aux 100 premières entrées).')
+    
+    max_rows = min(table_df.shape[0], 100)
+    table = doc.add_table(rows=max_rows+2, cols=table_df.shape[1])
+    table.style = 'Table Grid'
+    
+    table_rows = table.rows
+    for j, col in enumerate(table_df.columns):
+        table_rows[0].cells[j].text = col
+    
+    for i in range(max_rows):
+        row_cells = table_rows[i+1].cells
+        for j, value in enumerate(table_df.iloc[i]):
+            row_cells[j].text = str(value)
+    
+    table_rows[max_rows+1].cells[0].text = 'Total'
+    table_rows[max_rows+1].cells[table_df.shape[1]-1].text = f"{total_montant:,.2f} DH"
+    
+    doc.add_heading('5. Recommandations', level=1)
+    
+    top_categories = filtered_data.groupby('CATEGORIE', observed=True)['Montant'].sum().nlargest(3).reset_index()
+    doc.add_heading('Catégories prioritaires', level=2)
+    for _, row in top_categories.iterrows():
+        doc.add_paragraph(
+            f"{row['CATEGORIE']}: {row['Montant']:,.0f} DH ({(row['Montant']/total_cost)*100:.1f}% du total)",
+            style='ListBullet'
+        )
+    
+    doc.add_heading('Actions recommandées', level=2)
+    recommendations = [
+        "Prioriser les analyses des équipements dans les catégories les plus coûteuses",
+        "Mettre en place un suivi mensuel des consommations par catégorie",
+        "Comparer les performances des équipements similaires pour identifier les anomalies",
+        "Négocier avec les fournisseurs pour les pièces les plus fréquemment remplacées",
+        "Étudier la possibilité de maintenance préventive pour réduire les coûts",
+        "Former les opérateurs à une utilisation optimale des équipements"
+    ]
+    for rec in recommendations:
+        doc.add_paragraph(rec, style='ListBullet')
+    
+    doc.add_heading('6. Analyse des Tonnages', level=1)
+    doc.add_paragraph('Cette section présente les données de tonnage pour les sites DS Sud, DS Nord et KA.')
+    
+    if not tonnage_df.empty:
+        filtered_tonnage_df = tonnage_df
+        if tonnage_date_range is not None and len(tonnage_date_range) == 2:
+            start_date, end_date = tonnage_date_range
+            filtered_tonnage_df = date_range_slice(filtered_tonnage_df, start_date, end_date, 'DATE')
+        else:
+            doc.add_paragraph("Plage de dates non définie pour les tonnages. Affichage de toutes les données disponibles.")
+        if not filtered_tonnage_df.empty:
+            doc.add_heading('Tableau des tonnages', level=2)
+            max_rows = min(filtered_tonnage_df.shape[0], 100)
+            table = doc.add_table(rows=max_rows+2, cols=5)
+            table.style = 'Table Grid'
+            
+            table_rows = table.rows
+            headers = ['Date', 'DS Sud (T)', 'DS Nord (T)', 'KA (T)', 'Cumulé (T)']
+            for j, col in enumerate(headers):
+                table_rows[0].cells[j].text = col
+            
+            display_tonnage_df = filtered_tonnage_df[['DATE', 'DS Sud', 'DS Nord', 'KA', 'CUMMULE']].copy()
+            display_tonnage_df['DATE'] = display_tonnage_df['DATE'].dt.strftime('%d/%m/%Y')
+            
+            for i in range(max_rows):
+                row_cells = table_rows[i+1].cells
+                for j, value in enumerate(display_tonnage_df.iloc[i]):
+                    row_cells[j].text = str(value) if j == 0 else f"{value:,.2f} T"
+            
+            total_tonnage = display_tonnage_df[['DS Sud', 'DS Nord', 'KA']].sum().to_dict()
+            total_cumule = display_tonnage_df['CUMMULE'].sum()
+            table_rows[max_rows+1].cells[0].text = 'Total'
+            table_rows[max_rows+1].cells[1].text = f"{total_tonnage['DS Sud']:,.2f} T"
+            table_rows[max_rows+1].cells[2].text = f"{total_tonnage['DS Nord']:,.2f} T"
+            table_rows[max_rows+1].cells[3].text = f"{total_tonnage['KA']:,.2f} T"
+            table_rows[max_rows+1].cells[4].text = f"{total_cumule:,.2f} T"
+            
+            if "Comparaison des tonnages par site" in figures:
+                doc.add_heading('Comparaison des tonnages par site', level=2)
+                images.add_picture(doc, figures["Comparaison des tonnages par site"], width=Inches(6))
+            
+            if "Tonnage total par site" in figures:
+                doc.add_heading('Tonnage total par site', level=2)
+                images.add_picture(doc, figures["Tonnage total par site"], width=Inches(6))
+    doc.add_heading('7. Analyse des Heures de Marche', level=1)
+    doc.add_paragraph('Cette section présente les données des heures de marche pour les équipements miniers.')
+    
+    if not hm_df.empty:
+        filtered_hm_df = hm_df
+        if hm_date_range is not None and len(hm_date_range) == 2:
+            start_date, end_date = hm_date_range
+            filtered_hm_df = date_range_slice(filtered_hm_df, start_date, end_date, 'ENGINS')
+        else:
+            doc.add_paragraph("Plage de dates non définie pour les heures de marche. Affichage de toutes les données disponibles.")
+        if not filtered_hm_df.empty:
+            doc.add_heading('Tableau des heures de marche', level=2)
+            max_rows = min(filtered_hm_df.shape[0], 100)
+            equipment_columns = [col for col in filtered_hm_df.columns if col not in ['ENGINS', 'TOTAL_HOURS']]
+            table = doc.add_table(rows=max_rows+2, cols=len(equipment_columns)+2)
+            table.style = 'Table Grid'
+            
+            table_rows = table.rows
+            headers = ['Date'] + equipment_columns + ['Total (h)']
+            for j, col in enumerate(headers):
+                table_rows[0].cells[j].text = col
+            
+            display_hm_df = filtered_hm_df[['ENGINS'] + equipment_columns + ['TOTAL_HOURS']].copy()
+            display_hm_df['ENGINS'] = display_hm_df['ENGINS'].dt.strftime('%d/%m/%Y')
+            
+            for i in range(max_rows):
+                row_cells = table_rows[i+1].cells
+                for j, value in enumerate(display_hm_df.iloc[i]):
+                    row_cells[j].text = str(value) if j == 0 else f"{value:,.2f} h"
+            
+            total_hours = display_hm_df[equipment_columns].sum().to_dict()
+            total_sum = display_hm_df['TOTAL_HOURS'].sum()
+            table_rows[max_rows+1].cells[0].text = 'Total'
+            for j, col in enumerate(equipment_columns, 1):
+                table_rows[max_rows+1].cells[j].text = f"{total_hours[col]:,.2f} h"
+            table_rows[max_rows+1].cells[-1].text = f"{total_sum:,.2f} h"
+            
+            if "Comparaison des heures de marche par équipement" in figures:
+                doc.add_heading('Comparaison des heures de marche par équipement', level=2)
+                images.add_picture(doc, figures["Comparaison des heures de marche par équipement"], width=Inches(6))
+            
+            if "Heures totales par équipement" in figures:
+                doc.add_heading('Heures totales par équipement', level=2)
+                images.add_picture(doc, figures["Heures totales par équipement"], width=Inches(6))
+    else:
+        doc.add_paragraph("Aucune donnée d'heures de marche disponible pour la période sélectionnée.")
+    
+    doc.add_heading('Conclusion', level=1)
+    doc.add_paragraph(
+        "Ce rapport fournit une analyse complète des coûts de consommation des équipements miniers, des tonnages des sites, "
+        "et des heures de marche des équipements. Les graphiques et tableaux présentés permettent d'identifier les principaux "
+        "post_modes de dépenses, les performances des sites, et l'utilisation des équipements pour optimiser les coûts d'exploitation "
+        "et la productivité."
+    )
+    
+    section = doc.sections[0]
+    footer = section.footer
+    footer_para = footer.paragraphs[0] if footer.paragraphs else footer.add_paragraph()
+    footer_para.text = f"Généré le {datetime.now().strftime('%d/%m/%Y')} - Tableau de bord de consommation et heures de marche des équipements miniers"
+    footer_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    
+    images.finish(progress=progress)
+    
+    buffer = BytesIO()
+    doc.save(buffer)
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,455 @@
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Callable, Optional
+
+import pandas as pd
+import plotly.express as px
+from docx import Document
+from docx.shared import Inches
+
+from derived_metrics import add_unit_cost
+from ingestion import read_excel_cached
+from memory import compact_frame
+from profiling import profiled
+from report_images import ReportImages
+
+SOURCE = "stock.xlsx"
+REQUIRED_COLUMNS = ['article', 'DES_ARTICLE', 'GROUPE', 'QUANTITE', 'MONTANT', 'Mois']
+
+
+# Erreur levée quand le classeur ne contient pas les colonnes requises
+class MissingColumnsError(ValueError):
+    pass
+
+
+# Jeu chargé : lignes de stock nettoyées et agrégat par article (évite les doublons par produit)
+@dataclass(frozen=True)
+class StockData:
+    df: pd.DataFrame
+    articles: pd.DataFrame
+
+
+# Métriques globales (non filtrées)
+@dataclass(frozen=True)
+class StockKpis:
+    total_items: int
+    total_quantity: float
+    total_cost: float
+    unique_groups: int
+
+
+# Données des analyses et graphiques pour un groupe
+@dataclass
+class StockViews:
+    filtered_df: pd.DataFrame
+    filtered_articles: pd.DataFrame
+    most_expensive: Optional[pd.Series]
+    turnover_combined: pd.DataFrame
+    cost_trend: pd.DataFrame
+    top_expensive: pd.DataFrame
+    abc_summary: pd.DataFrame
+    top_quantity: pd.DataFrame
+    top_cost: pd.DataFrame
+    cost_by_group: pd.DataFrame
+    cost_by_time: pd.DataFrame
+
+
+# Fonction pour formater les grands nombres
+def format_number(num):
+    if pd.isna(num) or num == 0:
+        return "0"
+    if num >= 1_000_000:
+        return f"{num / 1_000_000:.1f}M"
+    if num >= 1_000:
+        return f"{num / 1_000:.1f}K"
+    return f"{num:.2f}"
+
+
+# Fonction pour nettoyer les chaînes de caractères pour éviter les problèmes dans le document Word
+def sanitize_text(text):
+    if pd.isna(text):
+        return "N/A"
+    return str(text).replace("\n", " ").replace("\r", " ").strip()
+
+# Fonction pour charger et nettoyer l'état de stock
+# Les erreurs de lecture sont propagées (MissingColumnsError si des colonnes requises manquent)
+def load_stock(path: str = SOURCE) -> StockData:
+    df = read_excel_cached(path)
+    
+    # Nettoyer les données
+    if not all(col in df.columns for col in REQUIRED_COLUMNS):
+        raise MissingColumnsError("Colonnes requises manquantes dans l'ensemble de données.")
+    
+    df["QUANTITE"] = pd.to_numeric(df["QUANTITE"], errors="coerce").fillna(0)
+    df["MONTANT"] = pd.to_numeric(df["MONTANT"], errors="coerce").fillna(0)
+    df["DES_ARTICLE"] = df["DES_ARTICLE"].astype(str).str.strip()
+    df["GROUPE"] = df["GROUPE"].astype(str).str.strip()
+    df["Mois"] = df["Mois"].astype(str).str.strip()
+    # Compacter la mémoire : textes à faible cardinalité en category, entiers en 32 bits sans perte
+    df = compact_frame(df, "stock", ["STE", "ORG_LOG", "article", "DES_ARTICLE", "UO", "GROUPE", "DES_GROUPE", "Mois"])
+    df = add_unit_cost(df, "MONTANT", "QUANTITE", "unit_price")
+    
+    # Créer une version agrégée pour éviter les doublons dans les visualisations par produit
+    df_aggregated = df.groupby("article", observed=True).agg({
+        "QUANTITE": "sum",
+        "MONTANT": "sum",
+        "DES_ARTICLE": "first",
+        "GROUPE": "first",
+        "Mois": "first"
+    }).reset_index()
+    # Recalculer unit_price après agrégation
+    df_aggregated = add_unit_cost(df_aggregated, "MONTANT", "QUANTITE", "unit_price")
+    
+    return StockData(df, df_aggregated)
+
+
+# Fonction pour calculer les métriques globales
+def compute_kpis(data: StockData) -> StockKpis:
+    return StockKpis(
+        total_items=len(data.articles),
+        total_quantity=data.articles["QUANTITE"].sum(),
+        total_cost=data.articles["MONTANT"].sum(),
+        unique_groups=data.articles["GROUPE"].nunique()
+    )
+
+
+# Fonction pour calculer le taux de rotation (quantité par période) : 5 articles les plus rapides et 5 les plus lents
+def turnover(articles: pd.DataFrame, total_periods: int) -> pd.DataFrame:
+    turnover_df = articles[["DES_ARTICLE", "QUANTITE"]].copy()
+    turnover_df["Taux de Rotation"] = turnover_df["QUANTITE"] / total_periods
+    turnover_df = turnover_df.sort_values("Taux de Rotation", ascending=False)
+    return pd.concat([turnover_df.head(5), turnover_df.tail(5)])
+
+
+# Fonction pour l'analyse ABC : A jusqu'à 80 % du coût cumulé, B jusqu'à 95 %, C au-delà
+def abc_analysis(articles: pd.DataFrame) -> pd.DataFrame:
+    abc_df = articles[["DES_ARTICLE", "MONTANT"]].copy()
+    abc_df = abc_df.sort_values("MONTANT", ascending=False)
+    abc_df["Pourcentage Cumulatif"] = abc_df["MONTANT"].cumsum() / abc_df["MONTANT"].sum() * 100
+    abc_df["Catégorie"] = "C"
+    abc_df.loc[abc_df["Pourcentage Cumulatif"] <= 80, "Catégorie"] = "A"
+    abc_df.loc[(abc_df["Pourcentage Cumulatif"] > 80) & (abc_df["Pourcentage Cumulatif"] <= 95), "Catégorie"] = "B"
+    return abc_df.groupby("Catégorie")["MONTANT"].sum().reset_index()
+
+
+# Fonction pour calculer les analyses d'un groupe ("Tous" pour l'ensemble du stock)
+# Chaque vue n'est calculée qu'une fois, pour l'affichage comme pour le rapport Word
+def compute_views(data: StockData, groupe: str = "Tous") -> StockViews:
+    df, filtered_df, filtered_df_aggregated = data.df, data.df, data.articles
+    if groupe != "Tous":
+        filtered_df = filtered_df[filtered_df["GROUPE"] == groupe]
+        filtered_df_aggregated = filtered_df_aggregated[filtered_df_aggregated["GROUPE"] == groupe]
+    
+    cost_by_group = filtered_df.groupby("GROUPE", observed=True)["MONTANT"].sum().reset_index()
+    return StockViews(
+        filtered_df=filtered_df,
+        filtered_articles=filtered_df_aggregated,
+        most_expensive=filtered_df_aggregated.loc[filtered_df_aggregated["unit_price"].idxmax()] if not filtered_df_aggregated.empty else None,
+        turnover_combined=turnover(filtered_df_aggregated, df["Mois"].nunique()),
+        cost_trend=df.groupby("Mois", observed=True)["MONTANT"].sum().reset_index(),
+        top_expensive=filtered_df_aggregated.nlargest(10, "unit_price")[["article", "DES_ARTICLE", "GROUPE", "QUANTITE", "MONTANT", "unit_price"]],
+        abc_summary=abc_analysis(filtered_df_aggregated),
+        top_quantity=filtered_df_aggregated.nlargest(5, "QUANTITE")[["DES_ARTICLE", "QUANTITE"]],
+        top_cost=filtered_df_aggregated.nlargest(5, "MONTANT")[["DES_ARTICLE", "MONTANT"]],
+        cost_by_group=cost_by_group[cost_by_group["MONTANT"] > 0],
+        cost_by_time=filtered_df.groupby(["Mois", "GROUPE"], observed=True)["MONTANT"].sum().reset_index()
+    )
+
+
+# Fonction pour détecter les alertes (stock faible, coût élevé, prix unitaire élevé, données invalides)
+def compute_alerts(articles: pd.DataFrame) -> pd.DataFrame:
+    # Conditions d'alerte vectorisées
+    low_stock = articles[articles["QUANTITE"] < 10].copy()
+    low_stock["Raison de l'Alerte"] = low_stock["QUANTITE"].apply(lambda x: f"Stock Faible : Quantité = {x:.2f}")
+
+    high_cost = articles[articles["MONTANT"] > 100000].copy()
+    high_cost["Raison de l'Alerte"] = high_cost["MONTANT"].apply(lambda x: f"Coût Élevé : Coût = {format_number(x)}")
+
+    high_unit_price = articles[articles["unit_price"] > 1000].copy()
+    high_unit_price["Raison de l'Alerte"] = high_unit_price["unit_price"].apply(lambda x: f"Prix Unitaire Élevé : {format_number(x)}")
+
+    data_issues = articles[(articles["QUANTITE"] <= 0) | (articles["MONTANT"] <= 0)].copy()
+    data_issues["Raison de l'Alerte"] = "Problème de Données : Quantité ou Coût Invalide"
+
+    # Concaténer les alertes
+    return pd.concat([low_stock, high_cost, high_unit_price, data_issues], ignore_index=True)
+
+
+# Fonction pour créer un document Word (on_error reçoit les erreurs de remplissage des tableaux)
+@profiled("stock.report")
+def create_word_doc(kpis: StockKpis, views: StockViews, paged_df: pd.DataFrame, alerts_df: Optional[pd.DataFrame] = None,
+                    on_error: Optional[Callable[[str], None]] = None,
+                    progress: Optional[Callable[[float], None]] = None) -> BytesIO:
+    on_error = on_error or (lambda message: None)
+    doc = Document()
+    images = ReportImages()
+    doc.add_heading("Rapport d'Analyse des Stocks", 0)
+
+    # Métriques Globales
+    doc.add_heading("Métriques Globales", level=1)
+    doc.add_paragraph(f"Nombre Total d'Articles: {format_number(kpis.total_items)}")
+    doc.add_paragraph(f"Quantité Totale: {format_number(kpis.total_quantity)}")
+    doc.add_paragraph(f"Coût Total: {format_number(kpis.total_cost)}")
+    doc.add_paragraph(f"Groupes Uniques: {kpis.unique_groups}")
+
+    # Aperçu Intéressant
+    doc.add_heading("Aperçu Intéressant", level=1)
+    if views.most_expensive is not None and not pd.isna(views.most_expensive["unit_price"]):
+        doc.add_paragraph(
+            f"L'article le plus cher par unité est {sanitize_text(views.most_expensive['DES_ARTICLE'])} "
+            f"à {format_number(views.most_expensive['unit_price'])} par unité."
+        )
+    else:
+        doc.add_paragraph("Aucun article trouvé pour l'aperçu intéressant.")
+
+    # Analyses et Visualisations Avancées
+    doc.add_heading("Analyses et Visualisations Avancées", level=1)
+
+    # 1. Taux de Rotation des Stocks
+    doc.add_heading("Taux de Rotation des Stocks (Articles à Rotation Rapide vs Lente)", level=2)
+    doc.add_paragraph(
+        "Ce graphique montre les 5 articles à rotation rapide et les 5 articles à rotation lente en fonction de leur taux de rotation (quantité par période). "
+        "Il aide à identifier les articles qui sont utilisés ou vendus rapidement par rapport à ceux qui stagnent, facilitant l'optimisation des stocks."
+    )
+    fig_turnover = px.bar(
+        views.turnover_combined,
+        x="Taux de Rotation",
+        y="DES_ARTICLE",
+        orientation="h",
+        title="Top 5 Articles à Rotation Rapide et Lente (Taux de Rotation)",
+        color="Taux de Rotation",
+        color_continuous_scale="Viridis",
+        text_auto=True
+    )
+    fig_turnover.update_layout(xaxis_title="Taux de Rotation (Quantité par Période)", yaxis_title="Article")
+    images.add_picture(doc, fig_turnover, width=Inches(6))
+
+    # 2. Tendance des Coûts au Fil du Temps
+    doc.add_heading("Tendance des Coûts au Fil du Temps", level=2)
+    doc.add_paragraph(
+        "Ce graphique en ligne montre le coût total au fil du temps (par mois). Il permet de suivre les fluctuations des coûts, d'identifier les tendances saisonnières, "
+        "et de repérer les périodes de dépenses inhabituellement élevées ou faibles, utile pour la planification budgétaire et financière."
+    )
+    fig_cost_trend = px.line(
+        views.cost_trend,
+        x="Mois",
+        y="MONTANT",
+        title="Tendance du Coût Total au Fil du Temps",
+        markers=True,
+        color_discrete_sequence=["#FF4D4F"]
+    )
+    fig_cost_trend.update_layout(xaxis_title="Mois", yaxis_title="Coût Total", xaxis_tickangle=45)
+    fig_cost_trend.update_traces(
+        hovertemplate="<b>Mois:</b> %{x}<br><b>Coût:</b> %{y:,.2f}",
+        line=dict(width=3)
+    )
+    images.add_picture(doc, fig_cost_trend, width=Inches(6))
+
+        # 3. Top 10 Articles les Plus Chers par Prix Unitaire
+        # 3. Top 10 Articles les Plus Chers par Prix Unitaire
+    doc.add_heading("Top 10 Articles les Plus Chers par Prix Unitaire", level=2)
+    doc.add_paragraph(
+        "Ce tableau liste les 10 articles ayant les prix unitaires les plus élevés, agrégés pour éviter les doublons. Il montre la quantité totale et le coût "
+        "pour chaque article, aidant à identifier les articles de grande valeur qui peuvent nécessiter une attention particulière dans les stratégies de tarification ou d'approvisionnement."
+    )
+    if not views.top_expensive.empty:
+        # Add table with header
+        table = doc.add_table(rows=1, cols=len(views.top_expensive.columns))
+        hdr_cells = table.rows[0].cells
+        for i, col in enumerate(views.top_expensive.columns):
+            hdr_cells[i].text = str(col)
+        
+        # Add data rows
+        for _, row in views.top_expensive.iterrows():
+            row_cells = table.add_row().cells
+            for col_idx, value in enumerate(row):
+                try:
+                    row_cells[col_idx].text = sanitize_text(value)
+                except Exception as e:
+                    row_cells[col_idx].text = "Erreur"
+    else:
+        doc.add_paragraph("Aucun article trouvé pour ce tableau.")
+
+    # 4. Analyse ABC
+    doc.add_heading("Analyse ABC des Articles", level=2)
+    doc.add_paragraph(
+        "Ce graphique montre la répartition des articles selon l'analyse ABC : les articles de catégorie A (20% des articles, 80% du coût), B (30% des articles, 15% du coût), "
+        "et C (50% des articles, 5% du coût). Cela aide à prioriser la gestion des stocks en se concentrant sur les articles les plus coûteux."
+    )
+    fig_abc = px.pie(
+        views.abc_summary,
+        names="Catégorie",
+        values="MONTANT",
+        title="Répartition des Coûts par Catégorie ABC",
+        color_discrete_sequence=["#FF4D4F", "#FFA500", "#3B82F6"]
+    )
+    fig_abc.update_traces(
+        textinfo="percent+label",
+        hovertemplate="<b>Catégorie:</b> %{label}<br><b>Coût:</b> %{value:,.2f}<br><b>Pourcentage:</b> %{percent}"
+    )
+    images.add_picture(doc, fig_abc, width=Inches(6))
+
+    # Répartition de l'Inventaire
+    doc.add_heading("Répartition de l'Inventaire", level=1)
+
+    # Top 5 Articles par Quantité
+    doc.add_heading("Top 5 Articles par Quantité", level=2)
+    doc.add_paragraph(
+        "Ce graphique en barres met en évidence les 5 articles ayant les quantités totales les plus élevées en stock. Il aide à identifier les articles les plus stockés, "
+        "ce qui peut indiquer une forte demande ou un éventuel surstockage."
+    )
+    fig_quantity = px.bar(
+        views.top_quantity,
+        x="DES_ARTICLE",
+        y="QUANTITE",
+        title="Top 5 Articles par Quantité",
+        color_discrete_sequence=["#3B82F6"],
+        text_auto=True
+    )
+    fig_quantity.update_layout(xaxis_title="Article", yaxis_title="Quantité", xaxis_tickangle=45)
+    fig_quantity.update_traces(
+        texttemplate="%{y:,.2f}",
+        textposition="auto",
+        hovertemplate="<b>Article:</b> %{x}<br><b>Quantité:</b> %{y:,.2f}"
+    )
+    images.add_picture(doc, fig_quantity, width=Inches(6))
+
+    # Top 5 Articles par Coût
+    doc.add_heading("Top 5 Articles par Coût", level=2)
+    doc.add_paragraph(
+        "Ce graphique en barres montre les 5 articles ayant les coûts totaux les plus élevés. Il aide à repérer les articles les plus coûteux de l'inventaire, "
+        "qui peuvent nécessiter une gestion des coûts ou une renégociation avec les fournisseurs."
+    )
+    fig_cost = px.bar(
+        views.top_cost,
+        x="DES_ARTICLE",
+        y="MONTANT",
+        title="Top 5 Articles par Coût",
+        color_discrete_sequence=["#10B981"],
+        text_auto=True
+    )
+    fig_cost.update_layout(xaxis_title="Article", yaxis_title="Coût", xaxis_tickangle=45)
+    fig_cost.update_traces(
+        texttemplate="%{y:,.2f}",
+        textposition="auto",
+        hovertemplate="<b>Article:</b> %{x}<br><b>Coût:</b> %{y:,.2f}"
+    )
+    images.add_picture(doc, fig_cost, width=Inches(6))
+
+    # Répartition des Coûts par Groupe
+    doc.add_heading("Répartition des Coûts par Groupe", level=2)
+    doc.add_paragraph(
+        "Ce graphique en secteurs illustre la proportion du coût total attribuée à chaque groupe. Il aide à comprendre quels groupes contribuent le plus aux dépenses, "
+        "guidant l'allocation des ressources et les efforts d'optimisation des coûts."
+    )
+    fig_pie = px.pie(
+        views.cost_by_group,
+        names="GROUPE",
+        values="MONTANT",
+        title="Répartition des Coûts par Groupe",
+        color_discrete_sequence=px.colors.qualitative.Plotly
+    )
+    fig_pie.update_traces(
+        textinfo="percent+label",
+        hovertemplate="<b>Groupe:</b> %{label}<br><b>Coût:</b> %{value:,.2f}<br><b>Pourcentage:</b> %{percent}"
+    )
+    images.add_picture(doc, fig_pie, width=Inches(6))
+
+    # Coût Total par Groupe au Fil du Temps
+    doc.add_heading("Coût Total par Groupe au Fil du Temps", level=2)
+    doc.add_paragraph(
+        "Ce graphique en barres montre le coût total pour chaque groupe au fil du temps (par mois). Il aide à identifier les tendances des dépenses par groupe, "
+        "révélant quels groupes ont des coûts croissants ou décroissants au fil du temps."
+    )
+    fig_time = px.bar(
+        views.cost_by_time,
+        x="Mois",
+        y="MONTANT",
+        color="GROUPE",
+        title="Coût Total par Groupe au Fil du Temps",
+        color_discrete_sequence=px.colors.qualitative.Plotly
+    )
+    fig_time.update_layout(xaxis_title="Mois", yaxis_title="Coût Total", xaxis_tickangle=45)
+    fig_time.update_traces(
+        hovertemplate="<b>Mois:</b> %{x}<br><b>Groupe:</b> %{fullData.name}<br><b>Coût:</b> %{y:,.2f}"
+    )
+    images.add_picture(doc, fig_time, width=Inches(6))
+
+    # Répartition de la Quantité par Groupe
+    doc.add_heading("Répartition de la Quantité par Groupe", level=2)
+    doc.add_paragraph(
+        "Ce graphique en boîte affiche la répartition des quantités pour chaque groupe, mettant en évidence les médianes, les quartiles et les valeurs aberrantes. "
+        "Il aide à identifier la variabilité des niveaux de stock au sein des groupes, utile pour détecter les catégories surstockées ou sous-stockées."
+    )
+    fig_box = px.box(
+        views.filtered_df,
+        x="GROUPE",
+        y="QUANTITE",
+        title="Répartition de la Quantité par Groupe",
+        color="GROUPE",
+        color_discrete_sequence=px.colors.qualitative.Plotly
+    )
+    fig_box.update_layout(xaxis_title="Groupe", yaxis_title="Quantité", xaxis_tickangle=45, showlegend=False)
+    fig_box.update_traces(
+        hovertemplate="<b>Groupe:</b> %{x}<br><b>Quantité:</b> %{y:,.2f}"
+    )
+    images.add_picture(doc, fig_box, width=Inches(6))
+
+    # Données de Stock
+    doc.add_heading("Données de Stock", level=1)
+    doc.add_paragraph("Tableau des données de stock (première page) :")
+    if not paged_df.empty:
+        num_cols = len(paged_df.columns)
+        num_rows = len(paged_df) + 1  # +1 for header
+        table = doc.add_table(rows=num_rows, cols=num_cols)
+        hdr_cells = table.rows[0].cells
+        for i, col in enumerate(paged_df.columns):
+            hdr_cells[i].text = col
+        for row_idx, row in paged_df.iterrows():
+            row_cells = table.rows[row_idx + 1].cells
+            if len(row_cells) != num_cols:
+                on_error(f"Erreur: Nombre de cellules ({len(row_cells)}) ne correspond pas au nombre de colonnes ({num_cols}) pour la ligne {row_idx + 1} dans 'Paged Data'")
+                continue
+            for col_idx in range(num_cols):
+                try:
+                    value = row.iloc[col_idx]
+                    row_cells[col_idx].text = sanitize_text(value)
+                except Exception as e:
+                    on_error(f"Erreur lors du remplissage de la table 'Paged Data' à la ligne {row_idx + 1}, colonne {col_idx}: {e}")
+                    row_cells[col_idx].text = "Erreur"
+    else:
+        doc.add_paragraph("Aucune donnée de stock disponible.")
+
+    # Alertes (si affichées)
+    if alerts_df is not None and not alerts_df.empty:
+        doc.add_heading("Alertes", level=1)
+        doc.add_paragraph(f"{len(alerts_df)} alertes trouvées.")
+        num_cols = len(alerts_df.columns)
+        num_rows = len(alerts_df) + 1  # +1 for header
+        table = doc.add_table(rows=num_rows, cols=num_cols)
+        hdr_cells = table.rows[0].cells
+        for i, col in enumerate(alerts_df.columns):
+            hdr_cells[i].text = col
+        for row_idx, row in alerts_df.iterrows():
+            row_cells = table.rows[row_idx + 1].cells
+            if len(row_cells) != num_cols:
+                on_error(f"Erreur: Nombre de cellules ({len(row_cells)}) ne correspond pas au nombre de colonnes ({num_cols}) pour la ligne {row_idx + 1} dans 'Alerts'")
+                continue
+            for col_idx in range(num_cols):
+                try:
+                    value = row.iloc[col_idx]
+                    row_cells[col_idx].text = sanitize_text(value)
+                except Exception as e:
+                    on_error(f"Erreur lors du remplissage de la table 'Alerts' à la ligne {row_idx + 1}, colonne {col_idx}: {e}")
+                    row_cells[col_idx].text = "Erreur"
+    elif alerts_df is not None:
+        doc.add_paragraph("Aucune alerte trouvée.")
+
+    # Insertion des graphiques rendus en parallèle
+    images.finish(progress=progress)
+
+    # Sauvegarder le document dans un buffer
+    buffer = BytesIO()
+    doc.save(buffer)
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+Z_THRESHOLD = 3.0
+MIN_GROUP_SIZE = 11
+# Facteur de cohérence entre MAD et écart-type pour une loi normale
+MAD_SCALE = 0.6745
+
+
+# Fonction pour calculer les scores d'anomalie de chaque ligne par rapport à son groupe
+# robust=False : score Z classique (moyenne / écart-type de population, comme scipy.stats.zscore)
+# robust=True : score Z modifié (médiane / MAD), moins sensible aux valeurs extrêmes elles-mêmes
+# Les groupes trop petits ou sans dispersion reçoivent un score NaN
+def group_scores(df, group_col, value_col, min_size=MIN_GROUP_SIZE, robust=False):
+    values = df[value_col]
+    keys = df[group_col]
+    grouped = values.groupby(keys, sort=False, observed=True)
+    size = grouped.transform('size')
+    if robust:
+        center = grouped.transform('median')
+        scale = (values - center).abs().groupby(keys, sort=False, observed=True).transform('median') / MAD_SCALE
+    else:
+        center = grouped.transform('mean')
+        scale = grouped.transform('std', ddof=0)
+    eligible = (size >= min_size) & (scale > 0)
+    return (values - center) / scale.where(eligible)
+
+
+# Fonction pour lister les groupes exclus de la détection (taille insuffisante ou dispersion nulle)
+# Renvoie une Series groupe -> nombre d'enregistrements, dans l'ordre d'apparition
+def skipped_groups(df, group_col, value_col, min_size=MIN_GROUP_SIZE, robust=False):
+    grouped = df.groupby(group_col, sort=False, observed=True)[value_col]
+    if robust:
+        dispersion = grouped.agg(lambda x: (x - x.median()).abs().median())
+    else:
+        dispersion = grouped.var()
+    sizes = grouped.size()
+    return sizes[(sizes < min_size) | ~(dispersion > 0)]
+
+
+# Fonction pour extraire les lignes anormales (|score| > seuil) en un seul passage
+# Les lignes sont renvoyées groupe par groupe, dans l'ordre d'apparition des groupes
+def detect_anomalies(df, group_col, value_col, columns, threshold=Z_THRESHOLD, min_size=MIN_GROUP_SIZE, robust=False):
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+    scores = group_scores(df, group_col, value_col, min_size=min_size, robust=robust)
+    mask = (scores.abs() > threshold).to_numpy()
+    codes = pd.factorize(df[group_col])[0][mask]
+    anomalies = df.loc[mask, columns].iloc[np.argsort(codes, kind='stable')]
+    return anomalies.reset_index(drop=True)
@@ -0,0 +1,234 @@
+import argparse
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+import numpy as np
+
+from forecasting import (
+    FORECAST_STEPS, MAX_WORKERS, PARALLEL_MIN_SERIES, _fit_arima, _get_executor, _reset_executor,
+    fit_many, fit_many_holt, holt_forecast, stack_series, series_key
+)
+from ingestion import write_atomic
+from profiling import profiled, record_cache
+
+# Modèle retenu par historique d'article, partagé par les tableaux de bord et le traitement de nuit
+SELECTION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "model_selection.json")
+# Modèles candidats, du plus simple au plus coûteux : à erreur égale, le plus simple l'emporte
+CANDIDATES = ("Naïf", "Moyenne mobile 3", "Holt", "ARIMA(0,1,1)", "ARIMA(1,1,1)", "ARIMA(2,1,1)")
+# Validation glissante : BACKTEST_FOLDS origines, chacune prévoyant BACKTEST_HORIZON mois
+BACKTEST_FOLDS = 3
+BACKTEST_HORIZON = 3
+# Nombre minimal de mois d'apprentissage pour une origine ; en dessous, le modèle par défaut est retenu
+MIN_TRAIN = 6
+DEFAULT_MODEL = "Holt"
+# Articles évalués par tâche envoyée au pool de processus
+CHUNK_SIZE = 8
+MAX_SELECTIONS = 20000
+
+_selections = None
+_selections_mtime = None
+_selections_lock = threading.Lock()
+
+
+def _arima_order(name):
+    return tuple(int(part) for part in name[len("ARIMA("):-1].split(","))
+
+
+# Fonction pour calculer la clé d'historique d'une série : le dernier mois, souvent incomplet, est exclu
+# Tant qu'aucun nouveau mois n'arrive, la clé ne change pas et le modèle retenu est réutilisé
+def history_key(quantities):
+    return series_key(np.asarray(quantities, dtype="float64")[:-1], "selection", (CANDIDATES, BACKTEST_FOLDS, BACKTEST_HORIZON))
+
+
+# Fonction pour découper un historique en plis (apprentissage, test) à origines glissantes
+def rolling_splits(history, folds=BACKTEST_FOLDS, horizon=BACKTEST_HORIZON, min_train=MIN_TRAIN):
+    origins = [len(history) - horizon * k for k in range(folds, 0, -1)]
+    return [(history[:origin], history[origin:origin + horizon]) for origin in origins if origin >= min_train]
+
+
+# Fonction pour prévoir avec un modèle candidat (ARIMA : None si l'ajustement échoue)
+def candidate_forecast(name, history, steps):
+    if name == "Naïf":
+        return np.repeat(history[-1], steps)
+    if name == "Moyenne mobile 3":
+        return np.repeat(history[-3:].mean(), steps)
+    if name == "Holt":
+        return holt_forecast(history, steps)[:, 0]
+    forecast, _ = _fit_arima(history, _arima_order(name), steps)
+    return forecast
+
+
+# Fonction exécutée dans les processus du pool : erreur absolue moyenne de chaque candidat pour un lot d'historiques
+# Holt est ajusté sur tous les plis du lot en une passe ; un candidat qui échoue sur un pli est écarté (None)
+def _backtest_chunk(histories, candidates=CANDIDATES, folds=BACKTEST_FOLDS, horizon=BACKTEST_HORIZON):
+    splits = [rolling_splits(history, folds, horizon) for history in histories]
+    flat = [(i, train, test) for i, article_splits in enumerate(splits) for train, test in article_splits]
+    errors = [{name: [] for name in candidates} for _ in histories]
+    if "Holt" in candidates and flat:
+        holt = holt_forecast(stack_series([train for _, train, _ in flat]), horizon)
+    for k, (i, train, test) in enumerate(flat):
+        for name in candidates:
+            if errors[i][name] is None:
+                continue
+            forecast = holt[:, k] if name == "Holt" else candidate_forecast(name, train, horizon)
+            if forecast is None:
+                errors[i][name] = None
+            else:
+                errors[i][name].append(np.abs(forecast[:len(test)] - test))
+    return [
+        {name: (float(np.concatenate(values).mean()) if values else None) for name, values in article_errors.items()}
+        if article_splits else {}
+        for article_errors, article_splits in zip(errors, splits)
+    ]
+
+
+# Fonction pour retenir le candidat de plus faible erreur (ordre de CANDIDATES en cas d'égalité)
+def pick_model(scores):
+    valid = [(score, CANDIDATES.index(name), name) for name, score in scores.items() if score is not None]
+    if not valid:
+        return DEFAULT_MODEL, None
+    score, _, name = min(valid)
+    return name, score
+
+
+def _file_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+# Fonction pour obtenir les sélections enregistrées, relues quand le fichier a changé (traitement de nuit)
+def _load_selections():
+    global _selections, _selections_mtime
+    mtime = _file_mtime(SELECTION_PATH)
+    if _selections is None or mtime != _selections_mtime:
+        try:
+            with open(SELECTION_PATH, "r", encoding="utf-8") as f:
+                _selections = json.load(f)
+        except (OSError, ValueError):
+            _selections = {}
+        _selections_mtime = mtime
+    return _selections
+
+
+def _dump_json(data, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+def _save_selections(selections):
+    global _selections_mtime
+    # On garde les sélections les plus récentes
+    if len(selections) > MAX_SELECTIONS:
+        for key in sorted(selections, key=lambda k: selections[k]["selected"])[:len(selections) - MAX_SELECTIONS]:
+            del selections[key]
+    try:
+        os.makedirs(os.path.dirname(SELECTION_PATH), exist_ok=True)
+        write_atomic(SELECTION_PATH, lambda p: _dump_json(selections, p))
+        _selections_mtime = _file_mtime(SELECTION_PATH)
+    except OSError:
+        # Sans disque, les sélections restent en mémoire pour la durée du processus
+        pass
+
+
+# Fonction pour lancer les backtests d'un lot d'historiques : pool de processus par paquets, série sinon
+def _run_backtests(histories):
+    chunks = [histories[i:i + CHUNK_SIZE] for i in range(0, len(histories), CHUNK_SIZE)]
+    scores = None
+    if len(histories) >= PARALLEL_MIN_SERIES and MAX_WORKERS > 1:
+        try:
+            scores = [s for chunk_scores in _get_executor().map(_backtest_chunk, chunks) for s in chunk_scores]
+        except (BrokenProcessPool, OSError, RuntimeError):
+            _reset_executor()
+            scores = None
+    if scores is None:
+        scores = [s for chunk in chunks for s in _backtest_chunk(chunk)]
+    return scores
+
+
+# Fonction pour retenir un modèle par série : sélection mémorisée si l'historique n'a pas changé, backtest sinon
+# Renvoie, dans l'ordre des séries, un dict (model, mae, months, selected, scores)
+@profiled("backtesting.select_models")
+def select_models(quantities_list):
+    quantities_list = [np.asarray(q, dtype="float64") for q in quantities_list]
+    keys = [history_key(q) for q in quantities_list]
+    with _selections_lock:
+        selections = _load_selections()
+        results = [selections.get(key) for key in keys]
+    pending = list(dict.fromkeys(key for key, result in zip(keys, results) if result is None))
+    record_cache(True, len(keys) - sum(result is None for result in results))
+    record_cache(False, sum(result is None for result in results))
+    if not pending:
+        return results
+
+    histories = {key: q[:-1] for key, q in zip(keys, quantities_list)}
+    scores = _run_backtests([histories[key] for key in pending])
+    selected = datetime.now().isoformat(timespec="seconds")
+    new = {}
+    for key, article_scores in zip(pending, scores):
+        model, mae = pick_model(article_scores)
+        new[key] = {"model": model, "mae": mae, "months": len(histories[key]), "selected": selected, "scores": article_scores}
+    with _selections_lock:
+        selections = _load_selections()
+        selections.update(new)
+        _save_selections(selections)
+    return [result if result is not None else new[key] for key, result in zip(keys, results)]
+
+
+# Fonction pour prévoir chaque série avec son modèle retenu ; même format de résultat que fit_many
+# Les séries sont regroupées par modèle : Holt en une passe, chaque ordre ARIMA via le pool et son cache
+@profiled("backtesting.fit_many_selected")
+def fit_many_selected(quantities_list, steps=FORECAST_STEPS):
+    quantities_list = [np.asarray(q, dtype="float64") for q in quantities_list]
+    results = [None] * len(quantities_list)
+    groups = {}
+    for i, selection in enumerate(select_models(quantities_list)):
+        groups.setdefault(selection["model"], []).append(i)
+    for model, indices in groups.items():
+        subset = [quantities_list[i] for i in indices]
+        if model == "Holt":
+            fitted = fit_many_holt(subset, steps)
+        elif model.startswith("ARIMA("):
+            fitted = fit_many(subset, _arima_order(model), steps)
+        else:
+            fitted = [(np.clip(candidate_forecast(model, q, steps), 0, None), None) for q in subset]
+        for i, result in zip(indices, fitted):
+            results[i] = result
+    return results
+
+
+# Traitement de nuit : sélection des modèles pour tous les articles d'un tableau de bord
+# Exemple : python -m backtesting consommation
+def main():
+    parser = argparse.ArgumentParser(description="Sélection des modèles de prévision par backtest (tous les articles)")
+    parser.add_argument("source", choices=["consommation", "da"])
+    parser.add_argument("--min-rows", type=int, default=3, help="Nombre minimal d'enregistrements par article")
+    args = parser.parse_args()
+
+    from forecasting import monthly_series
+    if args.source == "consommation":
+        from analytics.consommation import load_consumption
+        df, columns = load_consumption().df, ("Article", "Date", "Qte")
+    else:
+        from analytics.da import load_procurement
+        df, columns = load_procurement().df, ("article_desc", "date_commande", "quantite")
+    item_col, date_col, qty_col = columns
+    start = time.perf_counter()
+    items = df[item_col].dropna().unique().tolist()
+    series = monthly_series(df.dropna(subset=[date_col]), item_col, date_col, qty_col, items, min_rows=args.min_rows)
+    selections = select_models([quantities for _, quantities, _ in series.values()])
+    elapsed = time.perf_counter() - start
+
+    print(f"Articles évalués : {len(selections):,} en {elapsed:.1f} s ({MAX_WORKERS} processus)")
+    for model, count in Counter(s["model"] for s in selections).most_common():
+        print(f"  {model:<18} {count:,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from filters import sort_by_date, date_range_slice, filter_values
+
+
+# Fonction pour générer un DataFrame synthétique de consommation (dates sur 3 ans, 400 articles)
+def make_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("2022-01-01")
+    return pd.DataFrame({
+        "Date": start + rng.integers(0, 3 * 365 * 24 * 3600, size=rows).astype("timedelta64[s]"),
+        "Desc_CA": pd.Series(rng.integers(0, 400, size=rows)).map(lambda i: f"ARTICLE {i:03d}"),
+        "Montant": rng.gamma(2.0, 500.0, size=rows),
+    })
+
+
+def mask_date_range(df, start, end):
+    return df[(df["Date"].dt.date >= start) & (df["Date"].dt.date <= end)]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des filtres de période (masque .dt.date vs recherche dichotomique)")
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+    start, end = pd.Timestamp("2023-03-01").date(), pd.Timestamp("2023-08-31").date()
+    items = [f"ARTICLE {i:03d}" for i in range(0, 400, 7)]
+
+    expected, mask_time = timed(mask_date_range, df, start, end)
+    sorted_df, sort_time = timed(sort_by_date, df)
+    result, slice_time = timed(date_range_slice, sorted_df, start, end)
+    assert len(result) == len(expected)
+    assert np.isclose(result["Montant"].sum(), expected["Montant"].sum())
+
+    expected_items, isin_time = timed(filter_values, df, "Desc_CA", items)
+    categorical_df = df.assign(Desc_CA=df["Desc_CA"].astype("category"))
+    result_items, codes_time = timed(filter_values, categorical_df, "Desc_CA", items)
+    assert len(result_items) == len(expected_items)
+
+    print(f"Lignes                    : {args.rows:,}")
+    print(f"Masque .dt.date           : {mask_time:.3f} s")
+    print(f"Tri (au chargement)        : {sort_time:.3f} s")
+    print(f"Recherche dichotomique    : {slice_time * 1000:.3f} ms")
+    print(f"Accélération (période)    : x{mask_time / slice_time:,.0f}")
+    print(f"isin (texte)              : {isin_time:.3f} s")
+    print(f"Codes catégoriels         : {codes_time:.3f} s")
+    print(f"Accélération (articles)   : x{isin_time / codes_time:,.1f}")
+
+
+if __name__ == "__main__":
+    main()
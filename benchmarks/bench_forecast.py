@@ -0,0 +1,51 @@
+import argparse
+import time
+
+import numpy as np
+
+from forecasting import fit_many, fit_many_holt, holt_forecast, stack_series
+
+
+# Fonction pour générer des séries mensuelles synthétiques (3 à 36 mois, niveau, tendance et bruit variables)
+def make_series(count, seed=0):
+    rng = np.random.default_rng(seed)
+    series = []
+    for _ in range(count):
+        months = rng.integers(3, 37)
+        level, slope = rng.gamma(2.0, 100.0), rng.normal(0, 5)
+        series.append(np.clip(level + slope * np.arange(months) + rng.normal(0, level * 0.2, size=months), 0, None))
+    return series
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des prévisions (ARIMA série par série vs Holt vectorisé)")
+    parser.add_argument("--articles", type=int, default=5000)
+    parser.add_argument("--arima-articles", type=int, default=50, help="ARIMA est mesuré sur un sous-ensemble puis extrapolé")
+    args = parser.parse_args()
+
+    series = make_series(args.articles)
+    matrix, stack_time = timed(stack_series, series)
+    forecasts, holt_time = timed(holt_forecast, matrix)
+    assert forecasts.shape == (6, args.articles) and not np.isnan(forecasts).any()
+    holt_subset, _ = timed(fit_many_holt, series[:args.arima_articles])
+
+    arima_subset, arima_time = timed(fit_many, series[:args.arima_articles])
+    per_series = arima_time / args.arima_articles
+    gaps = [np.abs(h[0] - a[0]).mean() / max(a[0].mean(), 1) for h, a in zip(holt_subset, arima_subset) if a[0] is not None]
+
+    print(f"Articles                       : {args.articles:,} (matrice {matrix.shape[0]} mois x {matrix.shape[1]:,})")
+    print(f"Holt (empilement)              : {stack_time * 1000:.1f} ms")
+    print(f"Holt (ajustement + prévision)  : {holt_time:.3f} s")
+    print(f"ARIMA ({args.arima_articles} articles)            : {arima_time:.3f} s, soit ~{per_series * args.articles:,.0f} s pour {args.articles:,}")
+    print(f"Accélération                   : x{per_series * args.articles / (stack_time + holt_time):,.0f}")
+    print(f"Écart moyen Holt / ARIMA       : {np.mean(gaps):.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from derived_metrics import add_unit_cost
+
+
+# Fonction pour générer un DataFrame synthétique (Qte nulle sur ~10% des lignes)
+def make_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    qte = rng.integers(0, 50, size=rows).astype("float64")
+    qte[rng.random(rows) < 0.1] = 0
+    return pd.DataFrame({
+        "Qte": qte,
+        "Montant": rng.gamma(2.0, 500.0, size=rows),
+    })
+
+
+def apply_unit_cost(df):
+    return df.apply(lambda row: row["Montant"] / row["Qte"] if row["Qte"] > 0 else 0, axis=1)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du calcul du coût unitaire (apply vs vectorisé)")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+    expected, apply_time = timed(apply_unit_cost, df)
+    result, vector_time = timed(lambda frame: add_unit_cost(frame.copy(), "Montant", "Qte", "unit_cost"), df)
+
+    np.testing.assert_allclose(result["unit_cost"].to_numpy(), expected.to_numpy())
+    print(f"Lignes            : {args.rows:,}")
+    print(f"DataFrame.apply   : {apply_time:.3f} s")
+    print(f"Vectorisé         : {vector_time:.4f} s")
+    print(f"Accélération      : x{apply_time / vector_time:,.0f}")
+
+
+if __name__ == "__main__":
+    main()
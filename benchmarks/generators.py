@@ -0,0 +1,189 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Nombre maximal de lignes de données d'une feuille Excel (1 048 576 lignes, en-tête compris)
+EXCEL_MAX_ROWS = 1_048_575
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "bench")
+START = np.datetime64("2022-01-01")
+DAYS = 3 * 365
+
+ORGS = ["CMG_DRAA-LASFAR     ", "CMG_GUEMASSA        ", "CMG_OUMJRANE        ", "CMG_KOUDIAT_AICHA   "]
+CATEGORIES = [
+    "FUEL ET CARBURANT", "PIECES DE RECHANGE ENGINS", "PNEUMATIQUES", "LUBRIFIANTS", "EXPLOSIFS",
+    "SOCIAL ET SECURITE", "OUTILLAGE", "FOURNITURES DE BUREAU", "ELECTRICITE", "PRODUITS CHIMIQUES",
+]
+ENGINES = ["DUMPER", "FORATION", "10 TONNES"]
+R1600 = [
+    'CHARGEUSE CATERPILLAR 10T   R1600 Nｰ14 DS', 'CHARGEUSE CATERPILLAR R 1600H Nｰ15 DS',
+    'Chargeuse CATERPILLAR 10T  R1600 Nｰ16', 'Chargeuse CATERPILLAR 10T R1600 Nｰ17',
+    'Chargeuse  CAT    R1600 10T  Nｰ18', 'CHARGEUSE CATERPILLAR R 1600 Nｰ20',
+    'CHARGEUSE CATERPILLAR R 1600 Nｰ21', 'CHARGEUSE CATERPILLAR R1600 Nｰ22', 'CHARGEUSE CATERPILLAR R1600 Nｰ23',
+]
+STATUSES = ["APPROVED", "IN PROCESS", "REJECTED", "INCOMPLETE"]
+
+
+# Fonction pour tirer des libellés parmi une liste (tableau object partagé, sans copie des chaînes)
+def _pick(rng, labels, rows, weights=None):
+    labels = np.asarray(labels, dtype=object)
+    if weights is not None:
+        weights = np.asarray(weights, dtype="float64") / np.sum(weights)
+    return labels[rng.choice(len(labels), size=rows, p=weights)]
+
+
+def _dates(rng, rows, days=DAYS):
+    return pd.to_datetime(START + rng.integers(0, days, size=rows).astype("timedelta64[D]")).astype("datetime64[ns]")
+
+
+def _codes(prefix, count):
+    return [f"{prefix}{i:04d}" for i in range(count)]
+
+
+# Générateur : sorties de magasin (consommation.xlsx)
+def make_consommation(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    articles = max(50, min(5000, rows // 200))
+    article = _pick(rng, _codes("NG001.", articles), rows, weights=1 / np.arange(1, articles + 1))
+    qte = rng.integers(1, 500, size=rows)
+    return pd.DataFrame({
+        "Ste": "CMG            ",
+        "Org_Log": _pick(rng, ORGS, rows),
+        "CA": rng.integers(7_200_000, 7_230_000, size=rows),
+        "Desc_CA": _pick(rng, [f"CENTRE {i:03d}" for i in range(120)], rows),
+        "Cat": rng.integers(9000, 9400, size=rows),
+        "Desc_Cat": _pick(rng, CATEGORIES, rows),
+        "N_Bon": rng.integers(10_000, 999_999, size=rows),
+        "Date": _dates(rng, rows),
+        "Article": article,
+        "Des_article": pd.Series(article).str.replace("NG001.", "ARTICLE ", regex=False).to_numpy(dtype=object),
+        "Unite": _pick(rng, ["L         ", "UN        ", "KG        "], rows),
+        "Qte": qte,
+        "Montant": np.round(qte * rng.gamma(2.0, 20.0, size=rows), 2),
+        "Magasin": _pick(rng, ["MAGC      ", "MAGN      ", "MAGS      "], rows),
+    })
+
+
+# Générateur : demandes d'achat (demandes_achats.xlsx), colonnes utilisées par da.py
+def make_demandes_achats(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    articles = max(50, min(5000, rows // 100))
+    quantite = rng.integers(1, 100, size=rows).astype("float64")
+    prix = np.round(rng.gamma(2.0, 300.0, size=rows), 2)
+    date_commande = _dates(rng, rows)
+    date_promesse = date_commande + pd.to_timedelta(rng.integers(5, 60, size=rows), unit="D")
+    date_livraison = date_promesse + pd.to_timedelta(rng.integers(-10, 30, size=rows), unit="D")
+    # ~10% des commandes sans date (demandes non encore commandées)
+    undated = rng.random(rows) < 0.1
+    return pd.DataFrame({
+        "ste_site": "CMG            ",
+        "org_log": _pick(rng, ORGS, rows),
+        "da": rng.integers(60_000, 90_000, size=rows),
+        "demandeur": _pick(rng, [f"DEMANDEUR {i:02d}" for i in range(40)], rows),
+        "preparateur": _pick(rng, [f"PREPARATEUR {i:02d}" for i in range(20)], rows),
+        "acheteur_da": _pick(rng, [f"ACHETEUR {i:02d}" for i in range(10)], rows),
+        "article": _pick(rng, _codes("RP007.", articles), rows),
+        "article_desc": _pick(rng, [f"ARTICLE ACHAT {i:04d}" for i in range(articles)], rows, weights=1 / np.arange(1, articles + 1)),
+        "categorie_desc": _pick(rng, CATEGORIES, rows),
+        "unite": _pick(rng, ["UN        ", "KG        "], rows),
+        "quantite": quantite,
+        "date_commande": date_commande.where(~undated),
+        "date_promesse": date_promesse.where(~undated),
+        "date_livraison": date_livraison.where(~undated),
+        "prix_unitaire": prix,
+        "quantite_commande": quantite,
+        "montant": np.round(quantite * prix, 2),
+        "quantite_recue": np.floor(quantite * rng.random(rows)),
+        "quantite_due": np.zeros(rows),
+        "fournisseur": _pick(rng, [f"FOURNISSEUR {i:03d}" for i in range(300)], rows),
+        "statut_approbation": _pick(rng, STATUSES, rows, weights=[80, 10, 5, 5]),
+        "categorie_achat_1": _pick(rng, _codes("A", 12), rows),
+        "categorie_achat_1_desc": _pick(rng, CATEGORIES, rows),
+        "entite": _pick(rng, ["DAAL_AS", "DAAL_MN"], rows),
+    })
+
+
+# Générateur : état de stock (stock.xlsx)
+def make_stock(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    articles = max(50, rows // 5)
+    groups = rng.integers(9000, 9500, size=40)
+    group_idx = rng.integers(0, len(groups), size=rows)
+    return pd.DataFrame({
+        "STE": "CMG            ",
+        "ORG_LOG": _pick(rng, ORGS, rows),
+        "article": _pick(rng, _codes("RP007.", articles), rows),
+        "DES_ARTICLE": _pick(rng, [f"PIECE {i:05d}" for i in range(min(articles, 20_000))], rows),
+        "UO": _pick(rng, ["UN   ", "KG   ", "L    "], rows),
+        "QUANTITE": rng.integers(0, 200, size=rows),
+        "MONTANT": np.round(rng.gamma(2.0, 5000.0, size=rows), 2),
+        "GROUPE": groups[group_idx],
+        "DES_GROUPE": np.asarray([f"GROUPE {g}" for g in groups], dtype=object)[group_idx],
+        "Mois": rng.integers(2021, 2026, size=rows),
+    })
+
+
+# Générateur : sorties par engin (engins2.xlsx, feuille BASE DE DONNEE lue par engins.py et engins2.py)
+def make_engins(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    desc_ca = np.concatenate([R1600, [f"{cat} N{i:02d}" for cat in ENGINES for i in range(12)]]).astype(object)
+    engine = rng.integers(0, len(desc_ca), size=rows)
+    categorie = np.where(engine < len(R1600), "10 TONNES", np.asarray(ENGINES, dtype=object)[(engine - len(R1600)) // 12])
+    return pd.DataFrame({
+        "Date": _dates(rng, rows),
+        "CATEGORIE": categorie.astype(object),
+        "Desc_CA": desc_ca[engine],
+        "Desc_Cat": _pick(rng, CATEGORIES, rows),
+        "Montant": np.round(rng.gamma(2.0, 800.0, size=rows), 2),
+    })
+
+
+# Générateur : tonnage par site (DATE, DS Sud, DS Nord, KA)
+# Un relevé par minute pour que 10 millions de lignes restent dans la plage des dates pandas
+def make_tonnage(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "DATE": pd.date_range("2000-01-01", periods=rows, freq="min"),
+        "DS Sud": np.round(rng.gamma(5.0, 300.0, size=rows), 1),
+        "DS Nord": np.round(rng.gamma(5.0, 250.0, size=rows), 1),
+        "KA": np.round(rng.gamma(5.0, 150.0, size=rows), 1),
+    })
+
+
+# Générateur : heures de marche (ENGINS = date, une colonne par engin)
+def make_hours(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    hours = {f"{cat} N{i:02d}": np.round(rng.uniform(0, 20, size=rows), 1) for cat in ENGINES for i in range(4)}
+    return pd.DataFrame({"ENGINS": pd.date_range("2000-01-01", periods=rows, freq="min"), **hours})
+
+
+# Jeux de données : nom -> (générateur, feuille Excel)
+GENERATORS = {
+    "consommation": (make_consommation, "Sheet1"),
+    "demandes_achats": (make_demandes_achats, "Sheet1"),
+    "stock": (make_stock, "Sheet1"),
+    "engins2": (make_engins, "BASE DE DONNEE"),
+    "tonnage": (make_tonnage, "Sheet1"),
+    "heures_marche": (make_hours, "Sheet1"),
+}
+
+
+# Fonction pour écrire (une seule fois) le jeu synthétique d'une taille donnée
+# Jusqu'à EXCEL_MAX_ROWS lignes : classeur .xlsx ; au-delà (limite d'une feuille Excel) : fichier Parquet
+# Renvoie le chemin du fichier ; les fichiers existants sont réutilisés (même graine, même contenu)
+def write_dataset(name, rows, seed=0, data_dir=DATA_DIR):
+    generator, sheet_name = GENERATORS[name]
+    extension = "xlsx" if rows <= EXCEL_MAX_ROWS else "parquet"
+    path = os.path.join(data_dir, f"{name}-{rows}-{seed}.{extension}")
+    if os.path.exists(path):
+        return path
+    os.makedirs(data_dir, exist_ok=True)
+    df = generator(rows, seed)
+    tmp_path = f"{os.path.splitext(path)[0]}.tmp.{extension}"
+    if extension == "xlsx":
+        with pd.ExcelWriter(tmp_path, engine="xlsxwriter") as writer:
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+    else:
+        df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
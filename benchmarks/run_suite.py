@@ -0,0 +1,276 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+from docx import Document
+from docx.shared import Inches
+
+import forecasting
+import report_images
+from anomalies import detect_anomalies
+from benchmarks.generators import DATA_DIR, GENERATORS, write_dataset
+from cube import build_cube, slice_cube, rollup
+from derived_metrics import add_unit_cost
+from filters import sort_by_date, date_range_slice, filter_values
+from forecasting import forecast_articles, monthly_series
+from ingestion import read_excel_cached
+from memory import compact_frame
+from report_images import ReportImages
+from uploads import clean_workbook, TONNAGE_SCHEMA, HOURS_SCHEMA
+
+RESULTS_DIR = os.path.join(DATA_DIR, "results")
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+PERIOD = (pd.Timestamp("2023-03-01").date(), pd.Timestamp("2023-08-31").date())
+# Colonnes converties en category au chargement, comme dans les tableaux de bord
+CATEGORICAL = {
+    "consommation": ["Ste", "Org_Log", "Desc_CA", "Desc_Cat", "Article", "Des_article", "Unite", "Magasin"],
+    "demandes_achats": ["ste_site", "org_log", "demandeur", "preparateur", "acheteur_da", "article", "article_desc",
+                        "categorie_desc", "unite", "fournisseur", "categorie_achat_1", "categorie_achat_1_desc", "entite"],
+    "stock": ["STE", "ORG_LOG", "DES_ARTICLE", "UO", "DES_GROUPE"],
+    "engins2": ["CATEGORIE", "Desc_CA", "Desc_Cat"],
+    "tonnage": [],
+    "heures_marche": [],
+}
+
+
+# Fonction pour vider les caches de calcul entre deux répétitions (ajustements ARIMA, images PNG)
+def reset_caches():
+    with forecasting._fit_cache_lock:
+        forecasting._fit_cache.clear()
+    with report_images._png_cache_lock:
+        report_images._png_cache.clear()
+        report_images._png_cache_size = 0
+
+
+def case_filter(df, category_col, categories):
+    df = sort_by_date(df)
+    return filter_values(date_range_slice(df, *PERIOD), category_col, categories)
+
+
+def case_forecast(df, item_col, date_col, qty_col, count=5):
+    items = df.groupby(item_col, observed=True)[qty_col].sum().nlargest(count).index.tolist()
+    forecast_data, _, _ = forecast_articles(monthly_series(df, item_col, date_col, qty_col, items))
+    return forecast_data
+
+
+def consommation_aggregate(df):
+    cube = build_cube(df, ["Org_Log", "Desc_Cat", "Article"], ["Qte", "Montant"])
+    cube_slice = slice_cube(cube, *PERIOD, Org_Log="Tous", Desc_Cat="Tous")
+    return [rollup(cube_slice, dimension, "Montant") for dimension in ["Date", "Desc_Cat", "Article"]]
+
+
+# Rapport Word représentatif : 3 graphiques rendus par kaleido et un tableau des 50 plus gros montants
+def consommation_report(df):
+    doc = Document()
+    images = ReportImages(width=800, height=350)
+    doc.add_heading("Rapport de consommation (benchmark)", level=1)
+    trend = df.groupby(df["Date"].dt.to_period("M"), observed=True)["Montant"].sum()
+    categories = df.groupby("Desc_Cat", observed=True)["Montant"].sum().reset_index()
+    articles = df.groupby("Article", observed=True)["Qte"].sum().nlargest(10).reset_index()
+    images.add_picture(doc, px.line(x=trend.index.astype(str), y=trend.values), width=Inches(6))
+    images.add_picture(doc, px.pie(categories, values="Montant", names="Desc_Cat"), width=Inches(6))
+    images.add_picture(doc, px.bar(articles, x="Article", y="Qte"), width=Inches(6))
+    top = df.nlargest(50, "Montant")[["Date", "Article", "Desc_Cat", "Montant"]]
+    table = doc.add_table(rows=1, cols=len(top.columns))
+    for cell, col in zip(table.rows[0].cells, top.columns):
+        cell.text = col
+    for row in top.itertuples(index=False):
+        for cell, value in zip(table.add_row().cells, row):
+            cell.text = str(value)
+    images.finish()
+    buffer = BytesIO()
+    doc.save(buffer)
+    return buffer
+
+
+def demandes_aggregate(df):
+    return [
+        df.groupby("categorie_achat_1", observed=True)["montant"].sum().nlargest(10),
+        df.groupby("fournisseur", observed=True)["montant"].sum().nlargest(7),
+        df.groupby(["fournisseur", "categorie_achat_1"], observed=True)["montant"].sum(),
+        df.assign(Mois=df["date_commande"].dt.to_period("M")).groupby(["Mois", "categorie_achat_1"], observed=True)["montant"].sum(),
+    ]
+
+
+def stock_aggregate(df):
+    by_article = df.groupby("article", observed=True).agg({"QUANTITE": "sum", "MONTANT": "sum"}).reset_index()
+    return [add_unit_cost(by_article, "MONTANT", "QUANTITE", "Coût Unitaire"), df.groupby("DES_GROUPE", observed=True)["MONTANT"].sum()]
+
+
+def engins_aggregate(df):
+    months = df["Date"].dt.month
+    return [
+        df.groupby(months)["Montant"].sum(),
+        df.groupby("Desc_Cat", observed=True)["Montant"].sum(),
+        df.pivot_table(index="Desc_CA", columns=months, values="Montant", aggfunc="sum", observed=True),
+    ]
+
+
+# Étapes mesurées par jeu de données : nom -> fonction(df), df étant le jeu chargé puis compacté
+CASES = {
+    "consommation": {
+        "filter": lambda df: case_filter(df, "Desc_Cat", ["FUEL ET CARBURANT", "PNEUMATIQUES", "LUBRIFIANTS"]),
+        "aggregate": consommation_aggregate,
+        "forecast": lambda df: case_forecast(df, "Article", "Date", "Qte"),
+        "anomalies": lambda df: detect_anomalies(df, "Desc_Cat", "Montant", ["Article", "Desc_Cat", "Montant"]),
+        "report": consommation_report,
+    },
+    "demandes_achats": {
+        "aggregate": demandes_aggregate,
+        "forecast": lambda df: case_forecast(df, "article_desc", "date_commande", "quantite"),
+        "anomalies": lambda df: detect_anomalies(df, "categorie_achat_1", "montant", ["article_desc", "categorie_achat_1", "montant"]),
+    },
+    "stock": {
+        "aggregate": stock_aggregate,
+    },
+    "engins2": {
+        "filter": lambda df: case_filter(df, "CATEGORIE", ["DUMPER"]),
+        "aggregate": engins_aggregate,
+        "anomalies": lambda df: detect_anomalies(df, "Desc_Cat", "Montant", ["Desc_CA", "Desc_Cat", "Montant"]),
+    },
+    "tonnage": {
+        "clean": lambda df: clean_workbook(df.copy(), TONNAGE_SCHEMA),
+    },
+    "heures_marche": {
+        "clean": lambda df: clean_workbook(df.copy(), HOURS_SCHEMA),
+    },
+}
+
+
+def count_rows(result):
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return len(result)
+    if isinstance(result, list):
+        return sum(len(item) for item in result)
+    return None
+
+
+# Fonction pour mesurer une étape : durée minimale et médiane sur repeat exécutions (caches vidés avant chacune)
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        reset_caches()
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return result, min(timings) * 1000, statistics.median(timings) * 1000
+
+
+# Fonction pour mesurer le chargement : première lecture (Excel -> cache Parquet) puis lecture depuis le cache
+# Les jeux trop grands pour une feuille Excel sont lus directement en Parquet
+def measure_load(path, repeat):
+    if path.endswith(".parquet"):
+        df, best, median = measure(lambda: pd.read_parquet(path), repeat)
+        return df, [("load_parquet", best, median)]
+    timings = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        df, cold, _ = measure(lambda: read_excel_cached(path, cache_dir=cache_dir), 1)
+        _, best, median = measure(lambda: read_excel_cached(path, cache_dir=cache_dir), repeat)
+    timings.append(("load_cold", cold, cold))
+    timings.append(("load_warm", best, median))
+    return df, timings
+
+
+def record(results, name, rows, case, best, median, rows_out):
+    results.append({"dataset": name, "rows": rows, "case": case, "min_ms": best, "median_ms": median, "rows_out": rows_out})
+    print(f"  {name:<16} {rows:>12,} {case:<12} {best:>12,.1f} ms")
+
+
+def run_dataset(name, rows, repeat, seed, cases=None, data_dir=DATA_DIR):
+    results = []
+    path = write_dataset(name, rows, seed, data_dir)
+    raw, load_timings = measure_load(path, repeat)
+    for case, best, median in load_timings:
+        record(results, name, rows, case, best, median, len(raw))
+
+    df, best, median = measure(lambda: compact_frame(raw, f"bench:{name}", CATEGORICAL[name]), repeat)
+    record(results, name, rows, "compact", best, median, len(df))
+    del raw
+
+    for case, func in CASES[name].items():
+        if cases and case not in cases:
+            continue
+        result, best, median = measure(lambda: func(df), repeat)
+        record(results, name, rows, case, best, median, count_rows(result))
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_sizes(text):
+    return [SIZES[size.lower()] if size.lower() in SIZES else int(size) for size in text.split(",")]
+
+
+# Fonction pour comparer deux séries de résultats (même jeu, même taille, même étape)
+# Rapport > 1 : la version courante est plus rapide
+def compare(baseline, current):
+    keys = ["dataset", "rows", "case"]
+    before = pd.DataFrame(baseline["results"])[keys + ["min_ms"]].rename(columns={"min_ms": "Avant (ms)"})
+    after = pd.DataFrame(current["results"])[keys + ["min_ms"]].rename(columns={"min_ms": "Après (ms)"})
+    table = before.merge(after, on=keys, how="outer")
+    table["Rapport"] = (table["Avant (ms)"] / table["Après (ms)"]).round(2)
+    return table.round(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suite de benchmarks sur jeux synthétiques (chargement, agrégats, prévisions, anomalies, rapport)")
+    parser.add_argument("--sizes", default="10k,100k", help="tailles séparées par des virgules : 10k, 100k, 1m, 10m ou un nombre de lignes")
+    parser.add_argument("--datasets", default=",".join(GENERATORS), help="jeux de données à mesurer")
+    parser.add_argument("--cases", default=None, help="étapes à mesurer en plus du chargement (toutes par défaut)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--output", default=None, help="fichier JSON des résultats (par défaut dans .cache/bench/results)")
+    parser.add_argument("--compare", default=None, help="fichier JSON d'une exécution précédente à comparer")
+    args = parser.parse_args()
+
+    cases = args.cases.split(",") if args.cases else None
+    results = []
+    for rows in parse_sizes(args.sizes):
+        for name in args.datasets.split(","):
+            results.extend(run_dataset(name, rows, args.repeat, args.seed, cases, args.data_dir))
+
+    run = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(run, f, indent=2)
+    print(f"Résultats : {output}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        print(f"Comparaison avec {args.compare} (révision {baseline['meta'].get('revision')}) :")
+        print(compare(baseline, run).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import functools
+import hashlib
+import inspect
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from ingestion import source_hash
+from profiling import record_cache
+
+# Valeurs par défaut : les calculs dépendant des filtres gardent plus d'entrées que les chargeurs
+MAX_ENTRIES = 64
+TTL_SECONDS = 3600
+LOADER_MAX_ENTRIES = 2
+LOADER_TTL_SECONDS = 24 * 3600
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+# Cache LRU borné en nombre d'entrées, avec durée de vie et compteurs de hits / misses
+class BoundedCache:
+    def __init__(self, name, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS, version=None):
+        self.name = name
+        self.version = version
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if self.ttl is None or time.monotonic() - stored_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+                self.expired += 1
+            self.misses += 1
+        return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            calls = self.hits + self.misses
+            return {
+                "Cache": self.name,
+                "Entrées": len(self._entries),
+                "Max": self.max_entries,
+                "TTL (s)": self.ttl,
+                "Hits": self.hits,
+                "Misses": self.misses,
+                "Taux de hit": f"{self.hits / calls:.0%}" if calls else "-",
+                "Expirées": self.expired,
+                "Évincées": self.evicted,
+            }
+
+
+# Fonction pour rendre une valeur de filtre utilisable dans une clé (listes -> tuples, ensembles triés)
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(_freeze(v) for v in value))
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        raise TypeError("un DataFrame ne peut pas servir de clé de cache : ajoutez-le à exclude")
+    hash(value)
+    return value
+
+
+# Fonction pour identifier une version du code d'une fonction (source, ou bytecode à défaut)
+def _code_version(func):
+    try:
+        code = inspect.getsource(func).encode("utf-8")
+    except (OSError, TypeError):
+        code = func.__code__.co_code
+    return hashlib.sha1(code).hexdigest()
+
+
+# Fonction pour obtenir le cache enregistré sous name
+# Streamlit réexécute le script à chaque interaction : le cache existant est repris, sauf si le code a changé
+def _register(name, max_entries, ttl, version):
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None or cache.version != version:
+            cache = _caches[name] = BoundedCache(name, max_entries, ttl, version)
+        cache.max_entries, cache.ttl = max_entries, ttl
+        return cache
+
+
+# Décorateur pour mettre en cache un calcul avec une clé bon marché, à la place de @st.cache_data
+# La clé est composée du hash des fichiers sources (sources) et des autres arguments (filtres, métriques) ;
+# les arguments listés dans exclude (DataFrames issus des sources) ne sont jamais hachés
+# Les résultats sont partagés par toutes les sessions : lecture seule, comme les jeux de st.cache_resource
+def bounded_cache(name, sources=(), exclude=(), max_entries=MAX_ENTRIES, ttl=TTL_SECONDS):
+    def decorator(func):
+        signature = inspect.signature(func)
+        version = _code_version(func)
+        cache = _register(name, max_entries, ttl, version)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = tuple(source_hash(path) for path in sources) + tuple(
+                (arg, _freeze(value)) for arg, value in bound.arguments.items() if arg not in exclude
+            )
+            found, value = cache.get(key)
+            record_cache(found)
+            if found:
+                return value
+            value = func(*args, **kwargs)
+            cache.put(key, value)
+            return value
+
+        wrapper.cache = cache
+        wrapper.clear = cache.clear
+        return wrapper
+    return decorator
+
+
+# Fonction pour obtenir l'état des caches du processus (entrées, hits, misses) pour le panneau de debug
+def cache_report():
+    with _caches_lock:
+        caches = list(_caches.values())
+    rows = [cache.stats() for cache in caches]
+    return pd.DataFrame(rows, columns=["Cache", "Entrées", "Max", "TTL (s)", "Hits", "Misses", "Taux de hit", "Expirées", "Évincées"])
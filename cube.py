@@ -0,0 +1,25 @@
+from filters import date_range_slice, filter_values
+
+
+# Fonction pour construire un cube d'agrégats journaliers (jour × dimensions) trié par date
+# Les lignes sans date sont exclues, comme par le filtre de période des tableaux de bord
+def build_cube(df, dimensions, measures, date_col="Date"):
+    day = df[date_col].dt.normalize().rename(date_col)
+    cube = df.groupby([day] + [df[dim] for dim in dimensions], sort=True, observed=True)[measures].sum()
+    return cube.reset_index()
+
+
+# Fonction pour extraire une tranche du cube : période [start, end] (bornes incluses, en jours)
+# puis égalité sur les dimensions passées dans filters (une valeur None ou "Tous" ne filtre pas)
+# La période est trouvée par recherche dichotomique sur la colonne de date triée (filters.date_range_slice)
+def slice_cube(cube, start, end, date_col="Date", **filters):
+    cube_slice = date_range_slice(cube, start, end, date_col)
+    for dim, value in filters.items():
+        if value is not None and value != "Tous":
+            cube_slice = filter_values(cube_slice, dim, value)
+    return cube_slice
+
+
+# Fonction pour totaliser une mesure d'une tranche de cube selon une dimension
+def rollup(cube_slice, dimension, measure):
+    return cube_slice.groupby(dimension, sort=True, observed=True)[measure].sum().reset_index()
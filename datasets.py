@@ -0,0 +1,62 @@
+import threading
+import weakref
+
+import pandas as pd
+
+from memory import frame_memory_mb
+
+# Jeux de données partagés par toutes les sessions du processus : clé -> [DataFrame, nombre de références]
+# Les DataFrames publiés sont en lecture seule par convention : les filtres en dérivent des sous-ensembles
+# (masques, tranches) sans jamais les modifier en place
+_datasets = {}
+_datasets_lock = threading.Lock()
+
+
+# Référence d'une session vers un jeu partagé
+# La référence est rendue par release() ou automatiquement quand la poignée est détruite (fin de session)
+class DatasetHandle:
+    def __init__(self, key, frame, identity=None):
+        self.key = key
+        self.frame = frame
+        self.identity = identity
+        self._finalizer = weakref.finalize(self, release_dataset, key)
+
+    def release(self):
+        self._finalizer()
+
+
+# Fonction pour prendre une référence sur un jeu partagé
+# Si la clé est inconnue, frame est publié sous cette clé ; sans frame, renvoie None
+# Si un autre appel a publié la même clé entre-temps, c'est le jeu déjà publié qui est renvoyé
+def acquire_dataset(key, frame=None, identity=None):
+    with _datasets_lock:
+        entry = _datasets.get(key)
+        if entry is None:
+            if frame is None:
+                return None
+            entry = _datasets[key] = [frame, 0]
+        entry[1] += 1
+        frame = entry[0]
+    return DatasetHandle(key, frame, identity)
+
+
+# Fonction pour rendre une référence ; le jeu est libéré quand plus aucune session ne l'utilise
+def release_dataset(key):
+    with _datasets_lock:
+        entry = _datasets.get(key)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del _datasets[key]
+
+
+# Fonction pour obtenir l'état des jeux partagés (références et empreinte mémoire)
+def dataset_report():
+    with _datasets_lock:
+        entries = [(key, frame, refs) for key, (frame, refs) in _datasets.items()]
+    rows = [
+        {"Jeu partagé": key[:24], "Sessions": refs, "Lignes": len(frame), "Mémoire (Mo)": round(frame_memory_mb(frame), 2)}
+        for key, frame, refs in entries
+    ]
+    return pd.DataFrame(rows, columns=["Jeu partagé", "Sessions", "Lignes", "Mémoire (Mo)"])
@@ -0,0 +1,16 @@
+import numpy as np
+
+
+# Fonction pour diviser deux séries en renvoyant 0 lorsque le dénominateur est nul, négatif ou manquant
+def safe_divide(numerator, denominator):
+    numerator = np.asarray(numerator, dtype="float64")
+    denominator = np.asarray(denominator, dtype="float64")
+    result = np.zeros(numerator.shape, dtype="float64")
+    np.divide(numerator, denominator, out=result, where=denominator > 0)
+    return result
+
+
+# Fonction pour ajouter une colonne de coût unitaire (montant / quantité) de façon vectorisée
+def add_unit_cost(df, amount_col, quantity_col, target_col):
+    df[target_col] = safe_divide(df[amount_col], df[quantity_col])
+    return df
@@ -1,13 +1,16 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import numpy as np
-from docx import Document
-from docx.shared import Inches, Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
 from io import BytesIO
-import plotly.io as pio
-from PIL import Image
+from filters import filter_values
+from memory import memory_report
+from caching import bounded_cache, cache_report, LOADER_MAX_ENTRIES, LOADER_TTL_SECONDS
+from profiling import profiled, profile_report, recent_stages, is_admin
+from report_jobs import DONE, FAILED, DOCX_MIME, session_owner, submit_report, list_jobs, has_active_jobs, read_result
+from analytics.engins import (
+    SOURCE, load_engins, filter_engins, compute_fleet_kpis, category_breakdown, build_series_store, engin_series,
+    calendar_months, cost_projection, fleet_projection, compute_metrics, compute_prediction, prediction_table, generate_word_report
+)
 import google.generativeai as genai
 
 # Initialize Gemini API with hardcoded key
@@ -18,118 +21,18 @@ except Exception as e:
     st.error(f"Erreur lors de l'initialisation du client Gemini : {str(e)}")
     st.stop()
 
-# Cache expensive computations
-@st.cache_data
-def compute_monthly_costs(data):
-    monthly_data = data.groupby('Mois')['Montant'].sum().reset_index()
-    month_order = ['Janvier', 'Février', 'Mars', 'Avril', 'Mai', 'Juin', 
-                   'Juillet', 'Août', 'Septembre', 'Octobre', 'Novembre', 'Décembre']
-    monthly_data['Mois'] = pd.Categorical(monthly_data['Mois'], categories=month_order, ordered=True)
-    return monthly_data.sort_values('Mois')
-
-@st.cache_data
-def compute_category_breakdown(data):
-    return data.groupby('Desc_Cat')['Montant'].sum().reset_index()
-
-# Function to save Plotly figure as image
-def save_plotly_fig_as_image(fig):
-    img_bytes = pio.to_image(fig, format='png', width=800, height=350)
-    img = Image.open(BytesIO(img_bytes))
-    img_buffer = BytesIO()
-    img.save(img_buffer, format='PNG')
-    return img_buffer.getvalue()
-
-# Function to generate Word document
-def generate_word_report(engin_data, selected, figs, descriptions, metrics, predictions, budget_threshold):
-    doc = Document()
-    
-    # Title
-    title = doc.add_heading(f'Rapport d\'Analyse pour R1600-{selected.split("-")[-1]}', level=1)
-    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    doc.add_paragraph(f'Date du rapport : {pd.Timestamp.now().strftime("%d/%m/%Y")}')
-    
-    # Table of Contents
-    doc.add_heading('Tableau des Matières', level=2)
-    doc.add_paragraph('1. Introduction\n2. Résumé des Analyses\n3. Visualisations\n4. Indicateurs Clés\n5. Prévisions\n6. Recommandations', style='List Bullet')
-    
-    # Introduction
-    doc.add_heading('1. Introduction', level=2)
-    doc.add_paragraph(
-        'Ce rapport présente une analyse détaillée des coûts associés à l\'engin R1600, '
-        'incluant les visualisations, les indicateurs clés, les prévisions et les recommandations '
-        'pour optimiser la gestion des dépenses.'
-    )
-    
-    # Summary
-    doc.add_heading('2. Résumé des Analyses', level=2)
-    total_cost = engin_data['Montant'].sum()
-    top_category = engin_data.groupby('Desc_Cat')['Montant'].sum().idxmax()
-    trend = predictions.get('trend', 'Stable')
-    doc.add_paragraph(
-        f'Coût total : {total_cost:,.0f} MAD\n'
-        f'Catégorie principale : {top_category}\n'
-        f'Tendance récente : {trend}\n'
-        f'Nombre d\'interventions : {len(engin_data)}\n'
-        f'Coût médian : {engin_data["Montant"].median():,.0f} MAD'
-    )
-    
-    # Visualizations
-    doc.add_heading('3. Visualisations', level=2)
-    for i, (fig, desc, title) in enumerate(zip(figs, descriptions, [
-        'Évolution des Dépenses avec Projection', 'Distribution des Coûts', 
-        'Répartition par Catégorie', 'Coût Mensuel'
-    ])):
-        doc.add_heading(f'3.{i+1} {title}', level=3)
-        img_stream = BytesIO(save_plotly_fig_as_image(fig))
-        doc.add_picture(img_stream, width=Inches(6))
-        doc.add_paragraph(desc)
-    
-    # Key Metrics
-    doc.add_heading('4. Indicateurs Clés', level=2)
-    table = doc.add_table(rows=len(metrics) + 1, cols=2)
-    table.style = 'Table Grid'
-    hdr_cells = table.rows[0].cells
-    hdr_cells[0].text = 'Métrique'
-    hdr_cells[1].text = 'Valeur'
-    for i, (metric, value) in enumerate(metrics.items()):
-        row_cells = table.rows[i+1].cells
-        row_cells[0].text = metric
-        row_cells[1].text = str(value)
-    
-    # Predictions
-    doc.add_heading('5. Prévisions', level=2)
-    doc.add_paragraph(
-        f'Estimation moyenne : {predictions["avg"]:,.0f} MAD/mois\n'
-        f'Intervalle de confiance (95%) : {predictions["ci_lower"]:,.0f} - {predictions["ci_upper"]:,.0f} MAD\n'
-        f'Fiabilité : {predictions["reliability"]:.0f}%\n'
-        f'Tendance : {predictions["trend"]}'
-    )
-    
-    # Budget Threshold Analysis
-    if budget_threshold > 0:
-        high_costs = engin_data[engin_data['Montant'] > budget_threshold]
-        doc.add_heading('Analyse des Coûts Excédant le Seuil', level=3)
-        doc.add_paragraph(
-            f'Seuil défini : {budget_threshold:,.0f} MAD\n'
-            f'Nombre d\'interventions dépassant le seuil : {len(high_costs)}\n'
-            f'Coût total des interventions dépassant le seuil : {high_costs["Montant"].sum():,.0f} MAD'
-        )
-    
-    # Recommendations
-    doc.add_heading('6. Recommandations', level=2)
-    doc.add_paragraph(
-        'Sur la base des analyses, voici les recommandations :\n'
-        '- Prioriser la maintenance préventive pour réduire les coûts dans la catégorie principale.\n'
-        f'- Examiner les interventions coûteuses dans {top_category} pour identifier des alternatives économiques.\n'
-        '- Mettre en place un suivi mensuel pour détecter les tendances haussières tôt.\n'
-        '- Négocier avec les fournisseurs pour les pièces fréquemment utilisées.'
-    )
-    
-    # Save to buffer
-    buffer = BytesIO()
-    doc.save(buffer)
-    buffer.seek(0)
-    return buffer
+# Cache expensive computations (calculs dans analytics.engins)
+# Clé de cache : hash du classeur + engin analysé (data en est dérivé et n'est jamais haché)
+# Séries mensuelles et journalières de tous les engins, calculées une fois par période
+@profiled("engins.series")
+@bounded_cache("engins.series", sources=[SOURCE], exclude=("data",))
+def compute_series_store(data, date_range):
+    return build_series_store(data, date_range)
+
+@profiled("engins.category_breakdown")
+@bounded_cache("engins.category_breakdown", sources=[SOURCE], exclude=("data",))
+def compute_category_breakdown(data, engin):
+    return category_breakdown(data)
 
 # Function to generate chatbot response using Gemini API
 def generate_response(prompt, context_data):
@@ -138,7 +41,7 @@ def generate_response(prompt, context_data):
         data_summary = (
             f"Les données concernent les engins R1600. Coût total: {context_data['Montant'].sum():,.0f} MAD, "
             f"nombre d'interventions: {len(context_data)}, "
-            f"catégorie principale: {context_data.groupby('Desc_Cat')['Montant'].sum().idxmax()}. "
+            f"catégorie principale: {context_data.groupby('Desc_Cat', observed=True)['Montant'].sum().idxmax()}. "
             "Demandez des détails sur les coûts, catégories, ou engins spécifiques."
         )
         # Create a chat session with Gemini
@@ -250,47 +153,13 @@ if "chat_messages" not in st.session_state:
     ]
 
 # Charger les données
-@st.cache_data
+# Jeu partagé par toutes les sessions (cache sur le hash du classeur, sans copie par exécution) : lecture seule,
+# les filtres en dérivent des sous-ensembles sans le modifier
+@profiled("engins.load")
+@bounded_cache("engins.load", sources=[SOURCE], max_entries=LOADER_MAX_ENTRIES, ttl=LOADER_TTL_SECONDS)
 def load_data():
     try:
-        df = pd.read_excel('engins2.xlsx', sheet_name='BASE DE DONNEE')
-        
-        # Nettoyage des données
-        df['Desc_CA'] = df['Desc_CA'].str.replace('', '').str.strip()
-        df['Desc_Cat'] = df['Desc_Cat'].str.strip()
-        df['Montant'] = pd.to_numeric(df['Montant'], errors='coerce')
-        df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
-        
-        # Liste des engins spécifiques à analyser
-        engins_cibles = [
-            'CHARGEUSE CATERPILLAR 10T   R1600 Nｰ14 DS',
-            'CHARGEUSE CATERPILLAR R 1600H Nｰ15 DS',
-            'Chargeuse CATERPILLAR 10T  R1600 Nｰ16',
-            'Chargeuse CATERPILLAR 10T R1600 Nｰ17',
-            'Chargeuse  CAT    R1600 10T  Nｰ18',                
-            'CHARGEUSE CATERPILLAR R 1600 Nｰ20',
-            'CHARGEUSE CATERPILLAR R 1600 Nｰ21',
-            'CHARGEUSE CATERPILLAR R1600 Nｰ22',
-            'CHARGEUSE CATERPILLAR R1600 Nｰ23'
-        ]
-        
-        # Filtrer uniquement les engins cibles
-        df = df[df['Desc_CA'].isin(engins_cibles)].copy()
-        
-        # Extraire le numéro de l'engin et créer un nom standardisé
-        df['Numéro_Engin'] = df['Desc_CA'].str.extract(r'Nｰ(\d+)')
-        df['Engin_Formaté'] = 'R1600-' + df['Numéro_Engin']
-        
-        # Mois en français
-        months_fr = {
-            'January': 'Janvier', 'February': 'Février', 'March': 'Mars',
-            'April': 'Avril', 'May': 'Mai', 'June': 'Juin',
-            'July': 'Juillet', 'August': 'Août', 'September': 'Septembre',
-            'October': 'Octobre', 'November': 'Novembre', 'December': 'Décembre'
-        }
-        df['Mois'] = df['Date'].dt.month_name().map(months_fr)
-        
-        return df
+        return load_engins(SOURCE)
     except Exception as e:
         st.error(f"Erreur lors du chargement du fichier Excel : {str(e)}")
         return None
@@ -312,6 +181,7 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+fleet_kpis = compute_fleet_kpis(df)
 kpi_container = st.container()
 with kpi_container:
     kpi1, kpi2, kpi3, kpi4 = st.columns(4)
@@ -319,34 +189,31 @@ with kpi_container:
         st.markdown(f"""
         <div style='background-color:#fff8e1; padding:15px; border-radius:10px; text-align:center;'>
             <h6 style='color:#F28C38; margin-bottom:10px;'>Coût total</h6>
-            <p style='color:#424242; font-size:18px; font-weight:bold;'>{df['Montant'].sum():,.0f} MAD</p>
+            <p style='color:#424242; font-size:18px; font-weight:bold;'>{fleet_kpis.total_cost:,.0f} MAD</p>
             <p style='color:#424242; font-size:12px;'>Somme totale des dépenses</p>
         </div>
         """, unsafe_allow_html=True)
     with kpi2:
-        top_engine = df.groupby('Engin_Formaté')['Montant'].sum().idxmax()
         st.markdown(f"""
         <div style='background-color:#e8f5e9; padding:15px; border-radius:10px; text-align:center;'>
             <h6 style='color:#F28C38; margin-bottom:10px;'>Engin le plus coûteux</h6>
-            <p style='color:#424242; font-size:18px; font-weight:bold;'>{top_engine.split('-')[-1]}</p>
+            <p style='color:#424242; font-size:18px; font-weight:bold;'>{fleet_kpis.top_engine.split('-')[-1]}</p>
             <p style='color:#424242; font-size:12px;'>Numéro de l'engin</p>
         </div>
         """, unsafe_allow_html=True)
     with kpi3:
-        top_category = df.groupby('Desc_Cat')['Montant'].sum().idxmax()
         st.markdown(f"""
         <div style='background-color:#f3e5f5; padding:15px; border-radius:10px; text-align:center;'>
             <h6 style='color:#F28C38; margin-bottom:10px;'>Catégorie principale</h6>
-            <p style='color:#424242; font-size:18px; font-weight:bold;'>{top_category}</p>
+            <p style='color:#424242; font-size:18px; font-weight:bold;'>{fleet_kpis.top_category}</p>
             <p style='color:#424242; font-size:12px;'>Dépense dominante</p>
         </div>
         """, unsafe_allow_html=True)
     with kpi4:
-        avg_cost = df['Montant'].mean()
         st.markdown(f"""
         <div style='background-color:#ffebee; padding:15px; border-radius:10px; text-align:center;'>                                                                                                      
             <h6 style='color:#F28C38; margin-bottom:10px;'>Coût moyen</h6>
-            <p style='color:#424242; font-size:18px; font-weight:bold;'>{avg_cost:,.0f} MAD</p>
+            <p style='color:#424242; font-size:18px; font-weight:bold;'>{fleet_kpis.avg_cost:,.0f} MAD</p>
             <p style='color:#424242; font-size:12px;'>Par intervention</p>
         </div>
         """, unsafe_allow_html=True)
@@ -377,13 +244,7 @@ with st.sidebar:
     )
     
     # Statistiques filtrées
-    filtered_data = df.copy()
-    if selected_engin != 'Tous':
-        filtered_data = filtered_data[filtered_data['Engin_Formaté'] == selected_engin]
-    if len(date_range) == 2:  # Vérifie qu'une plage complète est sélectionnée
-        start_date, end_date = date_range
-        filtered_data = filtered_data[(filtered_data['Date'].dt.date >= start_date) & 
-                                    (filtered_data['Date'].dt.date <= end_date)]
+    filtered_data = filter_engins(df, selected_engin, date_range)
     
     # Vérifier si 'Montant' existe dans filtered_data
     if 'Montant' not in filtered_data.columns:
@@ -398,15 +259,14 @@ with st.sidebar:
         st.metric("Consommation totale", f"{total_cost:,.0f} MAD")
         st.metric("Nombre d'interventions", num_interventions)
         st.metric("Coût moyen", f"{avg_cost:,.0f} MAD")
+    
+    # Diagnostic mémoire
+    with st.expander("🧠 Mémoire (debug)"):
+        st.dataframe(memory_report(), hide_index=True)
+        st.dataframe(cache_report(), hide_index=True)
 
 # Appliquer les filtres
-filtered_data = df.copy()
-if selected_engin != 'Tous':
-    filtered_data = filtered_data[filtered_data['Engin_Formaté'] == selected_engin]
-if len(date_range) == 2:
-    start_date, end_date = date_range
-    filtered_data = filtered_data[(filtered_data['Date'].dt.date >= start_date) & 
-                                (filtered_data['Date'].dt.date <= end_date)]
+filtered_data = filter_engins(df, selected_engin, date_range)
 
 # Vérifier si filtered_data est vide ou si 'Montant' est absent
 if filtered_data.empty:
@@ -478,9 +338,12 @@ with tab2:
     # Select engin for analysis
     if selected_engin == 'Tous':
         selected = st.selectbox('Choisir un engin à analyser', sorted(df['Engin_Formaté'].unique()), key='engin_select')
-        engin_data = df[df['Engin_Formaté'] == selected]
+        analysed_engin = selected
     else:
-        engin_data = df[df['Engin_Formaté'] == selected_engin]
+        analysed_engin = selected_engin
+    engin_data = filter_values(df, 'Engin_Formaté', analysed_engin)
+    # Séries partagées par le graphique d'évolution, la projection, les indicateurs et les prévisions
+    series = compute_series_store(df, ()).get(analysed_engin) or engin_series(engin_data)
     
     # Main layout: Visualizations on left, Metrics and Predictions on right
     col1, col2 = st.columns([7, 3])
@@ -500,7 +363,7 @@ with tab2:
         # Graph 1: Evolution and Projection
         st.markdown("#### Évolution des Dépenses")
         fig1 = px.line(
-            engin_data.groupby('Date')['Montant'].sum().reset_index(),
+            series.daily.reset_index(),
             x='Date', y='Montant',
             title='Évolution des Dépenses avec Projection',
             height=350,
@@ -508,13 +371,9 @@ with tab2:
         )
         fig1.update_traces(line=dict(color='#F28C38'), hovertemplate='%{x|%d/%m/%Y}<br>%{y:,.0f} MAD')
         
-        if len(engin_data) >= 3:
-            dates = engin_data.groupby('Date')['Montant'].sum().index
-            x = np.arange(len(dates))
-            y = engin_data.groupby('Date')['Montant'].sum().values
-            coeff = np.polyfit(x, y, 1)
-            future_dates = [dates[-1] + pd.DateOffset(months=i) for i in range(1, 4)]
-            projection = np.polyval(coeff, [x[-1]+1, x[-1]+2, x[-1]+3])
+        projected = cost_projection(series)
+        if projected is not None:
+            future_dates, projection = projected.dates, projected.values
             
             fig1.add_scatter(
                 x=future_dates, y=projection, mode='lines+markers',
@@ -574,7 +433,7 @@ with tab2:
         # Graph 3: Category Breakdown
         st.markdown("#### Répartition par Catégorie")
         fig3 = px.pie(
-            compute_category_breakdown(engin_data),
+            compute_category_breakdown(engin_data, analysed_engin),
             values='Montant', names='Desc_Cat',
             title='Répartition par Catégorie',
             height=350,
@@ -593,7 +452,7 @@ with tab2:
 
         # Graph 4: Monthly Costs
         st.markdown("#### Coûts Mensuels")
-        monthly_data = compute_monthly_costs(engin_data)
+        monthly_data = calendar_months(series.monthly)
         fig4 = px.bar(
             monthly_data,
             x='Mois', y='Montant',
@@ -629,32 +488,16 @@ with tab2:
         elif engin_data.empty:
             st.warning("Aucune donnée disponible pour cet engin. Veuillez sélectionner un autre engin.")
         else:
-            last_month = engin_data.groupby('Mois')['Montant'].sum().iloc[-1] if not engin_data.groupby('Mois')['Montant'].sum().empty else 0
-            avg_3m = engin_data.groupby('Mois')['Montant'].sum().tail(3).mean() if len(engin_data.groupby('Mois')['Montant'].sum()) >= 3 else 0
-            max_cost = engin_data['Montant'].max()
-            total_cost = engin_data['Montant'].sum()
-            num_interventions = len(engin_data)
-            median_cost = engin_data['Montant'].median()
-            cost_variance = engin_data['Montant'].var() if len(engin_data) > 1 else 0
-
-            metrics = {
-                'Dernier mois': f"{last_month:,.0f} MAD",
-                'Moyenne 3 mois': f"{avg_3m:,.0f} MAD",
-                'Coût maximal': f"{max_cost:,.0f} MAD",
-                'Coût total': f"{total_cost:,.0f} MAD",
-                'Interventions': num_interventions,
-                'Coût médian': f"{median_cost:,.0f} MAD",
-                'Variance des coûts': f"{cost_variance:,.0f} MAD²"
-            }
+            metrics = compute_metrics(series)
             st.markdown(f"""
             <div style='color:#ffffff; font-size:14px;'>
-                <p><strong>Dernier mois :</strong> {last_month:,.0f} MAD</p>
-                <p><strong>Moyenne 3 mois :</strong> {avg_3m:,.0f} MAD</p>
-                <p><strong>Coût maximal :</strong> {max_cost:,.0f} MAD</p>
-                <p><strong>Coût total :</strong> {total_cost:,.0f} MAD</p>
-                <p><strong>Interventions :</strong> {num_interventions}</p>
-                <p><strong>Coût médian :</strong> {median_cost:,.0f} MAD</p>
-                <p><strong>Variance des coûts :</strong> {cost_variance:,.0f} MAD²</p>
+                <p><strong>Dernier mois :</strong> {metrics.last_month:,.0f} MAD</p>
+                <p><strong>Moyenne 3 mois :</strong> {metrics.avg_3m:,.0f} MAD</p>
+                <p><strong>Coût maximal :</strong> {metrics.max_cost:,.0f} MAD</p>
+                <p><strong>Coût total :</strong> {metrics.total_cost:,.0f} MAD</p>
+                <p><strong>Interventions :</strong> {metrics.num_interventions}</p>
+                <p><strong>Coût médian :</strong> {metrics.median_cost:,.0f} MAD</p>
+                <p><strong>Variance des coûts :</strong> {metrics.cost_variance:,.0f} MAD²</p>
             </div>
             """, unsafe_allow_html=True)
 
@@ -666,58 +509,22 @@ with tab2:
         </div>
         """, unsafe_allow_html=True)
 
-        predictions = {}
-        if len(engin_data) >= 3:
-            last_3 = engin_data.groupby('Mois')['Montant'].sum().tail(3)
-            avg = last_3.mean()
-            std = last_3.std() if len(last_3) > 1 else 0
-            num_months = len(engin_data.groupby('Mois'))
-            reliability = min(90, 50 + 5 * num_months - 10 * (std / avg if avg > 0 else 0))
-            reliability = max(50, reliability)
-            ci_lower = avg - 1.96 * std / np.sqrt(len(last_3)) if std > 0 else avg * 0.7
-            ci_upper = avg + 1.96 * std / np.sqrt(len(last_3)) if std > 0 else avg * 1.3
-            # Determine trend based on last 3 months
-            trend = 'Stable'
-            if len(last_3) >= 2:
-                trend_values = last_3.values
-                if trend_values[-1] > trend_values[-2] * 1.1:
-                    trend = 'Hausse'
-                elif trend_values[-1] < trend_values[-2] * 0.9:
-                    trend = 'Baisse'
-
-            predictions = {
-                'avg': avg,
-                'ci_lower': ci_lower,
-                'ci_upper': ci_upper,
-                'reliability': reliability,
-                'trend': trend
-            }
-
+        prediction = compute_prediction(series)
+        if prediction is not None:
             st.markdown(f"""
             <div style='color:#ffffff; font-size:14px;'>
-                <p><strong>Estimation moyenne :</strong> {avg:,.0f} MAD/mois</p>
-                <p><strong>Intervalle de confiance (95%) :</strong> {ci_lower:,.0f} - {ci_upper:,.0f} MAD</p>
-                <p><strong>Fiabilité des prévisions :</strong> {reliability:.0f}%</p>
-                <p><strong>Tendance récente :</strong> {trend}</p>
+                <p><strong>Estimation moyenne :</strong> {prediction.avg:,.0f} MAD/mois</p>
+                <p><strong>Intervalle de confiance (95%) :</strong> {prediction.ci_lower:,.0f} - {prediction.ci_upper:,.0f} MAD</p>
+                <p><strong>Fiabilité des prévisions :</strong> {prediction.reliability:.0f}%</p>
+                <p><strong>Tendance récente :</strong> {prediction.trend}</p>
             </div>
             """, unsafe_allow_html=True)
-            st.progress(int(reliability), "Fiabilité des prévisions")
+            st.progress(int(prediction.reliability), "Fiabilité des prévisions")
             st.caption("Basé sur les 3 derniers mois et la variabilité des données")
 
             # Export predictions
             if st.button("💾 Exporter prévisions", key="export_predictions"):
-                future_dates = pd.date_range(
-                    start=engin_data['Date'].max() + pd.DateOffset(months=1),
-                    periods=3, freq='M'
-                )
-                projections = pd.DataFrame({
-                    'Mois': future_dates.strftime('%Y-%m'),
-                    'Estimation Moyenne (MAD)': [avg]*3,
-                    'Intervalle Bas (MAD)': [ci_lower]*3,
-                    'Intervalle Haut (MAD)': [ci_upper]*3,
-                    'Fiabilité (%)': [reliability]*3
-                })
-                csv = projections.to_csv(index=False).encode('utf-8')
+                csv = prediction_table(series, prediction).to_csv(index=False).encode('utf-8')
                 st.download_button(
                     label="Télécharger CSV",
                     data=csv,
@@ -747,19 +554,38 @@ with tab2:
             file_name=f'analyse_{selected}.csv',
             mime='text/csv'
         )
-        # Word Export
+        # Word Export (construit en arrière-plan : une relance du script ne l'interrompt pas)
         budget_threshold = 10000
+        report_owner = session_owner(st.session_state)
         if st.button("📝 Exporter Rapport Word"):
-            word_buffer = generate_word_report(
-                engin_data, selected, figs, descriptions, metrics, predictions, budget_threshold
-            )
-            st.download_button(
-                label="Télécharger Rapport Word",
-                data=word_buffer,
-                file_name=f'rapport_analyse_{selected}.docx',
-                mime='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+            submit_report(
+                report_owner, "engins", f"Rapport {selected}", f'rapport_analyse_{selected}.docx',
+                generate_word_report, engin_data, selected, figs, descriptions, metrics, prediction, budget_threshold
             )
 
+        # Liste des rapports, rafraîchie seule tant qu'un rapport est en cours
+        report_polling = has_active_jobs(report_owner, "engins")
+        @st.fragment(run_every=2 if report_polling else None)
+        def report_jobs_panel():
+            for job in list_jobs(report_owner, "engins"):
+                if job.status == DONE:
+                    st.download_button(
+                        label=f"Télécharger {job.label} ({job.submitted_at})",
+                        data=read_result(job) or b"",
+                        file_name=job.file_name,
+                        mime=DOCX_MIME,
+                        key=f"report_{job.id}"
+                    )
+                elif job.status == FAILED:
+                    st.error(f"Échec du {job.label} : {job.error}")
+                else:
+                    st.progress(job.progress, text=f"{job.label} en cours de génération...")
+            # Plus aucun rapport en cours : relance complète pour arrêter le rafraîchissement périodique
+            if report_polling and not has_active_jobs(report_owner, "engins"):
+                st.rerun()
+
+        report_jobs_panel()
+
 # Onglet 3 : Comparaisons
 with tab3:
     st.markdown("""
@@ -771,7 +597,7 @@ with tab3:
     
     st.plotly_chart(
         px.imshow(
-            df.pivot_table(index='Engin_Formaté', columns='Desc_Cat', values='Montant', aggfunc='sum'),
+            df.pivot_table(index='Engin_Formaté', columns='Desc_Cat', values='Montant', aggfunc='sum', observed=True),
             labels=dict(x="Catégorie", y="Engin", color="Coût"),
             title='Heatmap des coûts par engin et catégorie',
             aspect="auto",
@@ -789,7 +615,7 @@ with tab3:
         """, unsafe_allow_html=True)
         st.plotly_chart(
             px.bar(
-                df.groupby('Engin_Formaté')['Montant'].sum().reset_index().sort_values('Montant'),
+                df.groupby('Engin_Formaté', observed=True)['Montant'].sum().reset_index().sort_values('Montant'),
                 x='Montant', y='Engin_Formaté',
                 title='',
                 height=400
@@ -811,6 +637,39 @@ with tab3:
             use_container_width=True
         )
 
+    # Projection de la flotte : tous les engins ajustés en une passe sur les séries déjà calculées
+    st.markdown("""
+    <div style='background-color:#e8f5e9; padding:15px; border-radius:10px; border-left:5px solid #388e3c; margin-bottom:10px;'>
+        <h3 style='color:#F28C38; margin-top:0;'>🔮 Projection de la flotte (3 mois)</h3>
+        <p style='color:#424242;'>Tendance linéaire de chaque engin, marge à 95 % sur l'écart aux dépenses observées</p>
+    </div>
+    """, unsafe_allow_html=True)
+    fleet = fleet_projection(compute_series_store(df, ()))
+    if fleet.summary.empty:
+        st.info("Données insuffisantes pour projeter les dépenses de la flotte (minimum 3 interventions par engin).")
+    else:
+        st.dataframe(
+            fleet.summary,
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                'Dernière intervention': st.column_config.DateColumn(format="DD/MM/YYYY"),
+                **{col: st.column_config.NumberColumn(format="%.0f") for col in fleet.summary.columns[3:]}
+            }
+        )
+        fig_fleet = px.line(
+            fleet.points,
+            x='Date', y='Projection', color='Engin',
+            error_y=fleet.points['Haute'] - fleet.points['Projection'],
+            error_y_minus=fleet.points['Projection'] - fleet.points['Basse'],
+            markers=True,
+            title='Projection des dépenses par engin',
+            height=400,
+            template='plotly_white'
+        )
+        fig_fleet.update_layout(xaxis_title="Date", yaxis_title="Montant (MAD)")
+        st.plotly_chart(fig_fleet, use_container_width=True)
+
 # Onglet 4 : Recommandations
 with tab4:
     st.markdown("""
@@ -822,20 +681,20 @@ with tab4:
     
     col1, col2 = st.columns(2)
     with col1:
-        top_category = df.groupby('Desc_Cat')['Montant'].sum().idxmax()
+        top_category = df.groupby('Desc_Cat', observed=True)['Montant'].sum().idxmax()
         st.markdown(f"""
         <div style='background-color:#e3f2fd; padding:20px; border-radius:10px; margin-bottom:20px; border-left:5px solid #1976d2;'>
             <h3 style='color:#F28C38; margin-top:0;'>🔍 Top 3 des Dépenses à Surveiller</h3>
             <ol style='color:#424242;'>
                 <li style='margin-bottom:10px;'><b>{top_category}</b> <span style='color:#d32f2f; font-weight:bold;'>{df[df['Desc_Cat']==top_category]['Montant'].sum():,.0f} MAD</span></li>
-                <li style='margin-bottom:10px;'><b>{df.groupby('Desc_Cat')['Montant'].sum().nlargest(2).index[1]}</b> <span style='color:#d32f2f; font-weight:bold;'>{df.groupby('Desc_Cat')['Montant'].sum().nlargest(2).values[1]:,.0f} MAD</span></li>
-                <li><b>{df.groupby('Desc_Cat')['Montant'].sum().nlargest(3).index[2]}</b> <span style='color:#d32f2f; font-weight:bold;'>{df.groupby('Desc_Cat')['Montant'].sum().nlargest(3).values[2]:,.0f} MAD</span></li>
+                <li style='margin-bottom:10px;'><b>{df.groupby('Desc_Cat', observed=True)['Montant'].sum().nlargest(2).index[1]}</b> <span style='color:#d32f2f; font-weight:bold;'>{df.groupby('Desc_Cat', observed=True)['Montant'].sum().nlargest(2).values[1]:,.0f} MAD</span></li>
+                <li><b>{df.groupby('Desc_Cat', observed=True)['Montant'].sum().nlargest(3).index[2]}</b> <span style='color:#d32f2f; font-weight:bold;'>{df.groupby('Desc_Cat', observed=True)['Montant'].sum().nlargest(3).values[2]:,.0f} MAD</span></li>
             </ol>
         </div>
         """, unsafe_allow_html=True)
     
     with col2:
-        problem_engines = df.groupby('Engin_Formaté')['Montant'].sum().nlargest(3)
+        problem_engines = df.groupby('Engin_Formaté', observed=True)['Montant'].sum().nlargest(3)
         st.markdown(f"""
         <div style='background-color:#fff8e1; padding:20px; border-radius:10px; margin-bottom:20px; border-left:5px solid #ffa000;'>
             <h3 style='color:#F28C38; margin-top:0;'>🚜 Engins Prioritaires</h3>
@@ -947,3 +806,9 @@ with st.container():
         st.markdown('</div>', unsafe_allow_html=True)
     
     st.markdown('</div>', unsafe_allow_html=True)
+
+# Panneau de profilage (administrateurs uniquement)
+if is_admin(st.session_state.get("username"), st.query_params.get("admin")):
+    with st.sidebar.expander("⏱️ Profilage (admin)"):
+        st.dataframe(profile_report(), hide_index=True)
+        st.dataframe(recent_stages(), hide_index=True)
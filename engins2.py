@@ -1,14 +1,16 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import numpy as np
-from datetime import datetime
-from docx import Document
-from docx.shared import Inches, Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
 from io import BytesIO
-import plotly.io as pio
-from PIL import Image
+from memory import memory_report
+from caching import bounded_cache, cache_report, LOADER_MAX_ENTRIES, LOADER_TTL_SECONDS
+from profiling import profiled, profile_report, recent_stages, is_admin
+from report_jobs import DONE, FAILED, DOCX_MIME, session_owner, submit_report, list_jobs, has_active_jobs, read_result
+from analytics.engins import compute_metrics, cost_projection, engin_series, category_breakdown
+from analytics.engins2 import (
+    SOURCE, EquipmentFilters, load_equipment, sort_months, filter_period, apply_filters, equipment_options,
+    compute_kpis, analysis_frame, monthly_costs, compute_prediction, prediction_table, generate_word_report
+)
 
 # Setting page configuration
 st.set_page_config(page_title="Mining Equipment Consumption Dashboard", layout="wide")
@@ -55,128 +57,28 @@ st.markdown("""
 
 
 
-# Loading data
-@st.cache_data
+# Loading data (computation in analytics.engins2)
+# Shared by all sessions (cached on the workbook hash, no per-rerun copy): treat as read-only,
+# filters derive subsets without modifying it
+@profiled("engins2.load")
+@bounded_cache("engins2.load", sources=[SOURCE], max_entries=LOADER_MAX_ENTRIES, ttl=LOADER_TTL_SECONDS)
 def load_data():
-    df = pd.read_excel("engins2.xlsx")
-    if pd.api.types.is_numeric_dtype(df['Date']):
-        df['Date'] = pd.to_datetime(df['Date'], origin='1899-12-30', unit='D')
-    elif not pd.api.types.is_datetime64_any_dtype(df['Date']):
-        df['Date'] = pd.to_datetime(df['Date'])
-    df = df.dropna(subset=['CATEGORIE', 'Desc_Cat', 'Desc_CA', 'Montant'])
-    df['Montant'] = pd.to_numeric(df['Montant'], errors='coerce')
-    df['Mois'] = df['Date'].dt.month_name()
-    months_fr = {
-        'January': 'Janvier', 'February': 'Février', 'March': 'Mars',
-        'April': 'Avril', 'May': 'Mai', 'June': 'Juin',
-        'July': 'Juillet', 'August': 'Août', 'September': 'Septembre',
-        'October': 'Octobre', 'November': 'Novembre', 'December': 'Décembre'
-    }
-    df['Mois'] = df['Mois'].map(months_fr)
-    
-    return df
+    return load_equipment(SOURCE)
 
-df = load_data()
+data = load_data()
+df = data.df
 
 # Cache computations
-@st.cache_data
-def compute_monthly_costs(data):
-    monthly_data = data.groupby('Mois')['Montant'].sum().reset_index()
-    month_order = ['Janvier', 'Février', 'Mars', 'Avril', 'Mai', 'Juin',
-                   'Juillet', 'Août', 'Septembre', 'Octobre', 'Novembre', 'Décembre']
-    monthly_data['Mois'] = pd.Categorical(monthly_data['Mois'], categories=month_order, ordered=True)
-    return monthly_data.sort_values('Mois')
-
-@st.cache_data
-def compute_category_breakdown(data):
-    return data.groupby('Desc_Cat')['Montant'].sum().reset_index()
-
-# Function to save Plotly figure as image
-def save_plotly_fig_as_image(fig):
-    img_bytes = pio.to_image(fig, format='png', width=800, height=350)
-    img = Image.open(BytesIO(img_bytes))
-    img_buffer = BytesIO()
-    img.save(img_buffer, format='PNG')
-    return img_buffer.getvalue()
+# Cache key: workbook hash + EquipmentFilters (data is derived from them and never hashed)
+@profiled("engins2.monthly_costs")
+@bounded_cache("engins2.monthly_costs", sources=[SOURCE], exclude=("data",))
+def compute_monthly_costs(data, filters):
+    return monthly_costs(data)
 
-# Function to generate Word report
-def generate_word_report(engin_data, selected_category, figs, descriptions, metrics, predictions, budget_threshold):
-    doc = Document()
-    
-    title = doc.add_heading(f'Consumption Report for {selected_category}', level=1)
-    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    doc.add_paragraph(f'Report Date: {datetime.now().strftime("%d/%m/%Y")}')
-    
-    doc.add_heading('Table of Contents', level=2)
-    doc.add_paragraph('1. Introduction\n2. Summary\n3. Visualizations\n4. Key Metrics\n5. Predictions\n6. Recommendations', style='List Bullet')
-    
-    doc.add_heading('1. Introduction', level=2)
-    doc.add_paragraph(
-        'This report provides a detailed analysis of equipment consumption, including visualizations, metrics, predictions, and recommendations for optimization.'
-    )
-    
-    doc.add_heading('2. Summary', level=2)
-    total_cost = engin_data['Montant'].sum()
-    top_category = engin_data.groupby('Desc_Cat')['Montant'].sum().idxmax()
-    trend = predictions.get('trend', 'Stable')
-    doc.add_paragraph(
-        f'Total Cost: {total_cost:,.0f} DH\n'
-        f'Main Category: {top_category}\n'
-        f'Recent Trend: {trend}\n'
-        f'Number of Interventions: {len(engin_data)}\n'
-        f'Median Cost: {engin_data["Montant"].median():,.0f} DH'
-    )
-    
-    doc.add_heading('3. Visualizations', level=2)
-    for i, (fig, desc, title) in enumerate(zip(figs, descriptions, [
-        'Consumption Trend with Projection', 'Cost Distribution',
-        'Consumption by Type', 'Monthly Costs'
-    ])):
-        doc.add_heading(f'3.{i+1} {title}', level=3)
-        img_stream = BytesIO(save_plotly_fig_as_image(fig))
-        doc.add_picture(img_stream, width=Inches(6))
-        doc.add_paragraph(desc)
-    
-    doc.add_heading('4. Key Metrics', level=2)
-    table = doc.add_table(rows=len(metrics) + 1, cols=2)
-    table.style = 'Table Grid'
-    hdr_cells = table.rows[0].cells
-    hdr_cells[0].text = 'Metric'
-    hdr_cells[1].text = 'Value'
-    for i, (metric, value) in enumerate(metrics.items()):
-        row_cells = table.rows[i+1].cells
-        row_cells[0].text = metric
-        row_cells[1].text = str(value)
-    
-    doc.add_heading('5. Predictions', level=2)
-    doc.add_paragraph(
-        f'Average Estimate: {predictions["avg"]:,.0f} DH/month\n'
-        f'Confidence Interval (95%): {predictions["ci_lower"]:,.0f} - {predictions["ci_upper"]:,.0f} DH\n'
-        f'Reliability: {predictions["reliability"]:,.0f}%\n'
-        f'Trend: {predictions["trend"]}'
-    )
-    
-    if budget_threshold > 0:
-        high_costs = engin_data[engin_data['Montant'] > budget_threshold]
-        doc.add_heading('Budget Threshold Analysis', level=3)
-        doc.add_paragraph(
-            f'Threshold: {budget_threshold:,.0f} DH\n'
-            f'Number of Interventions Exceeding Threshold: {len(high_costs)}\n'
-            f'Total Cost of High Interventions: {high_costs["Montant"].sum():,.0f} DH'
-        )
-    
-    doc.add_heading('6. Recommendations', level=2)
-    doc.add_paragraph(
-        '- Prioritize preventive maintenance to reduce costs in the main category.\n'
-        f'- Review high-cost interventions in {top_category} for cost-saving opportunities.\n'
-        '- Implement monthly monitoring to detect rising trends early.\n'
-        '- Negotiate with suppliers for frequently used parts.'
-    )
-    
-    buffer = BytesIO()
-    doc.save(buffer)
-    buffer.seek(0)
-    return buffer
+@profiled("engins2.category_breakdown")
+@bounded_cache("engins2.category_breakdown", sources=[SOURCE], exclude=("data",))
+def compute_category_breakdown(data, filters):
+    return category_breakdown(data)
 
 
 # Sidebar for filters
@@ -200,79 +102,64 @@ with st.sidebar:
         help="Choose a date range to filter interventions"
     )
     
-    filtered_data = df.copy()
-    if selected_category != 'All':
-        filtered_data = filtered_data[filtered_data['CATEGORIE'] == selected_category]
-    if len(date_range) == 2:
-        start_date, end_date = date_range
-        filtered_data = filtered_data[(filtered_data['Date'].dt.date >= start_date) & 
-                                    (filtered_data['Date'].dt.date <= end_date)]
+    filtered_data = filter_period(df, selected_category, tuple(date_range))
     
     st.subheader("Search Equipment")
     equipment_search = st.text_input("Enter Equipment Name (partial match)", "").strip()
     category_df = filtered_data
-    if equipment_search:
-        available_equipment = sorted(category_df[category_df['Desc_CA'].str.contains(equipment_search, case=False, na=False)]['Desc_CA'].unique())
-    else:
-        available_equipment = sorted(category_df['Desc_CA'].unique())
-    equipment_options = ["All Equipment"] + available_equipment
+    available_equipment = equipment_options(category_df, equipment_search)
+    equipment_choices = ["All Equipment"] + available_equipment
     if not available_equipment:
         st.warning("No equipment matches the search term.")
-    selected_equipment = st.selectbox("Select Equipment", equipment_options)
+    selected_equipment = st.selectbox("Select Equipment", equipment_choices)
+    
+    # Memory diagnostics
+    with st.expander("🧠 Memory (debug)"):
+        st.dataframe(memory_report(), hide_index=True)
+        st.dataframe(cache_report(), hide_index=True)
     
     
 # Apply filters
-filtered_data = df.copy()
-if selected_category != 'All':
-    filtered_data = filtered_data[filtered_data['CATEGORIE'] == selected_category]
-if len(date_range) == 2:
-    start_date, end_date = date_range
-    filtered_data = filtered_data[(filtered_data['Date'].dt.date >= start_date) & 
-                                (filtered_data['Date'].dt.date <= end_date)]
-
-if selected_equipment != "All Equipment":
-    filtered_data = filtered_data[filtered_data['Desc_CA'] == selected_equipment]
+filters = EquipmentFilters(selected_category, tuple(date_range), selected_equipment)
+filtered_data = apply_filters(df, filters)
 
 if filtered_data.empty:
     st.warning("No data available after filtering. Please adjust the filters.")
     st.stop()
 
+kpis = compute_kpis(filtered_data)
 kpi_container = st.container()
 with kpi_container:
     kpi1, kpi2, kpi3, kpi4 = st.columns(4)
     with kpi1:
-        total_cost = filtered_data['Montant'].sum()
         st.markdown(f"""
         <div style='background-color:#fff8e1; padding:15px; border-radius:10px; text-align:center;'>
             <h6 style='color:#F28C38; margin-bottom:10px;'>Total Cost</h6>
-            <p style='color:#424242; font-size:18px; font-weight:bold;'>{total_cost:,.0f} DH</p>
+            <p style='color:#424242; font-size:18px; font-weight:bold;'>{kpis.total_cost:,.0f} DH</p>
             <p style='color:#424242; font-size:12px;'>Total expenditure</p>
         </div>
         """, unsafe_allow_html=True)
     with kpi2:
-        top_equipment = filtered_data.groupby('Desc_CA')['Montant'].sum().idxmax() if not filtered_data.empty else "N/A"
         st.markdown(f"""
         <div style='background-color:#e8f5e9; padding:15px; border-radius:10px; text-align:center;'>
             <h6 style='color:#F28C38; margin-bottom:10px;'>Most Expensive Equipment</h6>
-            <p style='color:#424242; font-size:18px; font-weight:bold;'>{top_equipment}</p>
+            <p style='color:#424242; font-size:18px; font-weight:bold;'>{kpis.top_equipment}</p>
             <p style='color:#424242; font-size:12px;'>Highest cost equipment</p>
         </div>
         """, unsafe_allow_html=True)
     with kpi3:
-        top_category = filtered_data.groupby('Desc_Cat')['Montant'].sum().idxmax() if not filtered_data.empty else "N/A"
         st.markdown(f"""
         <div style='background-color:#f3e5f5; padding:15px; border-radius:10px; text-align:center;'>
             <h6 style='color:#F28C38; margin-bottom:10px;'>Main Category</h6>
-            <p style='color:#424242; font-size:18px; font-weight:bold;'>{top_category}</p>
+            <p style='color:#424242; font-size:18px; font-weight:bold;'>{kpis.top_category}</p>
             <p style='color:#424242; font-size:12px;'>Dominant consumption type</p>
         </div>
         """, unsafe_allow_html=True)
     with kpi4:
-        avg_cost = filtered_data['Montant'].mean() if not filtered_data.empty else 0
         st.markdown(f"""
         <div style='background-color:#ffebee; padding:15px; border-radius:10px; text-align:center;'>
             <h6 style='color:#F28C38; margin-bottom:10px;'>Average Cost</h6>
-            <p style='color:#424242; font-size:18px; font-weight:bold;'>{avg_cost:,.0f} DH</p>
+            <p style='color:#424242; font-size:18px; font-weight:bold;'>{kpis.avg_cost:,.0f} DH</p>
             <p style='color:#424242; font-size:12px;'>Per intervention</p>
         </div>
         """, unsafe_allow_html=True)
@@ -314,10 +201,9 @@ with tab1:
             st.download_button("📥 Download Excel", output.getvalue(), "consumption_data.xlsx", "application/vnd.ms-excel")
 
 with tab2:
-    if selected_category != 'All':
-        engin_data = filtered_data.copy()
-    else:
-        engin_data = filtered_data.groupby(['Date', 'Desc_CA', 'Desc_Cat', 'CATEGORIE', 'Mois'])['Montant'].sum().reset_index()
+    engin_data = analysis_frame(filtered_data, selected_category)
+    # Monthly and daily series computed once, shared by the trend chart, projection, metrics and predictions
+    series = engin_series(engin_data)
     
     col1, col2 = st.columns([7, 3])
     
@@ -333,19 +219,15 @@ with tab2:
         
         st.markdown("#### Consumption Trend with Projection")
         fig1 = px.line(
-            engin_data.groupby('Date')['Montant'].sum().reset_index(),
+            series.daily.reset_index(),
             x='Date', y='Montant',
             title='Consumption Trend with Projection',
             height=350,
             template='plotly_white'
         )
-        if len(engin_data) >= 3:
-            dates = engin_data.groupby('Date')['Montant'].sum().index
-            x = np.arange(len(dates))
-            y = engin_data.groupby('Date')['Montant'].sum().values
-            coeff = np.polyfit(x, y, 1)
-            future_dates = [dates[-1] + pd.DateOffset(months=i) for i in range(1, 4)]
-            projection = np.polyval(coeff, [x[-1]+1, x[-1]+2, x[-1]+3])
+        projected = cost_projection(series)
+        if projected is not None:
+            future_dates, projection = projected.dates, projected.values
             fig1.add_scatter(x=future_dates, y=projection, mode='lines+markers', name='Projection', line=dict(color='red', dash='dot'))
             fig1.add_scatter(x=future_dates, y=projection * 1.3, mode='lines', name='High Range (+30%)', line=dict(color='orange', dash='dash'))
             fig1.add_scatter(x=future_dates, y=projection * 0.7, mode='lines', name='Low Range (-30%)', line=dict(color='green', dash='dash'))
@@ -367,7 +249,7 @@ with tab2:
         descriptions.append(desc2)
         
         st.markdown("#### Consumption by Type")
-        fig3 = px.pie(compute_category_breakdown(engin_data), values='Montant', names='Desc_Cat', title='Consumption by Type', height=350, template='plotly_white')
+        fig3 = px.pie(compute_category_breakdown(engin_data, filters), values='Montant', names='Desc_Cat', title='Consumption by Type', height=350, template='plotly_white')
         fig3.update_traces(textinfo='percent+label')
         fig3.update_layout(margin=dict(t=50, b=50))
         st.plotly_chart(fig3, use_container_width=True)
@@ -377,7 +259,11 @@ with tab2:
         descriptions.append(desc3)
         
         st.markdown("#### Monthly Costs")
-        monthly_data = compute_monthly_costs(engin_data)
+        if len(filtered_data) == len(df):
+            # No filter removed any row: use the monthly totals maintained by incremental ingestion
+            monthly_data = sort_months(data.monthly_costs)
+        else:
+            monthly_data = compute_monthly_costs(engin_data, filters)
         fig4 = px.bar(monthly_data, x='Mois', y='Montant', title='Monthly Costs', height=350, template='plotly_white')
         fig4.update_traces(marker=dict(color='#388e3c'))
         fig4.update_layout(xaxis_title="Month", yaxis_title="Amount (DH)")
@@ -394,31 +280,16 @@ with tab2:
         </div>
         """, unsafe_allow_html=True)
         if not engin_data.empty:
-            last_month = engin_data.groupby('Mois')['Montant'].sum().iloc[-1] if not engin_data.groupby('Mois')['Montant'].sum().empty else 0
-            avg_3m = engin_data.groupby('Mois')['Montant'].sum().tail(3).mean() if len(engin_data.groupby('Mois')['Montant'].sum()) >= 3 else 0
-            max_cost = engin_data['Montant'].max()
-            total_cost = engin_data['Montant'].sum()
-            num_interventions = len(engin_data)
-            median_cost = engin_data['Montant'].median()
-            cost_variance = engin_data['Montant'].var() if len(engin_data) > 1 else 0
-            metrics = {
-                'Last Month': f"{last_month:,.0f} DH",
-                '3-Month Average': f"{avg_3m:,.0f} DH",
-                'Max Cost': f"{max_cost:,.0f} DH",
-                'Total Cost': f"{total_cost:,.0f} DH",
-                'Interventions': num_interventions,
-                'Median Cost': f"{median_cost:,.0f} DH",
-                'Cost Variance': f"{cost_variance:,.0f} DH²"
-            }
+            metrics = compute_metrics(series)
             st.markdown(f"""
             <div style='color:#FFFFFF; font-size:14px;'>
-                <p><strong>Last Month:</strong> {last_month:,.0f} DH</p>
-                <p><strong>3-Month Average:</strong> {avg_3m:,.0f} DH</p>
-                <p><strong>Max Cost:</strong> {max_cost:,.0f} DH</p>
-                <p><strong>Total Cost:</strong> {total_cost:,.0f} DH</p>
-                <p><strong>Interventions:</strong> {num_interventions}</p>
-                <p><strong>Median Cost:</strong> {median_cost:,.0f} DH</p>
-                <p><strong>Cost Variance:</strong> {cost_variance:,.0f} DH²</p>
+                <p><strong>Last Month:</strong> {metrics.last_month:,.0f} DH</p>
+                <p><strong>3-Month Average:</strong> {metrics.avg_3m:,.0f} DH</p>
+                <p><strong>Max Cost:</strong> {metrics.max_cost:,.0f} DH</p>
+                <p><strong>Total Cost:</strong> {metrics.total_cost:,.0f} DH</p>
+                <p><strong>Interventions:</strong> {metrics.num_interventions}</p>
+                <p><strong>Median Cost:</strong> {metrics.median_cost:,.0f} DH</p>
+                <p><strong>Cost Variance:</strong> {metrics.cost_variance:,.0f} DH²</p>
             </div>
             """, unsafe_allow_html=True)
         
@@ -428,43 +299,19 @@ with tab2:
             <p style='color:#424242;'>Estimates based on historical data</p>
         </div>
         """, unsafe_allow_html=True)
-        predictions = {}
-        if len(engin_data) >= 3:
-            last_3 = engin_data.groupby('Mois')['Montant'].sum().tail(3)
-            avg = last_3.mean()
-            std = last_3.std() if len(last_3) > 1 else 0
-            num_months = len(engin_data.groupby('Mois'))
-            reliability = min(90, 50 + 5 * num_months - 10 * (std / avg if avg > 0 else 0))
-            reliability = max(50, reliability)
-            ci_lower = avg - 1.96 * std / np.sqrt(len(last_3)) if std > 0 else avg * 0.7
-            ci_upper = avg + 1.96 * std / np.sqrt(len(last_3)) if std > 0 else avg * 1.3
-            trend = "Stable"
-            if len(last_3) >= 2:
-                diff = last_3.iloc[-1] - last_3.iloc[-2]
-                if diff > 0.1 * avg:
-                    trend = "Rising"
-                elif diff < -0.1 * avg:
-                    trend = "Falling"
-            predictions = {'avg': avg, 'ci_lower': ci_lower, 'ci_upper': ci_upper, 'reliability': reliability, 'trend': trend}
+        prediction = compute_prediction(series)
+        if prediction is not None:
             st.markdown(f"""
             <div style='color:#FFFFFF; font-size:14px;'>
-                <p><strong>Average Estimate:</strong> {avg:,.0f} DH/month</p>
-                <p><strong>Confidence Interval (95%):</strong> {ci_lower:,.0f} - {ci_upper:,.0f} DH</p>
-                <p><strong>Reliability:</strong> {reliability:.0f}%</p>
-                <p><strong>Trend:</strong> {trend}</p>
+                <p><strong>Average Estimate:</strong> {prediction.avg:,.0f} DH/month</p>
+                <p><strong>Confidence Interval (95%):</strong> {prediction.ci_lower:,.0f} - {prediction.ci_upper:,.0f} DH</p>
+                <p><strong>Reliability:</strong> {prediction.reliability:.0f}%</p>
+                <p><strong>Trend:</strong> {prediction.trend}</p>
             </div>
             """, unsafe_allow_html=True)
-            st.progress(int(reliability), "Prediction Reliability")
+            st.progress(int(prediction.reliability), "Prediction Reliability")
             if st.button("💾 Export Predictions"):
-                future_dates = pd.date_range(start=engin_data['Date'].max() + pd.DateOffset(months=1), periods=3, freq='M')
-                projections = pd.DataFrame({
-                    'Month': future_dates.strftime('%Y-%m'),
-                    'Average Estimate (DH)': [avg]*3,
-                    'Lower CI (DH)': [ci_lower]*3,
-                    'Upper CI (DH)': [ci_upper]*3,
-                    'Reliability (%)': [reliability]*3
-                })
-                csv = projections.to_csv(index=False).encode('utf-8')
+                csv = prediction_table(series, prediction).to_csv(index=False).encode('utf-8')
                 st.download_button("Download CSV", csv, f'predictions_{selected_category}.csv', "text/csv")
         else:
             st.markdown("""
@@ -478,9 +325,28 @@ with tab2:
         <h3 style='color:#F28C38; margin-top:0;'>📄 Export Analyses</h3>
     </div>
     """, unsafe_allow_html=True)
+    # Reports are built in the background so a rerun doesn't cancel them
+    report_owner = session_owner(st.session_state)
     if not engin_data.empty and st.button("📝 Export Word Report"):
-        word_buffer = generate_word_report(engin_data, selected_category, figs, descriptions, metrics, predictions, 10000)
-        st.download_button("Download Word Report", word_buffer, f'report_{selected_category}.docx', "application/vnd.openxmlformats-officedocument.wordprocessingml.document")
+        submit_report(report_owner, "engins2", f"Report {selected_category}", f'report_{selected_category}.docx',
+                      generate_word_report, engin_data, selected_category, figs, descriptions, metrics, prediction, 10000)
+
+    # Report list, refreshed on its own while a report is being built
+    report_polling = has_active_jobs(report_owner, "engins2")
+    @st.fragment(run_every=2 if report_polling else None)
+    def report_jobs_panel():
+        for job in list_jobs(report_owner, "engins2"):
+            if job.status == DONE:
+                st.download_button(f"Download {job.label} ({job.submitted_at})", read_result(job) or b"", job.file_name, DOCX_MIME, key=f"report_{job.id}")
+            elif job.status == FAILED:
+                st.error(f"{job.label} failed: {job.error}")
+            else:
+                st.progress(job.progress, text=f"Building {job.label}...")
+        # No report left in progress: full rerun so the fragment stops polling
+        if report_polling and not has_active_jobs(report_owner, "engins2"):
+            st.rerun()
+
+    report_jobs_panel()
 
 with tab3:
     st.markdown("""
@@ -492,7 +358,7 @@ with tab3:
     
     st.plotly_chart(
         px.imshow(
-            filtered_data.pivot_table(index='Desc_CA', columns='Desc_Cat', values='Montant', aggfunc='sum'),
+            filtered_data.pivot_table(index='Desc_CA', columns='Desc_Cat', values='Montant', aggfunc='sum', observed=True),
             labels=dict(x="Consumption Type", y="Equipment", color="Amount (DH)"),
             title='Heatmap of Costs by Equipment and Type',
             aspect="auto",
@@ -510,7 +376,7 @@ with tab3:
         """, unsafe_allow_html=True)
         st.plotly_chart(
             px.bar(
-                filtered_data.groupby('Desc_CA')['Montant'].sum().reset_index().sort_values('Montant'),
+                filtered_data.groupby('Desc_CA', observed=True)['Montant'].sum().reset_index().sort_values('Montant'),
                 x='Montant', y='Desc_CA',
                 title='',
                 height=400
@@ -542,7 +408,7 @@ with tab4:
     
     col1, col2 = st.columns(2)
     with col1:
-        top_categories = filtered_data.groupby('Desc_Cat')['Montant'].sum().nlargest(3)
+        top_categories = filtered_data.groupby('Desc_Cat', observed=True)['Montant'].sum().nlargest(3)
         st.markdown(f"""
         <div style='background-color:#e3f2fd; padding:20px; border-radius:10px; margin-bottom:20px; border-left:5px solid #1976d2;'>
             <h3 style='color:#F28C38; margin-top:0;'>🔍 Top 3 Expenses</h3>
@@ -555,7 +421,7 @@ with tab4:
         """, unsafe_allow_html=True)
     
     with col2:
-        problem_equipment = filtered_data.groupby('Desc_CA')['Montant'].sum().nlargest(3)
+        problem_equipment = filtered_data.groupby('Desc_CA', observed=True)['Montant'].sum().nlargest(3)
         st.markdown(f"""
         <div style='background-color:#fff8e1; padding:20px; border-radius:10px; margin-bottom:20px; border-left:5px solid #ffa000;'>
             <h3 style='color:#F28C38; margin-top:0;'>🚜 Priority Equipment</h3>
@@ -673,4 +539,10 @@ with tab5:
     <div style='background-color:#ffebee; padding:10px; border-radius:10px; text-align:right; margin-top:10px;'>
         <p style='color:#424242; font-size:16px; font-weight:bold;'>Total: {total_montant:,.2f} DH</p>
     </div>
-    """, unsafe_allow_html=True)
\ No newline at end of file
+    """, unsafe_allow_html=True)
+
+# Profiling panel (admins only)
+if is_admin(st.session_state.get("username"), st.query_params.get("admin")):
+    with st.sidebar.expander("⏱️ Profiling (admin)"):
+        st.dataframe(profile_report(), hide_index=True)
+        st.dataframe(recent_stages(), hide_index=True)
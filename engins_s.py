@@ -3,18 +3,21 @@ import pandas as pd
 import plotly.express as px
 import numpy as np
 from datetime import datetime
-from docx import Document
-from docx.shared import Inches, Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from io import BytesIO
-import plotly.io as pio
 import json
 import bcrypt
-import io
 import os
 import zipfile
+from contextlib import ExitStack
+from functools import partial
 import sys
 import locale
+from filters import sort_by_date, date_range_slice, filter_values
+from uploads import parse_workbooks, peak_rss_mb, uploads_key, CONSUMPTION_SCHEMA, TONNAGE_SCHEMA, HOURS_SCHEMA
+from memory import compact_frame, memory_report
+from datasets import acquire_dataset, dataset_report
+from profiling import profiled, profile_report, recent_stages, is_admin, record_cache
+from analytics.engins_s import summarize, engine_pivot, detail_table, generate_word_report
+from report_jobs import DONE, FAILED, DOCX_MIME, session_owner, submit_report, list_jobs, has_active_jobs, read_result
 
 # Configuration de la page
 st.set_page_config(page_title="Tableau de bord de la consommation des équipements miniers", layout="wide")
@@ -151,574 +154,142 @@ def hash_password(password):
 def check_password(password, hashed):
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
-def load_data(uploaded_files=None):
-    try:
-        if uploaded_files is None or not uploaded_files:
-            return pd.DataFrame()
-
-        dfs = []
-        required_columns = ['Date', 'CATEGORIE', 'Desc_Cat', 'Desc_CA', 'Montant']
-        max_file_size = 200 * 1024 * 1024  # 200 Mo en octets
-
-        for uploaded_file in uploaded_files:
-            st.write(f"Traitement du fichier : {uploaded_file.name}, Taille : {uploaded_file.size / 1024 / 1024:.2f} Mo, Type : {'ZIP' if uploaded_file.name.endswith('.zip') else 'Excel'}")
-            if uploaded_file.size > max_file_size:
-                st.warning(f"Le fichier {uploaded_file.name} dépasse la limite de 200 Mo et sera ignoré.")
-                continue
-            try:
-                uploaded_file.seek(0)
-            except Exception as e:
-                st.warning(f"Erreur lors de la réinitialisation du pointeur pour {uploaded_file.name} : {str(e)}. Ce fichier sera ignoré.")
-                continue
-
-            if uploaded_file.name.endswith('.zip'):
-                try:
-                    file_bytes = uploaded_file.read()
-                    if not file_bytes:
-                        st.warning(f"Le fichier ZIP {uploaded_file.name} est vide et sera ignoré.")
-                        continue
-                    file_stream = io.BytesIO(file_bytes)
-                    with zipfile.ZipFile(file_stream, 'r') as z:
-                        for filename in z.namelist():
-                            if filename.endswith('.xlsx'):
-                                with z.open(filename) as f:
-                                    try:
-                                        df = pd.read_excel(f)
-                                        if not all(col in df.columns for col in required_columns):
-                                            st.warning(f"Le fichier {filename} dans le ZIP {uploaded_file.name} ne contient pas toutes les colonnes requises : {', '.join(required_columns)}. Il sera ignoré.")
-                                            continue
-                                        df['CATEGORIE'] = df['CATEGORIE'].astype(str).replace('nan', 'Unknown')
-                                        if pd.api.types.is_numeric_dtype(df['Date']):
-                                            df['Date'] = pd.to_datetime(df['Date'], origin='1899-12-30', unit='D')
-                                        elif not pd.api.types.is_datetime64_any_dtype(df['Date']):
-                                            df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
-                                        df['Montant'] = df['Montant'].astype(str).str.replace(r'[^\d.,]', '', regex=True)
-                                        df['Montant'] = df['Montant'].str.replace(',', '.', regex=False)
-                                        df['Montant'] = pd.to_numeric(df['Montant'], errors='coerce')
-                                        initial_rows = df.shape[0]
-                                        df = df.dropna(subset=['Montant'])
-                                        dropped_rows = initial_rows - df.shape[0]
-                                        df['Mois'] = df['Date'].dt.month_name()
-                                        months_fr = {
-                                            'January': 'Janvier', 'February': 'Février', 'March': 'Mars',
-                                            'April': 'Avril', 'May': 'Mai', 'June': 'Juin',
-                                            'July': 'Juillet', 'August': 'Août', 'September': 'Septembre',
-                                            'October': 'Octobre', 'November': 'Novembre', 'December': 'Décembre'
-                                        }
-                                        df['Mois'] = df['Mois'].map(months_fr)
-                                        dfs.append(df)
-                                    except Exception as e:
-                                        st.warning(f"Erreur lors du chargement du fichier {filename} dans le ZIP {uploaded_file.name} : {str(e)}")
-                                        continue
-                except zipfile.BadZipFile:
-                    st.warning(f"Le fichier {uploaded_file.name} n'est pas un fichier ZIP valide et sera ignoré.")
-                    continue
-                except Exception as e:
-                    st.warning(f"Erreur lors du traitement du fichier ZIP {uploaded_file.name} : {str(e)}")
-                    continue
-            else:
-                try:
-                    df = pd.read_excel(uploaded_file)
-                    if not all(col in df.columns for col in required_columns):
-                        st.warning(f"Le fichier {uploaded_file.name} ne contient pas toutes les colonnes requises : {', '.join(required_columns)}. Il sera ignoré.")
-                        continue
-                    df['CATEGORIE'] = df['CATEGORIE'].astype(str).replace('nan', 'Unknown')
-                    if pd.api.types.is_numeric_dtype(df['Date']):
-                        df['Date'] = pd.to_datetime(df['Date'], origin='1899-12-30', unit='D')
-                    elif not pd.api.types.is_datetime64_any_dtype(df['Date']):
-                        df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
-                    df['Montant'] = df['Montant'].astype(str).str.replace(r'[^\d.,]', '', regex=True)
-                    df['Montant'] = df['Montant'].str.replace(',', '.', regex=False)
-                    df['Montant'] = pd.to_numeric(df['Montant'], errors='coerce')
-                    initial_rows = df.shape[0]
-                    df = df.dropna(subset=['Montant'])
-                    dropped_rows = initial_rows - df.shape[0]
-                    df['Mois'] = df['Date'].dt.month_name()
-                    months_fr = {
-                        'January': 'Janvier', 'February': 'Février', 'March': 'Mars',
-                        'April': 'Avril', 'May': 'Mai', 'June': 'Juin',
-                        'July': 'Juillet', 'August': 'Août', 'September': 'Septembre',
-                        'October': 'Octobre', 'November': 'Novembre', 'December': 'Décembre'
-                    }
-                    df['Mois'] = df['Mois'].map(months_fr)
-                    dfs.append(df)
-                except Exception as e:
-                    st.warning(f"Erreur lors du chargement du fichier {uploaded_file.name} : {str(e)}. Ce fichier sera ignoré.")
-                    continue
-
-        if not dfs:
-            st.error("Aucun fichier valide n'a pu être chargé. Veuillez vérifier les fichiers téléversés.")
-            return pd.DataFrame()
-        
-        combined_df = pd.concat(dfs, ignore_index=True)
-        combined_df['CATEGORIE'] = combined_df['CATEGORIE'].astype(str).replace('nan', 'Unknown')
-        combined_df = combined_df[combined_df['CATEGORIE'].str.upper().isin(['DUMPER', 'FORATION', '10 TONNES'])]
-        
-        if combined_df.empty:
-            st.error("Aucune donnée pour les catégories DUMPER, FORATION, ou 10 TONNES. Vérifiez les fichiers téléversés.")
-            return pd.DataFrame()
-        
-        st.success(f"{len(dfs)} fichier(s) valide(s) chargé(s). Nombre total de lignes après filtrage : {combined_df.shape[0]}")
-        return combined_df
-    except Exception as e:
-        st.error(f"Erreur générale lors du chargement des fichiers : {str(e)}")
-        return pd.DataFrame()
-
-def load_tonnage_data(uploaded_files=None):
+# Fonction pour attacher un jeu partagé à la session ; la référence précédente du même emplacement est rendue
+def bind_dataset(slot, handle):
+    previous = st.session_state.get(slot)
+    st.session_state[slot] = handle
+    if previous is not None:
+        previous.release()
+
+# Moteur de chargement commun aux fichiers téléversés (Excel ou ZIP de classeurs Excel)
+# Le schéma (uploads.py) décrit les colonnes requises, leurs conversions et les messages propres au jeu de données
+def load_uploads(uploaded_files, schema):
+    label = schema['label']
     try:
         if uploaded_files is None or not uploaded_files:
-            st.warning("Aucun fichier de tonnage téléversé. Veuillez importer un ou plusieurs fichiers Excel ou ZIP.")
+            if schema['no_files_warning']:
+                st.warning(schema['no_files_warning'])
             return pd.DataFrame()
 
-        dfs = []
-        required_columns = ['DATE', 'DS Sud', 'DS Nord', 'KA']
+        sources = []
+        required_columns = schema['required']
         max_file_size = 200 * 1024 * 1024  # 200 Mo en octets
 
         if not isinstance(uploaded_files, (list, tuple)):
             st.error(f"Erreur : uploaded_files doit être une liste ou un tuple, reçu : {type(uploaded_files)}")
             return pd.DataFrame()
 
-        for uploaded_file in uploaded_files:
-            if not hasattr(uploaded_file, 'name') or not hasattr(uploaded_file, 'read'):
-                st.warning(f"Élément invalide dans uploaded_files : {type(uploaded_file)}. Cet élément sera ignoré.")
-                continue
-
-            st.write(f"Traitement du fichier de tonnage : {uploaded_file.name}, Taille : {uploaded_file.size / 1024 / 1024:.2f} Mo, Type : {'ZIP' if uploaded_file.name.endswith('.zip') else 'Excel'}")
-            if uploaded_file.size > max_file_size:
-                st.warning(f"Le fichier {uploaded_file.name} dépasse la limite de 200 Mo et sera ignoré.")
-                continue
-            try:
-                uploaded_file.seek(0)
-            except Exception as e:
-                st.warning(f"Erreur lors de la réinitialisation du pointeur pour {uploaded_file.name} : {str(e)}. Ce fichier sera ignoré.")
-                continue
-
-            if uploaded_file.name.endswith('.zip'):
-                try:
-                    file_bytes = uploaded_file.read()
-                    if not file_bytes:
-                        st.warning(f"Le fichier ZIP {uploaded_file.name} est vide et sera ignoré.")
-                        continue
-                    if not isinstance(file_bytes, bytes):
-                        st.warning(f"Le contenu lu de {uploaded_file.name} n'est pas un objet bytes : {type(file_bytes)}. Ce fichier sera ignoré.")
-                        continue
-                    file_stream = io.BytesIO(file_bytes)
-                    with zipfile.ZipFile(file_stream, 'r') as z:
-                        for filename in z.namelist():
-                            if filename.endswith('.xlsx'):
-                                with z.open(filename) as f:
-                                    try:
-                                        df = pd.read_excel(f)
-                                        if not all(col in df.columns for col in required_columns):
-                                            st.warning(f"Le fichier {filename} dans le ZIP {uploaded_file.name} ne contient pas toutes les colonnes requises : {', '.join(required_columns)}. Il sera ignoré.")
-                                            continue
-                                        if pd.api.types.is_numeric_dtype(df['DATE']):
-                                            df['DATE'] = pd.to_datetime(df['DATE'], origin='1899-12-30', unit='D')
-                                        elif not pd.api.types.is_datetime64_any_dtype(df['DATE']):
-                                            df['DATE'] = pd.to_datetime(df['DATE'])
-                                        df = df.dropna(subset=required_columns)
-                                        for col in ['DS Sud', 'DS Nord', 'KA']:
-                                            df[col] = pd.to_numeric(df[col], errors='coerce')
-                                        df['CUMMULE'] = df[['DS Sud', 'DS Nord', 'KA']].sum(axis=1)
-                                        dfs.append(df)
-                                    except Exception as e:
-                                        st.warning(f"Erreur lors du chargement du fichier {filename} dans le ZIP {uploaded_file.name} : {str(e)}")
-                                        continue
-                except zipfile.BadZipFile:
-                    st.warning(f"Le fichier {uploaded_file.name} n'est pas un fichier ZIP valide et sera ignoré.")
+        # Jeu partagé entre sessions : déjà attaché à cette session pour les mêmes fichiers,
+        # ou déjà chargé par une autre session à partir de fichiers identiques
+        slot = f"dataset_{schema['name']}"
+        identity = tuple(getattr(f, 'file_id', None) for f in uploaded_files)
+        handle = st.session_state.get(slot)
+        if handle is not None and None not in identity and handle.identity == identity:
+            record_cache(True)
+            return handle.frame
+        dataset_key = uploads_key(uploaded_files, schema)
+        if dataset_key is not None:
+            handle = acquire_dataset(dataset_key, identity=identity)
+            if handle is not None:
+                bind_dataset(slot, handle)
+                record_cache(True)
+                return handle.frame
+        record_cache(False)
+
+        results = []
+        with ExitStack() as archives:
+            for uploaded_file in uploaded_files:
+                if not hasattr(uploaded_file, 'name') or not hasattr(uploaded_file, 'read'):
+                    st.warning(f"Élément invalide dans uploaded_files : {type(uploaded_file)}. Cet élément sera ignoré.")
                     continue
-                except Exception as e:
-                    st.warning(f"Erreur lors du traitement du fichier ZIP {uploaded_file.name} : {str(e)}")
+
+                st.write(f"Traitement du fichier{label} : {uploaded_file.name}, Taille : {uploaded_file.size / 1024 / 1024:.2f} Mo, Type : {'ZIP' if uploaded_file.name.endswith('.zip') else 'Excel'}")
+                if uploaded_file.size > max_file_size:
+                    st.warning(f"Le fichier {uploaded_file.name} dépasse la limite de 200 Mo et sera ignoré.")
                     continue
-            else:
                 try:
-                    df = pd.read_excel(uploaded_file)
-                    if not all(col in df.columns for col in required_columns):
-                        st.warning(f"Le fichier {uploaded_file.name} ne contient pas toutes les colonnes requises : {', '.join(required_columns)}. Il sera ignoré.")
-                        continue
-                    if pd.api.types.is_numeric_dtype(df['DATE']):
-                        df['DATE'] = pd.to_datetime(df['DATE'], origin='1899-12-30', unit='D')
-                    elif not pd.api.types.is_datetime64_any_dtype(df['DATE']):
-                        df['DATE'] = pd.to_datetime(df['DATE'])
-                    df = df.dropna(subset=required_columns)
-                    for col in ['DS Sud', 'DS Nord', 'KA']:
-                        df[col] = pd.to_numeric(df[col], errors='coerce')
-                    df['CUMMULE'] = df[['DS Sud', 'DS Nord', 'KA']].sum(axis=1)
-                    dfs.append(df)
+                    uploaded_file.seek(0)
                 except Exception as e:
-                    st.warning(f"Erreur lors du chargement du fichier {uploaded_file.name} : {str(e)}. Ce fichier sera ignoré.")
+                    st.warning(f"Erreur lors de la réinitialisation du pointeur pour {uploaded_file.name} : {str(e)}. Ce fichier sera ignoré.")
                     continue
 
-        if not dfs:
-            st.error("Aucun fichier de tonnage valide n'a pu être chargé. Veuillez vérifier les fichiers téléversés.")
-            return pd.DataFrame()
-        
-        combined_df = pd.concat(dfs, ignore_index=True)
-        combined_df = combined_df.drop_duplicates()
-        
-        st.success(f"{len(dfs)} fichier(s) de tonnage valide(s) chargé(s) avec succès. Nombre total de lignes : {combined_df.shape[0]}")
-        return combined_df
-    except Exception as e:
-        st.error(f"Erreur générale lors du chargement des fichiers de tonnage : {str(e)}")
-        return pd.DataFrame()
-def load_hm_data(uploaded_files=None):
-    try:
-        if uploaded_files is None or not uploaded_files:
-            st.warning("Aucun fichier d'heures de marche téléversé. Veuillez importer un ou plusieurs fichiers Excel ou ZIP.")
-            return pd.DataFrame()
-
-        dfs = []
-        required_columns = ['ENGINS']  # Assuming 'ENGINS' is the date column
-        max_file_size = 200 * 1024 * 1024  # 200 MB in bytes
-
-        if not isinstance(uploaded_files, (list, tuple)):
-            st.error(f"Erreur : uploaded_files doit être une liste ou un tuple, reçu : {type(uploaded_files)}")
-            return pd.DataFrame()
-
-        for uploaded_file in uploaded_files:
-            if not hasattr(uploaded_file, 'name') or not hasattr(uploaded_file, 'read'):
-                st.warning(f"Élément invalide dans uploaded_files : {type(uploaded_file)}. Cet élément sera ignoré.")
-                continue
-
-            st.write(f"Traitement du fichier d'heures de marche : {uploaded_file.name}, Taille : {uploaded_file.size / 1024 / 1024:.2f} Mo, Type : {'ZIP' if uploaded_file.name.endswith('.zip') else 'Excel'}")
-            if uploaded_file.size > max_file_size:
-                st.warning(f"Le fichier {uploaded_file.name} dépasse la limite de 200 Mo et sera ignoré.")
-                continue
-            try:
-                uploaded_file.seek(0)
-            except Exception as e:
-                st.warning(f"Erreur lors de la réinitialisation du pointeur pour {uploaded_file.name} : {str(e)}. Ce fichier sera ignoré.")
-                continue
-
-            if uploaded_file.name.endswith('.zip'):
-                try:
-                    file_bytes = uploaded_file.read()
-                    if not file_bytes:
-                        st.warning(f"Le fichier ZIP {uploaded_file.name} est vide et sera ignoré.")
-                        continue
-                    if not isinstance(file_bytes, bytes):
-                        st.warning(f"Le contenu lu de {uploaded_file.name} n'est pas un objet bytes : {type(file_bytes)}. Ce fichier sera ignoré.")
-                        continue
-                    file_stream = io.BytesIO(file_bytes)
-                    with zipfile.ZipFile(file_stream, 'r') as z:
+                if uploaded_file.name.endswith('.zip'):
+                    try:
+                        if uploaded_file.size == 0:
+                            st.warning(f"Le fichier ZIP {uploaded_file.name} est vide et sera ignoré.")
+                            continue
+                        # Archive ouverte directement sur le tampon téléversé : chaque membre n'est
+                        # décompressé qu'au moment de son analyse
+                        z = archives.enter_context(zipfile.ZipFile(uploaded_file, 'r'))
                         for filename in z.namelist():
                             if filename.endswith('.xlsx'):
-                                with z.open(filename) as f:
-                                    try:
-                                        df = pd.read_excel(f)
-                                        if not all(col in df.columns for col in required_columns):
-                                            st.warning(f"Le fichier {filename} dans le ZIP {uploaded_file.name} ne contient pas la colonne requise : {'ENGINS'}. Il sera ignoré.")
-                                            continue
-                                        if pd.api.types.is_numeric_dtype(df['ENGINS']):
-                                            df['ENGINS'] = pd.to_datetime(df['ENGINS'], origin='1899-12-30', unit='D')
-                                        elif not pd.api.types.is_datetime64_any_dtype(df['ENGINS']):
-                                            df['ENGINS'] = pd.to_datetime(df['ENGINS'], errors='coerce')
-                                        df = df.dropna(subset=required_columns)
-                                        for col in df.columns[1:]:  # Skip ENGINS column
-                                            df[col] = pd.to_numeric(df[col], errors='coerce')
-                                        df['TOTAL_HOURS'] = df.iloc[:, 1:].sum(axis=1)
-                                        dfs.append(df)
-                                    except Exception as e:
-                                        st.warning(f"Erreur lors du chargement du fichier {filename} dans le ZIP {uploaded_file.name} : {str(e)}")
-                                        continue
-                except zipfile.BadZipFile:
-                    st.warning(f"Le fichier {uploaded_file.name} n'est pas un fichier ZIP valide et sera ignoré.")
-                    continue
-                except Exception as e:
-                    st.warning(f"Erreur lors du traitement du fichier ZIP {uploaded_file.name} : {str(e)}")
-                    continue
-            else:
-                try:
-                    df = pd.read_excel(uploaded_file)
-                    if not all(col in df.columns for col in required_columns):
-                        st.warning(f"Le fichier {uploaded_file.name} ne contient pas la colonne requise : {'ENGINS'}. Il sera ignoré.")
+                                sources.append((f"{filename} dans le ZIP {uploaded_file.name}", partial(z.read, filename)))
+                    except zipfile.BadZipFile:
+                        st.warning(f"Le fichier {uploaded_file.name} n'est pas un fichier ZIP valide et sera ignoré.")
                         continue
-                    if pd.api.types.is_numeric_dtype(df['ENGINS']):
-                        df['ENGINS'] = pd.to_datetime(df['ENGINS'], origin='1899-12-30', unit='D')
-                    elif not pd.api.types.is_datetime64_any_dtype(df['ENGINS']):
-                        df['ENGINS'] = pd.to_datetime(df['ENGINS'], errors='coerce')
-                    df = df.dropna(subset=required_columns)
-                    for col in df.columns[1:]:  # Skip ENGINS column
-                        df[col] = pd.to_numeric(df[col], errors='coerce')
-                    df['TOTAL_HOURS'] = df.iloc[:, 1:].sum(axis=1)
-                    dfs.append(df)
-                except Exception as e:
-                    st.warning(f"Erreur lors du chargement du fichier {uploaded_file.name} : {str(e)}. Ce fichier sera ignoré.")
-                    continue
+                    except Exception as e:
+                        st.warning(f"Erreur lors du traitement du fichier ZIP {uploaded_file.name} : {str(e)}")
+                        continue
+                else:
+                    sources.append((uploaded_file.name, uploaded_file.read))
+
+            # Analyse en parallèle, un classeur lu à la fois ; les classeurs déjà analysés sont repris du cache
+            if sources:
+                progress_bar = st.progress(0, text=f"Analyse des classeurs : 0/{len(sources)}")
+                results = parse_workbooks(
+                    [read for _, read in sources], schema,
+                    progress=lambda done, total: progress_bar.progress(done / total, text=f"Analyse des classeurs : {done}/{total}")
+                )
+                progress_bar.empty()
+
+        dfs = []
+        for (name, _), (status, df) in zip(sources, results):
+            if status == 'missing':
+                st.warning(f"Le fichier {name} ne contient pas toutes les colonnes requises : {', '.join(required_columns)}. Il sera ignoré.")
+            elif status == 'error':
+                st.warning(f"Erreur lors du chargement du fichier {name} : {df}. Ce fichier sera ignoré.")
+            else:
+                dfs.append(df)
 
         if not dfs:
-            st.error("Aucun fichier d'heures de marche valide n'a pu être chargé. Veuillez vérifier les fichiers téléversés.")
+            st.error(f"Aucun fichier{label} valide n'a pu être chargé. Veuillez vérifier les fichiers téléversés.")
             return pd.DataFrame()
 
-        combined_df = pd.concat(dfs, ignore_index=True)
-        combined_df = combined_df.drop_duplicates()
+        combined_df = schema['combine'](pd.concat(dfs, ignore_index=True))
+        # Tri par date pour les filtres de période par recherche dichotomique
+        combined_df = sort_by_date(combined_df, schema['date_column'])
+        # Compactage mémoire : textes à faible cardinalité en category, entiers en 32 bits sans perte
+        combined_df = compact_frame(combined_df, f"{schema['name']} (téléversé)", schema['categorical'])
+        if dataset_key is not None and not combined_df.empty:
+            handle = acquire_dataset(dataset_key, combined_df, identity)
+            bind_dataset(slot, handle)
+            combined_df = handle.frame
+
+        if combined_df.empty and schema['empty_error']:
+            st.error(schema['empty_error'])
+            return pd.DataFrame()
 
-        st.success(f"{len(dfs)} fichier(s) d'heures de marche valide(s) chargé(s) avec succès. Nombre total de lignes : {combined_df.shape[0]}")
+        st.success(f"{len(dfs)} fichier(s){label} valide(s) chargé(s) avec succès. Nombre total de lignes : {combined_df.shape[0]}")
+        peak_rss = peak_rss_mb()
+        if peak_rss is not None:
+            st.caption(f"Mémoire maximale du processus : {peak_rss:,.0f} Mo")
         return combined_df
     except Exception as e:
-        st.error(f"Erreur générale lors du chargement des fichiers d'heures de marche : {str(e)}")
+        st.error(f"Erreur générale lors du chargement des fichiers{label} : {str(e)}")
         return pd.DataFrame()
-    
-def compute_monthly_costs(data):
-    monthly_data = data.groupby('Mois')['Montant'].sum().reset_index()
-    month_order = ['Janvier', 'Février', 'Mars', 'Avril', 'Mai', 'Juin',
-                   'Juillet', 'Août', 'Septembre', 'Octobre', 'Novembre', 'Décembre']
-    monthly_data['Mois'] = pd.Categorical(monthly_data['Mois'], categories=month_order, ordered=True)
-    return monthly_data.sort_values('Mois')
-
-def compute_category_breakdown(data):
-    return data.groupby('Desc_Cat')['Montant'].sum().reset_index()
-
-def generate_word_report(filtered_data, total_cost, global_avg, category_stats, most_consumed_per_cat, 
-                        pivot_engine, selected_engines, table_df, total_montant, figures, tonnage_df, tonnage_date_range, hm_df, hm_date_range):
-    doc = Document()
-    
-    title = doc.add_heading('Rapport Complet de Consommation des Équipements Miniers', 0)
-    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    doc.add_paragraph(f"Date de génération: {datetime.now().strftime('%d/%m/%Y %H:%M')}")
-    doc.add_paragraph(f"Période couverte: du {filtered_data['Date'].min().strftime('%d/%m/%Y')} au {filtered_data['Date'].max().strftime('%d/%m/%Y')}")
-    doc.add_paragraph(f"Nombre d'équipements analysés: {filtered_data['Desc_CA'].nunique()}")
-    
-    doc.add_heading('Table des Matières', level=1)
-    doc.add_paragraph('1. Indicateurs Clés\n2. Analyse par Catégorie\n3. Analyse Comparative\n4. Données Détailées\n5. Recommandations\n6. Analyse des Tonnages\n7. Analyse des Heures de Marche', style='ListBullet')
-    
-    doc.add_heading('1. Indicateurs Clés', level=1)
-    table = doc.add_table(rows=3, cols=2)
-    table.style = 'LightShading'
-    table.cell(0, 0).text = 'Indicateur'
-    table.cell(0, 1).text = 'Valeur'
-    table.cell(1, 0).text = 'Coût total'
-    table.cell(1, 1).text = f"{total_cost:,.0f} DH"
-    table.cell(2, 0).text = 'Moyenne globale par jour'
-    table.cell(2, 1).text = f"{global_avg:,.0f} DH"
-    
-    doc.add_heading('Indicateurs par Catégorie', level=2)
-    cat_table = doc.add_table(rows=category_stats.shape[0]+1, cols=4)
-    cat_table.style = 'LightShading'
-    cat_table.cell(0, 0).text = 'Catégorie'
-    cat_table.cell(0, 1).text = 'Total (DH)'
-    cat_table.cell(0, 2).text = 'Moyenne (DH)'
-    cat_table.cell(0, 3).text = 'Type le plus consommé'
-    
-    for i, (_, row) in enumerate(category_stats.iterrows()):
-        most_consumed = most_consumed_per_cat[most_consumed_per_cat['CATEGORIE'] == row['CATEGORIE']]
-        most_consumed_desc = most_consumed['Desc_Cat'].iloc[0] if not most_consumed.empty else "N/A"
-        
-        cat_table.cell(i+1, 0).text = row['CATEGORIE']
-        cat_table.cell(i+1, 1).text = f"{row['Total']:,.0f}"
-        cat_table.cell(i+1, 2).text = f"{row['Moyenne']:,.0f}"
-        cat_table.cell(i+1, 3).text = most_consumed_desc
-    
-    doc.add_heading('2. Analyse par Catégorie', level=1)
-    doc.add_paragraph('Cette section présente les analyses détaillées pour chaque catégorie d\'équipement.')
-    
-    progress_bar = st.progress(0)
-    total_figures = sum(1 for fig_name in figures if "Consommation par équipement" in fig_name) + ("Coût total par catégorie" in figures)
-    
-    for i, (fig_name, fig) in enumerate(figures.items()):
-        if "Consommation par équipement" in fig_name:
-            doc.add_heading(fig_name, level=2)
-            category = fig_name.split('(')[-1].replace(')', '')
-            doc.add_paragraph(f"Ce graphique montre la répartition des coûts par équipement pour la catégorie {category}. "
-                            "Il permet d'identifier les équipements les plus coûteux à maintenir.")
-            
-            img_bytes = pio.to_image(fig, format='png', scale=1)
-            doc.add_picture(BytesIO(img_bytes), width=Inches(6))
-            progress_bar.progress((i + 1) / total_figures)
-    
-    doc.add_heading('3. Analyse Comparative', level=1)
-    doc.add_paragraph('Comparaison des performances entre les différentes catégories d\'équipements.')
-    
-    if "Coût total par catégorie" in figures:
-        doc.add_heading('Comparaison des coûts par catégorie', level=2)
-        doc.add_paragraph("Ce graphique compare les coûts totaux entre les différentes catégories d'équipements. "
-                        "Les catégories les plus à droite représentent les postes de dépenses les plus importants.")
-        
-        img_bytes = pio.to_image(figures["Coût total par catégorie"], format='png', scale=1)
-        doc.add_picture(BytesIO(img_bytes), width=Inches(6))
-        progress_bar.progress(1.0)
-    
-    doc.add_heading('4. Données Détailées', level=1)
-    
-    if not pivot_engine.empty:
-        doc.add_heading(f'Détail des consommations pour {", ".join(selected_engines) if selected_engines else "toutes les catégories"}', level=2)
-        doc.add_paragraph(f"Tableau détaillant les différents types de consommation pour chaque équipement des catégories sélectionnées.")
-        
-        table = doc.add_table(rows=pivot_engine.shape[0]+1, cols=pivot_engine.shape[1]+1)
-        table.style = 'Table Grid'
-        
-        table_rows = table.rows
-        table_rows[0].cells[0].text = 'Équipement'
-        for j, col in enumerate(pivot_engine.columns):
-            table_rows[0].cells[j+1].text = str(col)
-        
-        for i, (index, row) in enumerate(pivot_engine.iterrows()):
-            row_cells = table_rows[i+1].cells
-            row_cells[0].text = str(index)
-            for j, value in enumerate(row):
-                row_cells[j+1].text = f"{value:,.2f} DH"
-    
-    doc.add_heading('Journal complet des consommations', level=2)
-    doc.add_paragraph('Liste détaillée des consommations enregistrées (limité aux 100 premières entrées).')
-    
-    max_rows = min(table_df.shape[0], 100)
-    table = doc.add_table(rows=max_rows+2, cols=table_df.shape[1])
-    table.style = 'Table Grid'
-    
-    table_rows = table.rows
-    for j, col in enumerate(table_df.columns):
-        table_rows[0].cells[j].text = col
-    
-    for i in range(max_rows):
-        row_cells = table_rows[i+1].cells
-        for j, value in enumerate(table_df.iloc[i]):
-            row_cells[j].text = str(value)
-    
-    table_rows[max_rows+1].cells[0].text = 'Total'
-    table_rows[max_rows+1].cells[table_df.shape[1]-1].text = f"{total_montant:,.2f} DH"
-    
-    doc.add_heading('5. Recommandations', level=1)
-    
-    top_categories = filtered_data.groupby('CATEGORIE')['Montant'].sum().nlargest(3).reset_index()
-    doc.add_heading('Catégories prioritaires', level=2)
-    for _, row in top_categories.iterrows():
-        doc.add_paragraph(
-            f"{row['CATEGORIE']}: {row['Montant']:,.0f} DH ({(row['Montant']/total_cost)*100:.1f}% du total)",
-            style='ListBullet'
-        )
-    
-    doc.add_heading('Actions recommandées', level=2)
-    recommendations = [
-        "Prioriser les analyses des équipements dans les catégories les plus coûteuses",
-        "Mettre en place un suivi mensuel des consommations par catégorie",
-        "Comparer les performances des équipements similaires pour identifier les anomalies",
-        "Négocier avec les fournisseurs pour les pièces les plus fréquemment remplacées",
-        "Étudier la possibilité de maintenance préventive pour réduire les coûts",
-        "Former les opérateurs à une utilisation optimale des équipements"
-    ]
-    for rec in recommendations:
-        doc.add_paragraph(rec, style='ListBullet')
-    
-    doc.add_heading('6. Analyse des Tonnages', level=1)
-    doc.add_paragraph('Cette section présente les données de tonnage pour les sites DS Sud, DS Nord et KA.')
-    
-    if not tonnage_df.empty:
-        filtered_tonnage_df = tonnage_df.copy()
-        if tonnage_date_range is not None and len(tonnage_date_range) == 2:
-            start_date, end_date = tonnage_date_range
-            filtered_tonnage_df = filtered_tonnage_df[
-                (filtered_tonnage_df['DATE'].dt.date >= start_date) & 
-                (filtered_tonnage_df['DATE'].dt.date <= end_date)
-            ]
-        else:
-            doc.add_paragraph("Plage de dates non définie pour les tonnages. Affichage de toutes les données disponibles.")
-        if not filtered_tonnage_df.empty:
-            doc.add_heading('Tableau des tonnages', level=2)
-            max_rows = min(filtered_tonnage_df.shape[0], 100)
-            table = doc.add_table(rows=max_rows+2, cols=5)
-            table.style = 'Table Grid'
-            
-            table_rows = table.rows
-            headers = ['Date', 'DS Sud (T)', 'DS Nord (T)', 'KA (T)', 'Cumulé (T)']
-            for j, col in enumerate(headers):
-                table_rows[0].cells[j].text = col
-            
-            display_tonnage_df = filtered_tonnage_df[['DATE', 'DS Sud', 'DS Nord', 'KA', 'CUMMULE']].copy()
-            display_tonnage_df['DATE'] = display_tonnage_df['DATE'].dt.strftime('%d/%m/%Y')
-            
-            for i in range(max_rows):
-                row_cells = table_rows[i+1].cells
-                for j, value in enumerate(display_tonnage_df.iloc[i]):
-                    row_cells[j].text = str(value) if j == 0 else f"{value:,.2f} T"
-            
-            total_tonnage = display_tonnage_df[['DS Sud', 'DS Nord', 'KA']].sum().to_dict()
-            total_cumule = display_tonnage_df['CUMMULE'].sum()
-            table_rows[max_rows+1].cells[0].text = 'Total'
-            table_rows[max_rows+1].cells[1].text = f"{total_tonnage['DS Sud']:,.2f} T"
-            table_rows[max_rows+1].cells[2].text = f"{total_tonnage['DS Nord']:,.2f} T"
-            table_rows[max_rows+1].cells[3].text = f"{total_tonnage['KA']:,.2f} T"
-            table_rows[max_rows+1].cells[4].text = f"{total_cumule:,.2f} T"
-            
-            if "Comparaison des tonnages par site" in figures:
-                doc.add_heading('Comparaison des tonnages par site', level=2)
-                img_bytes = pio.to_image(figures["Comparaison des tonnages par site"], format='png', scale=1)
-                doc.add_picture(BytesIO(img_bytes), width=Inches(6))
-            
-            if "Tonnage total par site" in figures:
-                doc.add_heading('Tonnage total par site', level=2)
-                img_bytes = pio.to_image(figures["Tonnage total par site"], format='png', scale=1)
-                doc.add_picture(BytesIO(img_bytes), width=Inches(6))
-    doc.add_heading('7. Analyse des Heures de Marche', level=1)
-    doc.add_paragraph('Cette section présente les données des heures de marche pour les équipements miniers.')
-    
-    if not hm_df.empty:
-        filtered_hm_df = hm_df.copy()
-        if hm_date_range is not None and len(hm_date_range) == 2:
-            start_date, end_date = hm_date_range
-            filtered_hm_df = filtered_hm_df[
-                (filtered_hm_df['ENGINS'].dt.date >= start_date) & 
-                (filtered_hm_df['ENGINS'].dt.date <= end_date)
-            ]
-        else:
-            doc.add_paragraph("Plage de dates non définie pour les heures de marche. Affichage de toutes les données disponibles.")
-        if not filtered_hm_df.empty:
-            doc.add_heading('Tableau des heures de marche', level=2)
-            max_rows = min(filtered_hm_df.shape[0], 100)
-            equipment_columns = [col for col in filtered_hm_df.columns if col not in ['ENGINS', 'TOTAL_HOURS']]
-            table = doc.add_table(rows=max_rows+2, cols=len(equipment_columns)+2)
-            table.style = 'Table Grid'
-            
-            table_rows = table.rows
-            headers = ['Date'] + equipment_columns + ['Total (h)']
-            for j, col in enumerate(headers):
-                table_rows[0].cells[j].text = col
-            
-            display_hm_df = filtered_hm_df[['ENGINS'] + equipment_columns + ['TOTAL_HOURS']].copy()
-            display_hm_df['ENGINS'] = display_hm_df['ENGINS'].dt.strftime('%d/%m/%Y')
-            
-            for i in range(max_rows):
-                row_cells = table_rows[i+1].cells
-                for j, value in enumerate(display_hm_df.iloc[i]):
-                    row_cells[j].text = str(value) if j == 0 else f"{value:,.2f} h"
-            
-            total_hours = display_hm_df[equipment_columns].sum().to_dict()
-            total_sum = display_hm_df['TOTAL_HOURS'].sum()
-            table_rows[max_rows+1].cells[0].text = 'Total'
-            for j, col in enumerate(equipment_columns, 1):
-                table_rows[max_rows+1].cells[j].text = f"{total_hours[col]:,.2f} h"
-            table_rows[max_rows+1].cells[-1].text = f"{total_sum:,.2f} h"
-            
-            if "Comparaison des heures de marche par équipement" in figures:
-                doc.add_heading('Comparaison des heures de marche par équipement', level=2)
-                img_bytes = pio.to_image(figures["Comparaison des heures de marche par équipement"], format='png', scale=1)
-                doc.add_picture(BytesIO(img_bytes), width=Inches(6))
-            
-            if "Heures totales par équipement" in figures:
-                doc.add_heading('Heures totales par équipement', level=2)
-                img_bytes = pio.to_image(figures["Heures totales par équipement"], format='png', scale=1)
-                doc.add_picture(BytesIO(img_bytes), width=Inches(6))
-    else:
-        doc.add_paragraph("Aucune donnée d'heures de marche disponible pour la période sélectionnée.")
-    
-    doc.add_heading('Conclusion', level=1)
-    doc.add_paragraph(
-        "Ce rapport fournit une analyse complète des coûts de consommation des équipements miniers, des tonnages des sites, "
-        "et des heures de marche des équipements. Les graphiques et tableaux présentés permettent d'identifier les principaux "
-        "post_modes de dépenses, les performances des sites, et l'utilisation des équipements pour optimiser les coûts d'exploitation "
-        "et la productivité."
-    )
-    
-    section = doc.sections[0]
-    footer = section.footer
-    footer_para = footer.paragraphs[0] if footer.paragraphs else footer.add_paragraph()
-    footer_para.text = f"Généré le {datetime.now().strftime('%d/%m/%Y')} - Tableau de bord de consommation et heures de marche des équipements miniers"
-    footer_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    
-    buffer = BytesIO()
-    doc.save(buffer)
-    buffer.seek(0)
-    return buffer
 
+@profiled("engins_s.load_consumption")
+def load_data(uploaded_files=None):
+    return load_uploads(uploaded_files, CONSUMPTION_SCHEMA)
+
+@profiled("engins_s.load_tonnage")
+def load_tonnage_data(uploaded_files=None):
+    return load_uploads(uploaded_files, TONNAGE_SCHEMA)
+
+@profiled("engins_s.load_hours")
+def load_hm_data(uploaded_files=None):
+    return load_uploads(uploaded_files, HOURS_SCHEMA)
+    
 # Initialiser l'état de la session
 if 'logged_in' not in st.session_state:
     st.session_state.logged_in = False
@@ -917,38 +488,39 @@ else:
         if not available_equipment:
             st.warning("Aucun équipement ne correspond au terme de recherche.")
         selected_equipment = st.selectbox("Sélectionner l'équipement", equipment_options)
-        filtered_data = df.copy()
+        filtered_data = df
         st.write(f"Total Montant des données brutes : {filtered_data['Montant'].sum():,.2f} DH")
         if len(date_range) == 2:
             start_date, end_date = date_range
-            filtered_data = filtered_data[(filtered_data['Date'].dt.date >= start_date) & 
-                                        (filtered_data['Date'].dt.date <= end_date)]
+            filtered_data = date_range_slice(filtered_data, start_date, end_date)
             st.write(f"Total Montant après filtre de date : {filtered_data['Montant'].sum():,.2f} DH")
 
         if selected_equipment != "Tous les équipements":
-            filtered_data = filtered_data[filtered_data['Desc_CA'] == selected_equipment]
+            filtered_data = filter_values(filtered_data, 'Desc_CA', selected_equipment)
             st.write(f"Total Montant après filtre d'équipement : {filtered_data['Montant'].sum():,.2f} DH")
 
         if filtered_data.empty:
             st.warning("Aucune donnée disponible après filtrage. Veuillez ajuster les filtres.")
             st.stop()
-        total_cost = filtered_data['Montant'].sum()
-        global_avg = filtered_data['Montant'].mean()
-        category_stats = filtered_data.groupby('CATEGORIE').agg(
-            Total=('Montant', 'sum'),
-            Moyenne=('Montant', 'mean')
-        ).reset_index()
-        most_consumed_per_cat = filtered_data.groupby(['CATEGORIE', 'Desc_Cat'])['Montant'].sum().reset_index()
-        most_consumed_per_cat = most_consumed_per_cat.loc[most_consumed_per_cat.groupby('CATEGORIE')['Montant'].idxmax()]
+        summary = summarize(filtered_data)
+        total_cost = summary.total_cost
+        global_avg = summary.global_avg
+        category_stats = summary.category_stats
+        most_consumed_per_cat = summary.most_consumed_per_cat
+        
+        with st.expander("🧠 Mémoire (debug)"):
+            st.dataframe(memory_report(), hide_index=True)
+            st.dataframe(dataset_report(), hide_index=True)
         
         st.subheader("Exportation")
-        # Update the report generation block in the sidebar
+        # Le rapport est construit en arrière-plan : la session reste utilisable et une relance ne l'interrompt pas
+        report_owner = session_owner(st.session_state)
         if st.button("📄 Générer un rapport Word complet"):
-            with st.spinner("Génération du rapport en cours..."):
+            with st.spinner("Préparation du rapport en cours..."):
                 figures = {}
                 
                 fig_comp = px.bar(
-                    filtered_data.groupby('CATEGORIE')['Montant'].sum().reset_index(),
+                    filtered_data.groupby('CATEGORIE', observed=True)['Montant'].sum().reset_index(),
                     x='CATEGORIE',
                     y='Montant',
                     title='Coût total par catégorie',
@@ -967,8 +539,8 @@ else:
                 figures["Coût total par catégorie"] = fig_comp
                 
                 for cat in filtered_data['CATEGORIE'].unique():
-                    cat_data = filtered_data[filtered_data['CATEGORIE'] == cat]
-                    equip_sum = cat_data.groupby('Desc_CA')['Montant'].sum().reset_index().sort_values('Montant', ascending=False)
+                    cat_data = filter_values(filtered_data, 'CATEGORIE', cat)
+                    equip_sum = cat_data.groupby('Desc_CA', observed=True)['Montant'].sum().reset_index().sort_values('Montant', ascending=False)
                     fig_cat = px.bar(
                         equip_sum,
                         x='Desc_CA',
@@ -991,13 +563,10 @@ else:
                 
                 tonnage_df = load_tonnage_data(st.session_state.uploaded_tonnage_file)
                 if not tonnage_df.empty:
-                    filtered_tonnage_df = tonnage_df.copy()
+                    filtered_tonnage_df = tonnage_df
                     if st.session_state['tonnage_date_range'] is not None and len(st.session_state['tonnage_date_range']) == 2:
                         start_date, end_date = st.session_state['tonnage_date_range']
-                        filtered_tonnage_df = filtered_tonnage_df[
-                            (filtered_tonnage_df['DATE'].dt.date >= start_date) &
-                            (filtered_tonnage_df['DATE'].dt.date <= end_date)
-                        ]
+                        filtered_tonnage_df = date_range_slice(filtered_tonnage_df, start_date, end_date, 'DATE')
                     if not filtered_tonnage_df.empty:
                         tonnage_melted = filtered_tonnage_df.melt(
                             id_vars=['DATE'],
@@ -1050,13 +619,10 @@ else:
 
                 hm_df = load_hm_data(st.session_state.uploaded_hm_file)
                 if not hm_df.empty:
-                    filtered_hm_df = hm_df.copy()
+                    filtered_hm_df = hm_df
                     if st.session_state['hm_date_range'] is not None and len(st.session_state['hm_date_range']) == 2:
                         start_date, end_date = st.session_state['hm_date_range']
-                        filtered_hm_df = filtered_hm_df[
-                            (filtered_hm_df['ENGINS'].dt.date >= start_date) &
-                            (filtered_hm_df['ENGINS'].dt.date <= end_date)
-                        ]
+                        filtered_hm_df = date_range_slice(filtered_hm_df, start_date, end_date, 'ENGINS')
                     if not filtered_hm_df.empty:
                         equipment_columns = [col for col in filtered_hm_df.columns if col not in ['ENGINS', 'TOTAL_HOURS']]
                         hm_melted = filtered_hm_df.melt(
@@ -1104,52 +670,21 @@ else:
                         )
                         figures['Heures totales par équipement'] = fig_total_hm
                 
-                pivot_engine = pd.DataFrame()
                 selected_engines = st.session_state.get('selected_engines', [])
-                if not filtered_data.empty and selected_engines and selected_engines != ["Tous les types"]:
-                    pivot_engine = pd.pivot_table(
-                        filtered_data[filtered_data['CATEGORIE'].isin(selected_engines)],
-                        values='Montant',
-                        index='Desc_CA',
-                        columns='Desc_Cat',
-                        aggfunc='sum',
-                        fill_value=0,
-                        margins=True,
-                        margins_name='Total'
-                    ).round(2)
-                elif not filtered_data.empty:
-                    pivot_data = pd.pivot_table(
-                        filtered_data,
-                        values='Montant',
-                        index='Desc_CA',
-                        columns='Desc_Cat',
-                        aggfunc='sum',
-                        fill_value=0,
-                        margins=True,
-                        margins_name='Total'
-                    ).round(2)
-                
-                table_df = filtered_data[['Date', 'Desc_CA', 'Desc_Cat', 'Montant']].copy()
-                table_df['Date'] = table_df['Date'].dt.strftime('%d/%m/%Y')
-                table_df['Montant'] = table_df['Montant'].round(2)
-                table_df = table_df.rename(columns={
-                    'Date': 'Date',
-                    'Desc_CA': 'Équipement',
-                    'Desc_Cat': 'Type de consommation',
-                    'Montant': 'Montant (DH)'
-                })
-                total_montant = table_df['Montant (DH)'].sum()
+                pivot_engine = engine_pivot(filtered_data, selected_engines)
+                table_df = detail_table(filtered_data)
                 
-                report = generate_word_report(
+                submit_report(
+                    report_owner,
+                    "engins_s",
+                    "Rapport complet",
+                    f"Rapport_Consommation_{datetime.now().strftime('%Y%m%d_%H%M')}.docx",
+                    generate_word_report,
                     filtered_data,
-                    total_cost,
-                    global_avg,
-                    category_stats,
-                    most_consumed_per_cat,
+                    summary,
                     pivot_engine,
                     selected_engines,
                     table_df,
-                    total_montant,
                     figures,
                     tonnage_df,
                     st.session_state['tonnage_date_range'],
@@ -1157,15 +692,30 @@ else:
                     st.session_state['hm_date_range']
                 )
                 
-                st.download_button(
-                    label="📥 Télécharger le rapport Word",
-                    data=report,
-                    file_name=f"Rapport_Consommation_{datetime.now().strftime('%Y%m%d_%H%M')}.docx",
-                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                    key="download_button"
-                )
-                
-                st.success("Rapport généré avec succès!")
+                st.success("Génération du rapport lancée ! Il sera téléchargeable ci-dessous dès qu'il sera prêt.")
+        
+        # Liste des rapports de l'utilisateur, rafraîchie seule tant qu'un rapport est en cours
+        report_polling = has_active_jobs(report_owner, "engins_s")
+        @st.fragment(run_every=2 if report_polling else None)
+        def report_jobs_panel():
+            for job in list_jobs(report_owner, "engins_s"):
+                if job.status == DONE:
+                    st.download_button(
+                        label=f"📥 Télécharger le rapport Word du {job.submitted_at}",
+                        data=read_result(job) or b"",
+                        file_name=job.file_name,
+                        mime=DOCX_MIME,
+                        key=f"download_button_{job.id}"
+                    )
+                elif job.status == FAILED:
+                    st.error(f"Échec du rapport du {job.submitted_at} : {job.error}")
+                else:
+                    st.progress(job.progress, text=f"Génération du rapport du {job.submitted_at} en cours...")
+            # Plus aucun rapport en cours : relance complète pour arrêter le rafraîchissement périodique
+            if report_polling and not has_active_jobs(report_owner, "engins_s"):
+                st.rerun()
+        
+        report_jobs_panel()
     st.markdown("""
     <div class='header-container'>
         <h1 style='color: white; text-align:center; margin-top:0;'>📊 Tableau De Bord De La Consommation Des Engins</h1>
@@ -1215,7 +765,7 @@ else:
                 """, unsafe_allow_html=True)
 
         st.markdown("<div class='analysis-card'><h3 style='color: #2c3e50;'>Consommation des catégories par type de consommation</h3></div>", unsafe_allow_html=True)
-        hist_data = filtered_data.groupby(['CATEGORIE', 'Desc_Cat'])['Montant'].sum().reset_index()
+        hist_data = filtered_data.groupby(['CATEGORIE', 'Desc_Cat'], observed=True)['Montant'].sum().reset_index()
         fig_hist = px.bar(
             hist_data,
             x='CATEGORIE',
@@ -1253,6 +803,7 @@ else:
             columns='Desc_Cat',
             aggfunc='sum',
             fill_value=0,
+            observed=True,
             margins=True,
             margins_name='Total'
         ).round(2)
@@ -1269,7 +820,7 @@ else:
         )
 
         st.markdown("<div class='analysis-card'><h3 style='color: #2c3e50;'>Consommation par équipement pour les types d'engin sélectionnés</h3></div>", unsafe_allow_html=True)
-        engine_data = filtered_data.copy()
+        engine_data = filtered_data
         if not engine_data.empty:
             st.markdown("<h4 style='color: #2c3e50;'>Filtrer par type d'engin</h4>", unsafe_allow_html=True)
             engine_types = ["Tous les types", "DUMPER", "FORATION", "10 TONNES"]
@@ -1285,7 +836,7 @@ else:
             
             if "Tous les types" not in selected_engines and selected_engines:
                 try:
-                    engine_data = engine_data[engine_data['CATEGORIE'].isin(selected_engines)]
+                    engine_data = filter_values(engine_data, 'CATEGORIE', selected_engines)
                     st.write(f"Total Montant après filtre par selected_engines : {engine_data['Montant'].sum():,.2f} DH")
                 except TypeError as e:
                     st.error(f"Erreur lors du filtrage par catégorie : {str(e)}")
@@ -1302,6 +853,7 @@ else:
                     columns='Desc_Cat',
                     aggfunc='sum',
                     fill_value=0,
+                    observed=True,
                     margins=True,
                     margins_name='Total'
                 ).round(2)
@@ -1326,7 +878,7 @@ else:
 
     for i, cat in enumerate(sorted(filtered_data['CATEGORIE'].unique())):
         with tabs[i]:
-            cat_data = filtered_data[filtered_data['CATEGORIE'] == cat]
+            cat_data = filter_values(filtered_data, 'CATEGORIE', cat)
             st.markdown(f"""
             <div class='analysis-card'>
                 <h2 style='color: #2c3e50; margin-top:0;'>Analyse pour la catégorie {cat}</h2>
@@ -1334,7 +886,7 @@ else:
             """, unsafe_allow_html=True)
             
             st.markdown("<h3 style='color: #2c3e50;'>Consommation par équipement</h3>", unsafe_allow_html=True)
-            equip_sum = cat_data.groupby('Desc_CA')['Montant'].sum().reset_index().sort_values('Montant', ascending=False)
+            equip_sum = cat_data.groupby('Desc_CA', observed=True)['Montant'].sum().reset_index().sort_values('Montant', ascending=False)
             fig2 = px.bar(
                 equip_sum,
                 x='Desc_CA',
@@ -1364,7 +916,7 @@ else:
         
         st.markdown("<h3 style='color: #2c3e50;'>Comparaison des catégories</h3>", unsafe_allow_html=True)
         fig_comp = px.bar(
-            filtered_data.groupby('CATEGORIE')['Montant'].sum().reset_index(),
+            filtered_data.groupby('CATEGORIE', observed=True)['Montant'].sum().reset_index(),
             x='CATEGORIE',
             y='Montant',
             title='Coût total par catégorie',
@@ -1389,7 +941,7 @@ else:
         """, unsafe_allow_html=True)
         
         st.markdown("<h3 style='color: #2c3e50;'>Catégories prioritaires</h3>", unsafe_allow_html=True)
-        top_categories = filtered_data.groupby('CATEGORIE')['Montant'].sum().nlargest(3).reset_index()
+        top_categories = filtered_data.groupby('CATEGORIE', observed=True)['Montant'].sum().nlargest(3).reset_index()
         cols = st.columns(3)
         for i, (col, (_, row)) in enumerate(zip(cols, top_categories.iterrows())):
             with col:
@@ -1435,7 +987,7 @@ else:
         table_df = filtered_data[['Date', 'Desc_CA', 'Desc_Cat', 'Montant']].copy()
         
         if "Tous les types" not in selected_consumption_types and selected_consumption_types:
-            table_df = table_df[table_df['Desc_Cat'].isin(selected_consumption_types)]
+            table_df = filter_values(table_df, 'Desc_Cat', selected_consumption_types)
             # Debug: Total après filtre de type de consommation
             st.write(f"Total Montant après filtre de type de consommation : {table_df['Montant'].sum():,.2f} DH")
         
@@ -1550,13 +1102,10 @@ else:
                 key="tonnage_date_range"
             )
 
-            filtered_tonnage_df = tonnage_df.copy()
+            filtered_tonnage_df = tonnage_df
             if len(tonnage_date_range) == 2:
                 start_date, end_date = tonnage_date_range
-                filtered_tonnage_df = filtered_tonnage_df[
-                    (filtered_tonnage_df['DATE'].dt.date >= start_date) & 
-                    (filtered_tonnage_df['DATE'].dt.date <= end_date)
-                ]
+                filtered_tonnage_df = date_range_slice(filtered_tonnage_df, start_date, end_date, 'DATE')
 
             if filtered_tonnage_df.empty:
                 st.warning("Aucune donnée de tonnage disponible après filtrage. Veuillez ajuster les filtres.")
@@ -1718,13 +1267,10 @@ else:
                 key="hm_date_range"
             )
 
-            filtered_hm_df = hm_df.copy()
+            filtered_hm_df = hm_df
             if len(hm_date_range) == 2:
                 start_date, end_date = hm_date_range
-                filtered_hm_df = filtered_hm_df[
-                    (filtered_hm_df['ENGINS'].dt.date >= start_date) & 
-                    (filtered_hm_df['ENGINS'].dt.date <= end_date)
-                ]
+                filtered_hm_df = date_range_slice(filtered_hm_df, start_date, end_date, 'ENGINS')
 
             if filtered_hm_df.empty:
                 st.warning("Aucune donnée d'heures de marche disponible après filtrage. Veuillez ajuster les filtres.")
@@ -1816,3 +1362,9 @@ else:
                     template='plotly_white'
                 )
                 st.plotly_chart(fig_total_hm, use_container_width=True, key="total_hm_comparison")            
+
+# Panneau de profilage (administrateurs uniquement)
+if is_admin(st.session_state.get("username"), st.query_params.get("admin")):
+    with st.sidebar.expander("⏱️ Profilage (admin)"):
+        st.dataframe(profile_report(), hide_index=True)
+        st.dataframe(recent_stages(), hide_index=True)
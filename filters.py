@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+
+
+# Fonction pour trier un jeu de données par date (tri stable, dates manquantes en fin)
+# Les filtres de période ci-dessous supposent ce tri
+def sort_by_date(df, date_col="Date"):
+    return df.sort_values(date_col, kind="stable", na_position="last", ignore_index=True)
+
+
+# Fonction pour extraire les lignes dont la date est comprise entre start et end (jours entiers, bornes incluses)
+# Recherche dichotomique sur la colonne triée : O(log n), sans conversion des dates en objets Python
+def date_range_slice(df, start, end, date_col="Date"):
+    dates = df[date_col].values
+    lo = dates.searchsorted(pd.Timestamp(start).to_datetime64(), side="left")
+    hi = dates.searchsorted((pd.Timestamp(end) + pd.Timedelta(days=1)).to_datetime64(), side="left")
+    return df.iloc[lo:hi]
+
+
+# Fonction pour construire le masque des lignes dont la valeur fait partie de values
+# Pour une colonne catégorielle, la comparaison se fait sur les codes entiers
+def match_values(series, values):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.categories.get_indexer(list(values))
+        return np.isin(series.cat.codes.values, codes[codes >= 0])
+    return series.isin(values).values
+
+
+# Fonction pour filtrer un jeu de données sur une ou plusieurs valeurs d'une colonne
+def filter_values(df, col, values):
+    if isinstance(values, (str, int, float)):
+        values = [values]
+    return df[match_values(df[col], values)]
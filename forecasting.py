@@ -0,0 +1,253 @@
+import hashlib
+import os
+import threading
+import warnings
+from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+from process_pool import spawn_executor
+from profiling import profiled, record_cache
+
+FORECAST_STEPS = 6
+ARIMA_ORDER = (1, 1, 1)
+# Modèles proposés dans les tableaux de bord ; Holt est ajusté sur toutes les séries à la fois,
+# Auto retient pour chaque article le meilleur candidat en validation glissante (voir backtesting)
+MODELS = ("Holt", "ARIMA", "Auto")
+# Grille de paramètres du lissage exponentiel de Holt (niveau, tendance, amortissement de la tendance)
+HOLT_ALPHAS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9)
+HOLT_BETAS = (0.0, 0.05, 0.1, 0.2, 0.3)
+HOLT_PHIS = (0.9, 1.0)
+# En dessous de ce nombre de séries à ajuster, le coût du pool dépasse le gain
+PARALLEL_MIN_SERIES = 3
+MAX_WORKERS = max(1, min(8, (os.cpu_count() or 2) - 1))
+CACHE_MAX_ENTRIES = 1024
+
+_executor = None
+_executor_lock = threading.Lock()
+_fit_cache = OrderedDict()
+_fit_cache_lock = threading.Lock()
+
+
+# Fonction exécutée dans les processus du pool : ajuste un ARIMA et renvoie la prévision bornée à 0
+def _fit_arima(quantities, order, steps):
+    warnings.filterwarnings("ignore")
+    try:
+        from statsmodels.tsa.arima.model import ARIMA
+        fit = ARIMA(quantities, order=order).fit()
+        return np.clip(fit.forecast(steps=steps), 0, None), None
+    except Exception as e:
+        return None, str(e)
+
+
+# Fonction pour obtenir le pool de processus persistant (créé à la première utilisation)
+# Processus "spawn" qui ne réexécutent pas le tableau de bord (voir process_pool)
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = spawn_executor(MAX_WORKERS)
+        return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+# Fonction pour calculer la clé de cache d'une série (contenu + paramètres du modèle)
+def series_key(quantities, order=ARIMA_ORDER, steps=FORECAST_STEPS):
+    digest = hashlib.sha1(np.ascontiguousarray(quantities, dtype="float64").tobytes())
+    digest.update(repr((order, steps)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _cache_get(key):
+    with _fit_cache_lock:
+        if key in _fit_cache:
+            _fit_cache.move_to_end(key)
+            return _fit_cache[key]
+    return None
+
+
+def _cache_put(key, value):
+    with _fit_cache_lock:
+        _fit_cache[key] = value
+        _fit_cache.move_to_end(key)
+        while len(_fit_cache) > CACHE_MAX_ENTRIES:
+            _fit_cache.popitem(last=False)
+
+
+# Fonction pour ajuster un lot de séries : cache d'abord, puis pool de processus pour le reste
+# Renvoie une liste (prévision, erreur) dans l'ordre des séries reçues
+@profiled("forecasting.fit_many")
+def fit_many(quantities_list, order=ARIMA_ORDER, steps=FORECAST_STEPS):
+    results = [None] * len(quantities_list)
+    keys = [series_key(q, order, steps) for q in quantities_list]
+    pending = []
+    for i, key in enumerate(keys):
+        cached = _cache_get(key)
+        if cached is not None:
+            results[i] = (cached, None)
+        else:
+            pending.append(i)
+    record_cache(True, len(keys) - len(pending))
+    record_cache(False, len(pending))
+
+    fitted = None
+    if len(pending) >= PARALLEL_MIN_SERIES and MAX_WORKERS > 1:
+        try:
+            executor = _get_executor()
+            fitted = list(executor.map(
+                _fit_arima,
+                [quantities_list[i] for i in pending],
+                [order] * len(pending),
+                [steps] * len(pending),
+            ))
+        except (BrokenProcessPool, OSError, RuntimeError):
+            _reset_executor()
+            fitted = None
+    if fitted is None:
+        fitted = [_fit_arima(quantities_list[i], order, steps) for i in pending]
+
+    for i, (forecast, error) in zip(pending, fitted):
+        if forecast is not None:
+            _cache_put(keys[i], forecast)
+        results[i] = (forecast, error)
+    return results
+
+
+# Fonction pour empiler des séries de longueurs différentes en une matrice période x série
+# Les séries sont alignées sur leur dernière période ; le début des séries courtes est complété par NaN
+def stack_series(quantities_list):
+    length = max((len(q) for q in quantities_list), default=0)
+    matrix = np.full((length, len(quantities_list)), np.nan)
+    for j, quantities in enumerate(quantities_list):
+        if len(quantities):
+            matrix[length - len(quantities):, j] = quantities
+    return matrix
+
+
+# Fonction pour ajuster le lissage de Holt (tendance amortie ou non) sur toutes les colonnes d'une matrice à la fois
+# Chaque colonne reçoit les paramètres de la grille qui minimisent l'erreur quadratique de prévision à un pas
+# Les NaN de début de colonne (séries plus courtes) sont ignorés ; un NaN ultérieur est une valeur manquante
+# (le niveau suit la tendance). Renvoie une matrice steps x séries bornée à 0 (NaN pour une colonne vide)
+@profiled("forecasting.holt")
+def holt_forecast(matrix, steps=FORECAST_STEPS, alphas=HOLT_ALPHAS, betas=HOLT_BETAS, phis=HOLT_PHIS):
+    matrix = np.asarray(matrix, dtype="float64")
+    if matrix.ndim == 1:
+        matrix = matrix[:, None]
+    periods, series = matrix.shape
+    # Une ligne par combinaison de paramètres, une colonne par série
+    alpha, beta, phi = (grid.reshape(-1, 1) for grid in np.meshgrid(alphas, betas, phis, indexing="ij"))
+    alpha_beta = alpha * beta
+    level = np.zeros((alpha.shape[0], series))
+    trend = np.zeros_like(level)
+    sse = np.zeros_like(level)
+    damped = np.empty_like(level)
+    step = np.empty_like(level)
+    error = np.empty_like(level)
+    started = np.zeros(series, dtype=bool)
+    for t in range(periods):
+        observed = ~np.isnan(matrix[t])
+        first = observed & ~started
+        update = (observed & started).astype("float64")
+        y = np.nan_to_num(matrix[t])
+        # Prévision à un pas, erreur et mise à jour (forme à correction d'erreur), opérations en place
+        # Avant le début d'une série, niveau et tendance restent à 0
+        np.multiply(phi, trend, out=damped)
+        np.add(level, damped, out=step)
+        np.subtract(y, step, out=error)
+        error *= update
+        sse += error * error
+        np.multiply(alpha, error, out=level)
+        level += step
+        np.multiply(alpha_beta, error, out=trend)
+        trend += damped
+        if first.any():
+            level[:, first] = y[first]
+        started |= observed
+    best = np.argmin(sse, axis=0)
+    columns = np.arange(series)
+    level, trend, phi = level[best, columns], trend[best, columns], phi[best, 0]
+    # Somme des amortissements phi + phi² + ... + phi^h pour chaque horizon h
+    damping = np.cumsum(phi[None, :] ** np.arange(1, steps + 1)[:, None], axis=0)
+    forecast = level[None, :] + damping * trend[None, :]
+    forecast[:, ~started] = np.nan
+    return np.clip(forecast, 0, None)
+
+
+# Fonction pour ajuster Holt sur un lot de séries ; même format de résultat que fit_many
+@profiled("forecasting.fit_many_holt")
+def fit_many_holt(quantities_list, steps=FORECAST_STEPS):
+    if not quantities_list:
+        return []
+    forecasts = holt_forecast(stack_series(quantities_list), steps)
+    return [
+        (forecasts[:, j], None) if not np.isnan(forecasts[:, j]).any() else (None, "série vide")
+        for j in range(len(quantities_list))
+    ]
+
+
+# Fonction pour prévoir plusieurs articles et construire les données du graphique de prévision
+# series : dict article -> (index historique, quantités, index des périodes prévues)
+# model : "Holt" (vectorisé, toutes les séries en une passe), "ARIMA" (un ajustement par série, en parallèle)
+# ou "Auto" (modèle retenu par backtest pour chaque série)
+# Renvoie (forecast_data, totaux prévus par article, erreurs par article)
+def forecast_articles(series, order=ARIMA_ORDER, steps=FORECAST_STEPS, model="Holt"):
+    items = list(series)
+    quantities_list = [np.asarray(series[item][1], dtype="float64") for item in items]
+    if model == "Holt":
+        results = fit_many_holt(quantities_list, steps)
+    elif model == "Auto":
+        from backtesting import fit_many_selected
+        results = fit_many_selected(quantities_list, steps)
+    else:
+        results = fit_many(quantities_list, order, steps)
+
+    frames = []
+    totals = {}
+    errors = {}
+    for item, (forecast, error) in zip(items, results):
+        if forecast is None:
+            errors[item] = error
+            continue
+        indices, quantities, forecast_index = series[item]
+        frames.append(pd.DataFrame({
+            'Index': indices,
+            'Quantité': quantities,
+            'Article': item,
+            'Type': 'Historique'
+        }))
+        frames.append(pd.DataFrame({
+            'Index': forecast_index,
+            'Quantité': forecast,
+            'Article': item,
+            'Type': 'Prévision'
+        }))
+        totals[item] = forecast.sum()
+    forecast_data = pd.concat(frames) if frames else pd.DataFrame()
+    return forecast_data, totals, errors
+
+
+# Fonction pour agréger des quantités par mois pour une liste d'articles en un seul groupby
+# Les articles ayant moins de min_rows enregistrements datés sont ignorés
+# Renvoie dict article -> (mois, quantités, 6 prochains mois)
+def monthly_series(df, item_col, date_col, qty_col, items, min_rows=3, steps=FORECAST_STEPS):
+    subset = df.loc[df[item_col].isin(items), [item_col, date_col, qty_col]].dropna(subset=[date_col, qty_col])
+    counts = subset[item_col].value_counts()
+    monthly = subset.groupby([item_col, subset[date_col].dt.to_period('M')], observed=True)[qty_col].sum()
+    series = {}
+    for item in items:
+        if counts.get(item, 0) < min_rows:
+            continue
+        item_monthly = monthly.loc[item]
+        indices = item_monthly.index.to_timestamp()
+        forecast_index = pd.date_range(start=indices.max() + pd.offsets.MonthBegin(1), periods=steps, freq='M')
+        series[item] = (pd.Series(indices), item_monthly.values, forecast_index)
+    return series
@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import threading
+
+import pandas as pd
+
+# Répertoire du cache colonnaire partagé par tous les tableaux de bord
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "columnar")
+# Répertoire des historiques incrémentaux (lignes nettoyées, en ajout seul)
+STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "store")
+
+_fingerprints = {}
+_fingerprints_lock = threading.Lock()
+
+
+# Fonction pour calculer le hash SHA-256 d'un fichier par blocs
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Fonction pour obtenir l'empreinte d'un classeur source (taille, mtime, hash)
+# Le hash n'est recalculé que si la taille ou la date de modification ont changé
+def source_fingerprint(path, manifest=None):
+    stat = os.stat(path)
+    if manifest and manifest.get("size") == stat.st_size and manifest.get("mtime_ns") == stat.st_mtime_ns:
+        return manifest
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": file_sha256(path)}
+
+
+# Fonction pour obtenir le hash d'un classeur source, mémorisé tant que sa taille et sa date ne changent pas
+# Renvoie None si le fichier est absent (le chargeur signale alors l'erreur lui-même)
+def source_hash(path):
+    with _fingerprints_lock:
+        previous = _fingerprints.get(path)
+    try:
+        fingerprint = source_fingerprint(path, previous)
+    except OSError:
+        return None
+    with _fingerprints_lock:
+        _fingerprints[path] = fingerprint
+    return fingerprint["sha256"]
+
+
+# Fonction pour rendre les colonnes texte compatibles Parquet
+# Les colonnes object mélangeant nombres et chaînes sont converties en chaînes (les NaN sont conservés)
+def normalize_object_columns(df):
+    for col in df.columns[df.dtypes == object]:
+        values = df[col].dropna()
+        if values.map(type).nunique() > 1:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def _options_key(sheet_name, na_values):
+    options = json.dumps({"sheet_name": sheet_name, "na_values": na_values}, sort_keys=True, default=str)
+    return hashlib.sha256(options.encode("utf-8")).hexdigest()[:8]
+
+
+def _read_manifest(manifest_path):
+    try:
+        with open(manifest_path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _dump_json(data, path):
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+# Fonction pour écrire un fichier de façon atomique (fichier temporaire puis renommage)
+def write_atomic(path, writer):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        writer(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# Fonction pour lire un classeur Excel via une copie Parquet typée
+# La copie est reconstruite uniquement quand le contenu du classeur change
+def read_excel_cached(path, sheet_name=0, na_values=None, cache_dir=CACHE_DIR):
+    stem = f"{os.path.splitext(os.path.basename(path))[0]}-{_options_key(sheet_name, na_values)}"
+    manifest_path = os.path.join(cache_dir, f"{stem}.json")
+    manifest = _read_manifest(manifest_path)
+    fingerprint = source_fingerprint(path, manifest)
+    parquet_path = os.path.join(cache_dir, f"{stem}-{fingerprint['sha256'][:16]}.parquet")
+
+    if manifest and manifest.get("sha256") == fingerprint["sha256"] and os.path.exists(parquet_path):
+        if manifest != fingerprint:
+            # Fichier touché ou recopié sans changement de contenu : on met juste l'empreinte à jour
+            write_atomic(manifest_path, lambda p: _dump_json(fingerprint, p))
+        try:
+            return pd.read_parquet(parquet_path)
+        except Exception:
+            pass
+
+    df = pd.read_excel(path, sheet_name=sheet_name, na_values=na_values)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        df = normalize_object_columns(df)
+        write_atomic(parquet_path, lambda p: df.to_parquet(p, index=False))
+        write_atomic(manifest_path, lambda p: _dump_json(fingerprint, p))
+        _remove_stale_versions(cache_dir, stem, keep=parquet_path)
+    except Exception:
+        # Le cache est une optimisation : en cas d'échec (disque, pyarrow absent) on garde la lecture Excel
+        pass
+    return df
+
+
+def _remove_stale_versions(cache_dir, stem, keep):
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.startswith(f"{stem}-") and name.endswith(".parquet") and path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+# Fonction pour fusionner un agrégat existant avec celui des lignes ajoutées
+# agg : colonne -> fonction combinable par morceaux (sum, min, max, first, last)
+# Renvoie un DataFrame indexé par keys, trié comme un groupby classique
+def merge_aggregate(previous, rows, keys, agg):
+    aggregate = rows.groupby(keys, sort=False, observed=True).agg(agg)
+    if previous is not None and not previous.empty:
+        aggregate = pd.concat([previous, aggregate]).groupby(level=keys, sort=False, observed=True).agg(agg)
+    return aggregate.sort_index()
+
+
+# Fonction pour calculer l'empreinte de lignes brutes (contenu et ordre des lignes)
+def rows_sha256(raw):
+    return hashlib.sha256(pd.util.hash_pandas_object(raw, index=False).values.tobytes()).hexdigest()
+
+
+def _read_store(directory, manifest):
+    parts = [pd.read_parquet(os.path.join(directory, part)) for part in manifest["parts"]]
+    df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+    aggregates = {
+        name: pd.read_parquet(os.path.join(directory, f"aggregate-{name}.parquet"))
+        for name in manifest["aggregates"]
+    }
+    return df, aggregates
+
+
+# Fonction pour charger un historique en ajout seul, avec un point haut (high-water mark) sur la date
+# read(path) lit le classeur source ; parse_dates(raw) renvoie la date de chaque ligne ;
+# clean(raw) nettoie des lignes indépendamment les unes des autres (un extrait peut être nettoyé seul) ;
+# aggregates : nom -> (clés, agg), agrégats mis à jour à chaque ajout (voir merge_aggregate)
+# Seules les lignes postérieures au point haut sont nettoyées et ajoutées au magasin ; si l'historique
+# déjà ingéré a changé (lignes jusqu'au point haut ou sans date ajoutées, supprimées ou corrigées,
+# détecté par l'empreinte de ces lignes brutes), le magasin est reconstruit
+# Renvoie (DataFrame complet, dict nom -> agrégat indexé par ses clés)
+def load_incremental(path, name, read, parse_dates, clean, aggregates=None, store_dir=STORE_DIR):
+    aggregates = {agg_name: [list(keys), agg] for agg_name, (keys, agg) in (aggregates or {}).items()}
+    directory = os.path.join(store_dir, name)
+    manifest_path = os.path.join(directory, "manifest.json")
+    manifest = _read_manifest(manifest_path)
+    if manifest and manifest.get("aggregates") != aggregates:
+        manifest = None
+    fingerprint = source_fingerprint(path, manifest and manifest["source"])
+
+    if manifest and manifest["source"]["sha256"] == fingerprint["sha256"]:
+        try:
+            stored = _read_store(directory, manifest)
+            if manifest["source"] != fingerprint:
+                # Classeur touché sans changement de contenu : on met juste l'empreinte à jour
+                manifest["source"] = fingerprint
+                write_atomic(manifest_path, lambda p: _dump_json(manifest, p))
+            return stored
+        except Exception:
+            manifest = None
+
+    raw = read(path)
+    dates = parse_dates(raw)
+    high_water_mark = None
+    if manifest:
+        if manifest["high_water_mark"] is not None:
+            high_water_mark = pd.Timestamp(manifest["high_water_mark"])
+        ingested = ~(dates > high_water_mark) if high_water_mark is not None else dates.isna()
+        rows_at_mark = int((dates <= high_water_mark).sum()) if high_water_mark is not None else 0
+        if (rows_at_mark != manifest["rows_at_mark"] or int(dates.isna().sum()) != manifest["undated_rows"]
+                or rows_sha256(raw[ingested]) != manifest.get("history_sha256")):
+            manifest = None
+            high_water_mark = None
+    if manifest:
+        try:
+            df, previous = _read_store(directory, manifest)
+        except Exception:
+            manifest = None
+            high_water_mark = None
+
+    if manifest:
+        new_rows = normalize_object_columns(clean(raw[(dates > high_water_mark) if high_water_mark is not None else dates.notna()].copy()))
+        parts = list(manifest["parts"])
+        df = pd.concat([df, new_rows], ignore_index=True)
+    else:
+        # Premier chargement ou historique modifié : tout le classeur est nettoyé
+        new_rows = normalize_object_columns(clean(raw))
+        parts = []
+        previous = {}
+        df = new_rows
+    merged = {
+        agg_name: merge_aggregate(previous.get(agg_name), new_rows, keys, agg)
+        for agg_name, (keys, agg) in aggregates.items()
+    }
+
+    valid_dates = dates.dropna()
+    high_water_mark = valid_dates.max() if not valid_dates.empty else None
+    try:
+        os.makedirs(directory, exist_ok=True)
+        if not new_rows.empty or not parts:
+            part = f"part-{len(parts):05d}.parquet"
+            write_atomic(os.path.join(directory, part), lambda p: new_rows.to_parquet(p, index=False))
+            parts.append(part)
+        for agg_name, aggregate in merged.items():
+            write_atomic(os.path.join(directory, f"aggregate-{agg_name}.parquet"), aggregate.to_parquet)
+        # Le manifeste est écrit en dernier : c'est lui qui valide l'ajout
+        new_manifest = {
+            "source": fingerprint,
+            "high_water_mark": high_water_mark.isoformat() if high_water_mark is not None else None,
+            "rows_at_mark": int(len(valid_dates)),
+            "undated_rows": int(len(dates) - len(valid_dates)),
+            # Toutes les lignes du classeur sont désormais antérieures ou égales au point haut
+            "history_sha256": rows_sha256(raw),
+            "parts": parts,
+            "aggregates": aggregates,
+        }
+        write_atomic(manifest_path, lambda p: _dump_json(new_manifest, p))
+        _remove_stale_parts(directory, keep=parts)
+    except Exception:
+        # Le magasin est une optimisation : en cas d'échec le résultat en mémoire reste valable
+        pass
+    return df, merged
+
+
+def _remove_stale_parts(directory, keep):
+    for name in os.listdir(directory):
+        if name.startswith("part-") and name.endswith(".parquet") and name not in keep:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
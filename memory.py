@@ -0,0 +1,58 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Proportion maximale de valeurs distinctes pour qu'une colonne texte passe en type category
+MAX_UNIQUE_RATIO = 0.5
+INT32_MIN, INT32_MAX = np.iinfo(np.int32).min, np.iinfo(np.int32).max
+
+_reports = {}
+_reports_lock = threading.Lock()
+
+
+# Fonction pour mesurer l'empreinte mémoire d'un DataFrame en Mo (contenu des chaînes compris)
+def frame_memory_mb(df):
+    return df.memory_usage(deep=True).sum() / (1024 * 1024)
+
+
+# Fonction pour réduire un entier 64 bits en 32 bits quand toutes les valeurs tiennent
+# (pas de int8/int16 : les calculs entre colonnes déborderaient)
+def _downcast_int(series):
+    if series.empty or (series.min() >= INT32_MIN and series.max() <= INT32_MAX):
+        return series.astype(np.int32)
+    return series
+
+
+# Fonction pour compacter un DataFrame au chargement
+# categorical : colonnes texte converties en category si leur cardinalité est faible (<= max_unique_ratio des lignes)
+# Les entiers 64 bits (identifiants, comptages) sont réduits en 32 bits quand toutes les valeurs tiennent ;
+# les flottants (montants, quantités) restent en 64 bits : même exactes une à une, des valeurs en 32 bits
+# seraient additionnées en 32 bits par sum / mean / groupby et les totaux seraient faux
+# L'empreinte avant / après est enregistrée sous name pour le panneau mémoire (memory_report)
+def compact_frame(df, name, categorical=(), max_unique_ratio=MAX_UNIQUE_RATIO):
+    before = frame_memory_mb(df)
+    df = df.copy()
+    for col in categorical:
+        if col in df.columns and df[col].dtype == object and df[col].nunique() <= max_unique_ratio * max(len(df), 1):
+            df[col] = df[col].astype("category")
+    for col in df.columns:
+        if df[col].dtype == np.int64:
+            df[col] = _downcast_int(df[col])
+    after = frame_memory_mb(df)
+    with _reports_lock:
+        _reports[name] = {
+            "Jeu de données": name,
+            "Lignes": len(df),
+            "Avant (Mo)": round(before, 2),
+            "Après (Mo)": round(after, 2),
+            "Réduction": f"x{before / after:.1f}" if after > 0 else "-",
+        }
+    return df
+
+
+# Fonction pour obtenir le bilan mémoire des jeux compactés dans ce processus
+def memory_report():
+    with _reports_lock:
+        rows = list(_reports.values())
+    return pd.DataFrame(rows, columns=["Jeu de données", "Lignes", "Avant (Mo)", "Après (Mo)", "Réduction"])
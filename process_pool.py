@@ -0,0 +1,41 @@
+import sys
+import threading
+import types
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.context import SpawnContext, SpawnProcess
+
+_main_lock = threading.Lock()
+
+
+# Processus "spawn" lancé avec un module __main__ neutre (sans __file__ ni __spec__)
+# Sous `streamlit run`, __main__ est le script du tableau de bord : un processus "spawn" ordinaire le
+# réexécuterait en entier (connexion, chargement des données, calcul des vues) avant sa première tâche
+# Le remplacement ne dure que le lancement du processus (lecture de __main__ par multiprocessing)
+class _WorkerProcess(SpawnProcess):
+    def start(self):
+        with _main_lock:
+            main = sys.modules['__main__']
+            sys.modules['__main__'] = types.ModuleType('__main__')
+            try:
+                super().start()
+            finally:
+                sys.modules['__main__'] = main
+
+
+class _WorkerContext(SpawnContext):
+    Process = _WorkerProcess
+
+
+# Fonction exécutée au démarrage de chaque processus du pool : refuse de servir si le script principal
+# a été réexécuté (module __mp_main__ chargé depuis un fichier) ; le pool est alors cassé (BrokenProcessPool)
+# et les appelants reprennent les tâches dans le processus courant
+def _check_worker():
+    main_path = getattr(sys.modules.get('__mp_main__'), '__file__', None)
+    if main_path is not None:
+        raise RuntimeError(f"Le processus du pool a réexécuté le script principal : {main_path}")
+
+
+# Fonction pour créer un pool de processus "spawn" (sûr avec le serveur Streamlit multi-thread)
+# qui n'importe jamais le script principal ; le pool lance ses processus à la demande, chacun via _WorkerProcess
+def spawn_executor(max_workers):
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=_WorkerContext(), initializer=_check_worker)
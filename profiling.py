@@ -0,0 +1,141 @@
+import functools
+import hmac
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+# Nombre d'étapes conservées en mémoire pour le panneau de profilage
+MAX_RECORDS = 2000
+# Administrateurs autorisés à voir le panneau : noms d'utilisateur (DASHBOARD_ADMINS="alice,bob")
+# ou jeton passé dans l'URL (?admin=<DASHBOARD_ADMIN_TOKEN>) pour les tableaux de bord sans connexion
+ADMIN_USERS = [u.strip() for u in os.environ.get("DASHBOARD_ADMINS", "").split(",") if u.strip()]
+ADMIN_TOKEN = os.environ.get("DASHBOARD_ADMIN_TOKEN")
+# Journal JSON-lines optionnel (une ligne par étape), activé par DASHBOARD_PROFILE_LOG=<chemin>
+PROFILE_LOG = os.environ.get("DASHBOARD_PROFILE_LOG")
+
+_records = deque(maxlen=MAX_RECORDS)
+_records_lock = threading.Lock()
+_log_lock = threading.Lock()
+_local = threading.local()
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+# Fonction pour compter les lignes d'une valeur : DataFrame / Series, ou premier DataFrame d'un tuple ou d'une liste
+def count_rows(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        for item in value:
+            if isinstance(item, (pd.DataFrame, pd.Series)):
+                return len(item)
+    return None
+
+
+# Fonction pour signaler un accès cache à l'étape en cours (sans effet hors d'une étape profilée)
+def record_cache(hit, count=1):
+    stack = _stack()
+    if stack:
+        stack[-1]["cache_hits" if hit else "cache_misses"] += count
+
+
+def _write_log(record, path):
+    try:
+        with _log_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+    except OSError:
+        # Le journal est facultatif : une erreur d'écriture ne doit pas interrompre le tableau de bord
+        pass
+
+
+# Gestionnaire de contexte pour mesurer une étape : durée, lignes en entrée / sortie, accès cache
+# L'étape renvoyée est un dict ; le code mesuré peut y renseigner rows_out
+@contextmanager
+def profile_stage(name, rows_in=None):
+    record = {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "stage": name,
+        "wall_ms": None,
+        "rows_in": rows_in,
+        "rows_out": None,
+        "cache_hits": 0,
+        "cache_misses": 0,
+        "error": None,
+    }
+    stack = _stack()
+    stack.append(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        record["wall_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        stack.pop()
+        with _records_lock:
+            _records.append(record)
+        if PROFILE_LOG:
+            _write_log(record, PROFILE_LOG)
+
+
+# Décorateur équivalent à profile_stage pour une fonction
+# rows_in : lignes du premier DataFrame reçu en argument ; rows_out : lignes du résultat (voir count_rows)
+def profiled(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            rows_in = next((count_rows(v) for v in (*args, *kwargs.values()) if count_rows(v) is not None), None)
+            with profile_stage(name, rows_in) as stage:
+                result = func(*args, **kwargs)
+                stage["rows_out"] = count_rows(result)
+            return result
+        return wrapper
+    return decorator
+
+
+# Fonction pour savoir si l'utilisateur peut voir le panneau de profilage
+def is_admin(username=None, token=None):
+    if username and username in ADMIN_USERS:
+        return True
+    return bool(ADMIN_TOKEN and token and hmac.compare_digest(str(token), ADMIN_TOKEN))
+
+
+# Fonction pour obtenir les dernières étapes mesurées (les plus récentes en premier)
+def recent_stages(limit=50):
+    with _records_lock:
+        records = list(_records)[-limit:][::-1]
+    return pd.DataFrame(records, columns=["time", "stage", "wall_ms", "rows_in", "rows_out", "cache_hits", "cache_misses", "error"])
+
+
+# Fonction pour obtenir la synthèse par étape (nombre d'appels, durées, lignes, taux de hit)
+def profile_report():
+    with _records_lock:
+        records = list(_records)
+    columns = ["Étape", "Appels", "Moyenne (ms)", "P95 (ms)", "Max (ms)", "Lignes entrée (max)", "Lignes sortie (max)", "Hits", "Misses", "Erreurs"]
+    if not records:
+        return pd.DataFrame(columns=columns)
+    df = pd.DataFrame(records)
+    report = df.groupby("stage", sort=False).agg(
+        calls=("wall_ms", "size"),
+        mean_ms=("wall_ms", "mean"),
+        p95_ms=("wall_ms", lambda s: s.quantile(0.95)),
+        max_ms=("wall_ms", "max"),
+        rows_in=("rows_in", "max"),
+        rows_out=("rows_out", "max"),
+        hits=("cache_hits", "sum"),
+        misses=("cache_misses", "sum"),
+        errors=("error", "count"),
+    ).reset_index()
+    report.columns = columns
+    return report.round(2).sort_values("Moyenne (ms)", ascending=False)
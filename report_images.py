@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import plotly.io as pio
+
+# Nombre de processus kaleido (Chromium) gardés ouverts pour rendre les graphiques en parallèle
+RENDER_WORKERS = max(1, min(4, os.cpu_count() or 1))
+# Taille maximale du cache PNG en mémoire (octets)
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+_executor = None
+_executor_lock = threading.Lock()
+_scopes = queue.LifoQueue()
+_png_cache = OrderedDict()
+_png_cache_size = 0
+_png_cache_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="kaleido")
+        return _executor
+
+
+# Fonction pour emprunter un processus kaleido persistant (créé à la première demande)
+# Chaque PlotlyScope pilote son propre Chromium, un seul graphique à la fois
+def _acquire_scope():
+    try:
+        return _scopes.get_nowait()
+    except queue.Empty:
+        from kaleido.scopes.plotly import PlotlyScope
+        # Mêmes ressources (plotly.js, MathJax) et dimensions par défaut que pio.to_image
+        defaults = pio.kaleido.scope
+        scope = PlotlyScope(plotlyjs=defaults.plotlyjs, mathjax=defaults.mathjax)
+        scope.default_width = defaults.default_width
+        scope.default_height = defaults.default_height
+        scope.default_scale = defaults.default_scale
+        return scope
+
+
+# Fonction pour calculer la clé de cache d'un graphique (JSON de la figure + options de rendu)
+def figure_key(fig_json, format="png", width=None, height=None, scale=None):
+    digest = hashlib.sha256(fig_json.encode("utf-8"))
+    digest.update(repr((format, width, height, scale)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _cache_get(key):
+    with _png_cache_lock:
+        if key in _png_cache:
+            _png_cache.move_to_end(key)
+            return _png_cache[key]
+    return None
+
+
+def _cache_put(key, img_bytes):
+    global _png_cache_size
+    with _png_cache_lock:
+        if key in _png_cache:
+            return
+        _png_cache[key] = img_bytes
+        _png_cache_size += len(img_bytes)
+        while _png_cache_size > CACHE_MAX_BYTES and len(_png_cache) > 1:
+            _, evicted = _png_cache.popitem(last=False)
+            _png_cache_size -= len(evicted)
+
+
+def _render(fig_dict, format, width, height, scale):
+    try:
+        scope = _acquire_scope()
+    except ImportError:
+        # kaleido sans API scopes : on passe par plotly (rendu sérialisé)
+        return pio.to_image(fig_dict, format=format, width=width, height=height, scale=scale, validate=False)
+    try:
+        return scope.transform(fig_dict, format=format, width=width, height=height, scale=scale)
+    finally:
+        # Le scope retourne au pool même en cas d'erreur : une erreur signalée par kaleido (figure ou format
+        # invalide) laisse son processus utilisable, et transform relance lui-même un processus arrêté
+        _scopes.put(scope)
+
+
+def _render_cached(key, fig_json, format, width, height, scale):
+    img_bytes = _cache_get(key)
+    if img_bytes is None:
+        img_bytes = _render(json.loads(fig_json), format, width, height, scale)
+        _cache_put(key, img_bytes)
+    return img_bytes
+
+
+# Fonction pour lancer le rendu PNG d'une figure en arrière-plan
+# Renvoie un Future dont le résultat est le contenu PNG (bytes)
+def render_figure_async(fig, format="png", width=None, height=None, scale=None):
+    fig_json = fig.to_json() if hasattr(fig, "to_json") else pio.to_json(fig)
+    key = figure_key(fig_json, format, width, height, scale)
+    return _get_executor().submit(_render_cached, key, fig_json, format, width, height, scale)
+
+
+# Fonction pour rendre une figure en PNG (bytes), en passant par le cache
+def render_figure(fig, format="png", width=None, height=None, scale=None):
+    return render_figure_async(fig, format, width, height, scale).result()
+
+
+# Images d'un rapport Word : chaque graphique est réservé à sa place dans le document
+# et rendu en parallèle ; finish() insère les images une fois les rendus terminés
+class ReportImages:
+    def __init__(self, format="png", width=None, height=None, scale=None):
+        self.render_options = {"format": format, "width": width, "height": height, "scale": scale}
+        self._pending = []
+
+    def add_picture(self, doc, fig, width=None, height=None):
+        run = doc.add_paragraph().add_run()
+        future = render_figure_async(fig, **self.render_options)
+        self._pending.append((run, future, width, height))
+        return run
+
+    def finish(self, progress=None):
+        total = len(self._pending)
+        for i, (run, future, width, height) in enumerate(self._pending):
+            run.add_picture(BytesIO(future.result()), width=width, height=height)
+            if progress is not None:
+                progress((i + 1) / total)
+        self._pending = []
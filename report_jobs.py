@@ -0,0 +1,225 @@
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from ingestion import write_atomic
+
+# Répertoire des rapports générés en arrière-plan : <id>.json (état de la tâche) et <id>.docx (résultat)
+JOBS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "reports")
+# Nombre de rapports construits en même temps (le rendu des graphiques est déjà parallélisé par report_images)
+REPORT_WORKERS = 2
+# Durée de conservation des rapports terminés (secondes)
+RESULT_TTL_SECONDS = 24 * 3600
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+_store_loaded = False
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix="report")
+        return _executor
+
+
+# Rapport Word construit en arrière-plan pour un utilisateur (owner) d'un tableau de bord
+# L'état est enregistré sur disque à chaque changement de statut ; la progression reste en mémoire
+class ReportJob:
+    def __init__(self, id, owner, dashboard, label, file_name, status=QUEUED, submitted=None, finished=None,
+                 error=None, messages=None):
+        self.id = id
+        self.owner = owner
+        self.dashboard = dashboard
+        self.label = label
+        self.file_name = file_name
+        self.status = status
+        self.submitted = submitted if submitted is not None else time.time()
+        self.finished = finished
+        self.error = error
+        self.messages = list(messages or [])
+        self.progress = 1.0 if status == DONE else 0.0
+
+    @property
+    def active(self):
+        return self.status in (QUEUED, RUNNING)
+
+    @property
+    def path(self):
+        return os.path.join(JOBS_DIR, f"{self.id}.docx")
+
+    @property
+    def submitted_at(self):
+        return datetime.fromtimestamp(self.submitted).strftime("%d/%m/%Y %H:%M")
+
+    def set_progress(self, fraction):
+        self.progress = min(max(float(fraction), 0.0), 1.0)
+
+    def add_message(self, message):
+        self.messages.append(str(message))
+
+    def to_dict(self):
+        return {
+            "id": self.id, "owner": self.owner, "dashboard": self.dashboard, "label": self.label,
+            "file_name": self.file_name, "status": self.status, "submitted": self.submitted,
+            "finished": self.finished, "error": self.error, "messages": self.messages,
+        }
+
+
+def _meta_path(job_id):
+    return os.path.join(JOBS_DIR, f"{job_id}.json")
+
+
+def _save(job):
+    try:
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        write_atomic(_meta_path(job.id), lambda p: _dump_json(job.to_dict(), p))
+    except OSError:
+        # Sans disque, la tâche reste suivie en mémoire pour la durée du processus
+        pass
+
+
+def _dump_json(data, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+def _write_buffer(buffer, path):
+    with open(path, "wb") as f:
+        f.write(buffer.getvalue())
+
+
+def _remove_files(job_id):
+    for path in (_meta_path(job_id), os.path.join(JOBS_DIR, f"{job_id}.docx")):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# Fonction pour recharger les tâches enregistrées par un processus précédent (une seule fois)
+# Une tâche encore en attente ou en cours sur disque a été interrompue par un redémarrage
+def _load_store():
+    global _store_loaded
+    with _jobs_lock:
+        if _store_loaded:
+            return
+        _store_loaded = True
+        try:
+            names = os.listdir(JOBS_DIR)
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(JOBS_DIR, name), "r", encoding="utf-8") as f:
+                    job = ReportJob(**json.load(f))
+            except (OSError, ValueError, TypeError):
+                continue
+            if job.active:
+                job.status = FAILED
+                job.error = "Interrompu par un redémarrage du serveur"
+                job.finished = time.time()
+                _save(job)
+            _jobs.setdefault(job.id, job)
+
+
+# Fonction pour supprimer les rapports terminés depuis plus de ttl secondes (mémoire et disque)
+def purge_expired(ttl=RESULT_TTL_SECONDS):
+    limit = time.time() - ttl
+    with _jobs_lock:
+        expired = [job_id for job_id, job in _jobs.items() if job.finished is not None and job.finished < limit]
+        for job_id in expired:
+            del _jobs[job_id]
+    for job_id in expired:
+        _remove_files(job_id)
+    return len(expired)
+
+
+def _accepts(func, name):
+    try:
+        return name in inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def _run(job, build, args, kwargs):
+    job.status = RUNNING
+    _save(job)
+    try:
+        buffer = build(*args, **kwargs)
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        write_atomic(job.path, lambda p: _write_buffer(buffer, p))
+        job.progress = 1.0
+        job.status = DONE
+    except Exception as e:
+        job.error = f"{type(e).__name__}: {e}"
+        job.status = FAILED
+    finally:
+        job.finished = time.time()
+        _save(job)
+
+
+# Fonction pour lancer la construction d'un rapport Word en arrière-plan
+# build(*args, **kwargs) renvoie un BytesIO ; s'il accepte progress / on_error, ils sont reliés à la tâche
+# Un rapport identique (même utilisateur, tableau de bord et fichier) déjà en cours est renvoyé tel quel
+def submit_report(owner, dashboard, label, file_name, build, *args, **kwargs):
+    _load_store()
+    purge_expired()
+    with _jobs_lock:
+        for job in _jobs.values():
+            if job.active and (job.owner, job.dashboard, job.file_name) == (owner, dashboard, file_name):
+                return job
+        job = ReportJob(uuid.uuid4().hex, owner, dashboard, label, file_name)
+        _jobs[job.id] = job
+    if _accepts(build, "progress"):
+        kwargs.setdefault("progress", job.set_progress)
+    if _accepts(build, "on_error"):
+        kwargs.setdefault("on_error", job.add_message)
+    _save(job)
+    _get_executor().submit(_run, job, build, args, kwargs)
+    return job
+
+
+# Fonction pour obtenir les rapports d'un utilisateur sur un tableau de bord (les plus récents en premier)
+def list_jobs(owner, dashboard, limit=5):
+    _load_store()
+    purge_expired()
+    with _jobs_lock:
+        jobs = [job for job in _jobs.values() if job.owner == owner and job.dashboard == dashboard]
+    return sorted(jobs, key=lambda job: job.submitted, reverse=True)[:limit]
+
+
+# Fonction pour savoir si un utilisateur a des rapports en attente ou en cours
+def has_active_jobs(owner, dashboard):
+    return any(job.active for job in list_jobs(owner, dashboard, limit=None))
+
+
+# Fonction pour lire le contenu d'un rapport terminé ; None s'il a disparu du disque
+def read_result(job):
+    try:
+        with open(job.path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+# Fonction pour identifier le propriétaire des rapports : l'utilisateur connecté,
+# sinon un identifiant gardé dans l'état de la session (valable tant que la session vit)
+def session_owner(state):
+    return state.get("username") or state.setdefault("report_owner", uuid.uuid4().hex)
@@ -0,0 +1,377 @@
+import hashlib
+import io
+import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+import pandas as pd
+
+from ingestion import normalize_object_columns, write_atomic
+from process_pool import spawn_executor
+
+MAX_WORKERS = max(1, min(8, os.cpu_count() or 1))
+# Nombre de classeurs en attente par processus : borne la mémoire occupée par les contenus à analyser
+IN_FLIGHT_PER_WORKER = 2
+# Nombre de classeurs analysés gardés en mémoire (toutes sessions confondues)
+CACHE_MAX_ENTRIES = 256
+# Cache disque des classeurs analysés (Parquet), purgé par ordre de dernière utilisation
+UPLOAD_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "uploads")
+UPLOAD_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Version de la lecture / du nettoyage des classeurs (parse_workbook, clean_workbook, normalize_object_columns),
+# incluse dans les clés de cache : à incrémenter quand le résultat analysé d'un même fichier change
+PARSER_VERSION = 1
+
+MONTHS_FR = {
+    'January': 'Janvier', 'February': 'Février', 'March': 'Mars',
+    'April': 'Avril', 'May': 'Mai', 'June': 'Juin',
+    'July': 'Juillet', 'August': 'Août', 'September': 'Septembre',
+    'October': 'Octobre', 'November': 'Novembre', 'December': 'Décembre'
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+_parsed_cache = OrderedDict()
+_parsed_cache_lock = threading.Lock()
+
+
+# Parseur de date : numéro de série Excel, texte ou date déjà typée
+def parse_excel_date(series, errors='coerce'):
+    if pd.api.types.is_numeric_dtype(series):
+        return pd.to_datetime(series, origin='1899-12-30', unit='D')
+    if not pd.api.types.is_datetime64_any_dtype(series):
+        return pd.to_datetime(series, errors=errors)
+    return series
+
+
+# Parseur de montant : supprime les symboles et accepte la virgule décimale
+def parse_amount(series):
+    series = series.astype(str).str.replace(r'[^\d.,]', '', regex=True)
+    series = series.str.replace(',', '.', regex=False)
+    return pd.to_numeric(series, errors='coerce')
+
+
+def parse_category(series):
+    return series.astype(str).replace('nan', 'Unknown')
+
+
+def add_month_names(df):
+    df['Mois'] = df['Date'].dt.month_name().map(MONTHS_FR)
+    return df
+
+
+def add_site_total(df):
+    for col in ['DS Sud', 'DS Nord', 'KA']:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    df['CUMMULE'] = df[['DS Sud', 'DS Nord', 'KA']].sum(axis=1)
+    return df
+
+
+def add_total_hours(df):
+    for col in df.columns[1:]:  # Skip ENGINS column
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    df['TOTAL_HOURS'] = df.iloc[:, 1:].sum(axis=1)
+    return df
+
+
+def keep_main_categories(df):
+    df['CATEGORIE'] = df['CATEGORIE'].astype(str).replace('nan', 'Unknown')
+    return df[df['CATEGORIE'].str.upper().isin(['DUMPER', 'FORATION', '10 TONNES'])]
+
+
+def drop_duplicate_rows(df):
+    return df.drop_duplicates()
+
+
+# Schémas des jeux de données téléversés
+# required : colonnes obligatoires ; parsers : conversions par colonne (dans l'ordre) ;
+# dropna : colonnes dont les valeurs manquantes éliminent la ligne ; finalize : colonnes dérivées par classeur ;
+# combine : traitement du jeu fusionné ; date_column : colonne de date (tri et filtres de période) ;
+# categorical : colonnes texte à convertir en category après fusion (memory.compact_frame) ; label / no_files_warning / empty_error : messages de l'interface
+# version : à incrémenter quand les colonnes, les parseurs ou finalize du schéma changent (invalide son cache)
+CONSUMPTION_SCHEMA = {
+    'name': 'consommation',
+    'version': 1,
+    'label': '',
+    'required': ['Date', 'CATEGORIE', 'Desc_Cat', 'Desc_CA', 'Montant'],
+    'parsers': {'CATEGORIE': parse_category, 'Date': parse_excel_date, 'Montant': parse_amount},
+    'dropna': ['Montant'],
+    'finalize': add_month_names,
+    'combine': keep_main_categories,
+    'date_column': 'Date',
+    'categorical': ['CATEGORIE', 'Desc_Cat', 'Desc_CA', 'Mois'],
+    'no_files_warning': None,
+    'empty_error': "Aucune donnée pour les catégories DUMPER, FORATION, ou 10 TONNES. Vérifiez les fichiers téléversés.",
+}
+
+TONNAGE_SCHEMA = {
+    'name': 'tonnage',
+    'version': 1,
+    'label': ' de tonnage',
+    'required': ['DATE', 'DS Sud', 'DS Nord', 'KA'],
+    'parsers': {'DATE': partial(parse_excel_date, errors='raise')},
+    'dropna': ['DATE', 'DS Sud', 'DS Nord', 'KA'],
+    'finalize': add_site_total,
+    'combine': drop_duplicate_rows,
+    'date_column': 'DATE',
+    'categorical': [],
+    'no_files_warning': "Aucun fichier de tonnage téléversé. Veuillez importer un ou plusieurs fichiers Excel ou ZIP.",
+    'empty_error': None,
+}
+
+HOURS_SCHEMA = {
+    'name': 'heures_marche',
+    'version': 1,
+    'label': " d'heures de marche",
+    'required': ['ENGINS'],  # ENGINS contient la date
+    'parsers': {'ENGINS': parse_excel_date},
+    'dropna': ['ENGINS'],
+    'finalize': add_total_hours,
+    'combine': drop_duplicate_rows,
+    'date_column': 'ENGINS',
+    'categorical': [],
+    'no_files_warning': "Aucun fichier d'heures de marche téléversé. Veuillez importer un ou plusieurs fichiers Excel ou ZIP.",
+    'empty_error': None,
+}
+
+
+# Fonction pour nettoyer un classeur selon son schéma
+def clean_workbook(df, schema):
+    for col, parser in schema['parsers'].items():
+        df[col] = parser(df[col])
+    df = df.dropna(subset=schema['dropna'])
+    return schema['finalize'](df)
+
+
+# Fonction exécutée dans les processus du pool : lit et nettoie un classeur
+# Le résultat est aussi écrit dans le cache disque quand cache_path est fourni
+# Renvoie ('ok', df), ('missing', None) si des colonnes requises manquent, ou ('error', message)
+def parse_workbook(content, schema, cache_path=None):
+    try:
+        df = pd.read_excel(io.BytesIO(content))
+        if not all(col in df.columns for col in schema['required']):
+            return 'missing', None
+        # Types homogènes pour que le résultat relu du cache Parquet soit identique
+        df = normalize_object_columns(clean_workbook(df, schema))
+    except Exception as e:
+        return 'error', str(e)
+    if cache_path is not None:
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            write_atomic(cache_path, lambda p: df.to_parquet(p, index=False))
+        except Exception:
+            # Le cache disque est une optimisation : un échec d'écriture n'empêche pas le chargement
+            pass
+    return 'ok', df
+
+
+# Fonction pour calculer le préfixe des clés de cache d'un schéma (nom, version du schéma et du parseur)
+def schema_tag(schema):
+    return f"{schema['name']}-v{PARSER_VERSION}.{schema['version']}"
+
+
+# Fonction pour calculer la clé de cache d'un classeur (schéma versionné + hash du contenu)
+def content_key(content, schema):
+    return f"{schema_tag(schema)}-{hashlib.sha256(content).hexdigest()}"
+
+
+# Fonction pour calculer la clé d'un ensemble de fichiers téléversés (schéma + contenu de chaque fichier, dans l'ordre)
+# Les fichiers sont lus via getbuffer(), sans copie ; renvoie None si l'un d'eux ne le permet pas
+def uploads_key(uploaded_files, schema):
+    digest = hashlib.sha256()
+    for uploaded_file in uploaded_files:
+        if not hasattr(uploaded_file, 'getbuffer'):
+            return None
+        with uploaded_file.getbuffer() as view:
+            digest.update(hashlib.sha256(view).digest())
+    return f"{schema_tag(schema)}-{digest.hexdigest()}"
+
+
+def _disk_path(key, cache_dir=UPLOAD_CACHE_DIR):
+    return os.path.join(cache_dir, f"{key}.parquet")
+
+
+def _disk_get(key):
+    path = _disk_path(key)
+    if not os.path.exists(path):
+        return None
+    try:
+        df = pd.read_parquet(path)
+        # Marque l'entrée comme récemment utilisée pour la purge LRU
+        os.utime(path)
+        return 'ok', df
+    except Exception:
+        return None
+
+
+# Fonction pour limiter la taille du cache disque : supprime les entrées les moins récemment utilisées
+def evict_upload_cache(cache_dir=UPLOAD_CACHE_DIR, max_bytes=UPLOAD_CACHE_MAX_BYTES):
+    try:
+        names = os.listdir(cache_dir)
+    except OSError:
+        return
+    entries = []
+    for name in names:
+        if name.endswith(".parquet"):
+            path = os.path.join(cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def _cache_get(key):
+    with _parsed_cache_lock:
+        if key in _parsed_cache:
+            _parsed_cache.move_to_end(key)
+            return _parsed_cache[key]
+    return None
+
+
+def _cache_put(key, result):
+    with _parsed_cache_lock:
+        _parsed_cache[key] = result
+        _parsed_cache.move_to_end(key)
+        while len(_parsed_cache) > CACHE_MAX_ENTRIES:
+            _parsed_cache.popitem(last=False)
+
+
+# Fonction pour obtenir le pool de processus persistant ("spawn", sans réexécuter engins_s.py : voir process_pool)
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = spawn_executor(MAX_WORKERS)
+        return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+# Fonction pour lire le contenu d'une source : bytes, ou fonction qui lit le classeur à la demande
+def _read_source(source):
+    return source() if callable(source) else source
+
+
+# Fonction pour analyser plusieurs classeurs d'un même schéma, un classeur à la fois
+# sources : bytes ou fonctions sans argument renvoyant les bytes (ex. lecture d'un membre de ZIP),
+# lues seulement au moment du traitement pour qu'au plus IN_FLIGHT_PER_WORKER classeurs par processus
+# soient en mémoire simultanément
+# Les classeurs déjà vus (même contenu) sont repris du cache mémoire puis du cache disque,
+# les autres sont analysés en parallèle
+# progress(terminés, total) est appelé à chaque classeur ; les résultats suivent l'ordre de sources
+def parse_workbooks(sources, schema, progress=None):
+    total = len(sources)
+    results = [None] * total
+    in_flight = {}
+    done = 0
+    parsed = 0
+    executor = None
+    if total > 1 and MAX_WORKERS > 1:
+        try:
+            executor = _get_executor()
+        except (OSError, RuntimeError):
+            executor = None
+
+    def store(i, key, result):
+        nonlocal done
+        results[i] = result
+        if result[0] != 'error':
+            _cache_put(key, result)
+        done += 1
+        if progress is not None:
+            progress(done, total)
+
+    def parse_inline(i, key, content):
+        store(i, key, parse_workbook(content, schema, _disk_path(key)))
+
+    def drain(futures):
+        nonlocal executor
+        for future in futures:
+            i, key, _ = in_flight[future]
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                # Pool indisponible : les classeurs en cours sont repris un par un dans ce processus
+                _reset_executor()
+                executor = None
+                for i, key, content in list(in_flight.values()):
+                    parse_inline(i, key, content)
+                in_flight.clear()
+                return
+            except Exception as e:
+                # Échec propre à ce classeur (ex. résultat non transmissible) : signalé pour lui seul
+                result = 'error', str(e)
+            del in_flight[future]
+            store(i, key, result)
+
+    for i, source in enumerate(sources):
+        try:
+            content = _read_source(source)
+        except Exception as e:
+            # Membre illisible (ex. membre de ZIP corrompu) : signalé pour lui seul, les autres sont analysés
+            store(i, None, ('error', str(e)))
+            continue
+        key = content_key(content, schema)
+        result = _cache_get(key)
+        if result is None:
+            result = _disk_get(key)
+        if result is not None:
+            store(i, key, result)
+            continue
+        parsed += 1
+        future = None
+        if executor is not None:
+            try:
+                future = executor.submit(parse_workbook, content, schema, _disk_path(key))
+            except (BrokenProcessPool, RuntimeError):
+                _reset_executor()
+                executor = None
+        if future is None:
+            parse_inline(i, key, content)
+        else:
+            in_flight[future] = (i, key, content)
+            if len(in_flight) >= MAX_WORKERS * IN_FLIGHT_PER_WORKER:
+                drain(wait(list(in_flight), return_when=FIRST_COMPLETED)[0])
+        del content
+    drain(as_completed(list(in_flight)))
+
+    if parsed:
+        evict_upload_cache()
+    return results
+
+
+# Fonction pour mesurer la mémoire maximale (RSS) atteinte par le processus, en Mo
+# Renvoie None si la mesure n'est pas disponible sur la plateforme
+def peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss est en Ko sous Linux et en octets sous macOS
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        memory = psutil.Process().memory_info()
+        return getattr(memory, 'peak_wset', memory.rss) / (1024 * 1024)
+    except Exception:
+        return None